@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+
+    __init__.py
+
+    Date         : October 2026
+    Copyright : (C) 2026 by Giacomo Fontanelli
+    Email        : giacomofontanelli76 at gmail dot com
+
+***************************************************************************
+
+    This program is free software; you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation; either version 2 of the License, or
+    (at your option) any later version.
+
+***************************************************************************
+
+    The scripts of this folder as a QGIS plugin with a processing provider;
+    each script also still runs on its own from the processing scripts folder
+
+***************************************************************************
+"""
+
+__author__ = 'Giacomo Fontanelli'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Giacomo Fontanelli'
+
+
+def classFactory(iface):
+    from .plugin import RsToolsPlugin
+    return RsToolsPlugin(iface)
@@ -0,0 +1,338 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+
+    run_benchmarks.py
+
+    Date         : October 2026
+    Copyright : (C) 2026 by Giacomo Fontanelli
+    Email        : giacomofontanelli76 at gmail dot com
+
+***************************************************************************
+
+    This program is free software; you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation; either version 2 of the License, or
+    (at your option) any later version.
+
+***************************************************************************
+
+    Headless benchmark of the processing scripts on synthetic inputs.
+    Every run is a fresh Python process: wall and CPU time, peak RSS and
+    bytes read/written (/proc/self/io) of the algorithm are recorded in a
+    JSON file, to compare commits and machines over time
+
+    python benchmarks/run_benchmarks.py --size 4096 --bands 6 --polygons 2000
+    python benchmarks/run_benchmarks.py --compare old.json new.json
+
+    The result cache is disabled in the runs (RSTOOLS_CACHE_MB=0) unless
+    --with-cache is given (RSTOOLS_CACHE_MB, 4096 MB when unset). QGIS must be importable (e.g. QGIS python
+    environment, QT_QPA_PLATFORM=offscreen on headless nodes)
+
+***************************************************************************
+"""
+
+__author__ = 'Giacomo Fontanelli'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Giacomo Fontanelli'
+
+# --------------------------------------------------------------------------------------------------------------------
+# 1 -----------------------------------------------------------------------------------------------------------------
+# --------------------------------------------------------------------------------------------------------------------
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+BENCHMARK_FOLDER = os.path.dirname(os.path.abspath(__file__))
+SCRIPT_FOLDER = os.path.dirname(BENCHMARK_FOLDER)
+
+# case name -> (script file, parameters of the case); inputs and output
+# paths are filled in by caseParameters
+CASES = {
+    "regular_points": ("regular_points.py", {}),
+    "polygon_mask": ("polygon_mask.py", {"MODE": 0}),
+    "polygon_mask_tiled": ("polygon_mask.py", {"MODE": 1}),
+    "zonal_stack_float32": ("zonal_stack.py", {"STAT": [0, 2, 6, 7], "DOMAIN": 0}),
+    "zonal_stack_int16_db": ("zonal_stack.py", {"STAT": [0, 2, 6, 7], "DOMAIN": 1}),
+    "db_to_linear_int16": ("dB_to_linear_stack.py", {}),
+    "db_to_linear_float32": ("dB_to_linear_stack.py", {}),
+    "linear_to_db_float32": ("linear_to_db_stack.py", {}),
+    "linear_to_db_int16": ("linear_to_db_stack.py", {}),
+}
+
+# --------------------------------------------------------------------------------------------------------------------
+# 2 ----------------------------------------- Inputs ---------------------------------------------------------------
+# --------------------------------------------------------------------------------------------------------------------
+
+def makeInputs(settings):
+    """Synthetic stacks and polygons, generated once per set of settings."""
+    sys.path.insert(0, BENCHMARK_FOLDER)
+    import synthetic
+
+    extension = ".tif" if settings["format"] == "GTiff" else ".img"
+    name = "s{size}_b{bands}_p{polygons}_sp{sparsity}_seed{seed}_{format}".format(**settings)
+    folder = os.path.join(settings["work"], "inputs", name)
+    inputs = {
+        "float32": os.path.join(folder, "stack_float32" + extension),
+        "int16": os.path.join(folder, "stack_int16" + extension),
+        "polygons": os.path.join(folder, "polygons.gpkg")}
+
+    if all(os.path.exists(path) for path in inputs.values()):
+        return inputs
+
+    os.makedirs(folder, exist_ok=True)
+    for dataType, key in (("Float32", "float32"), ("Int16", "int16")):
+        synthetic.makeStack(inputs[key], settings["size"], settings["bands"], dataType,
+                            seed=settings["seed"], driverName=settings["format"])
+    synthetic.makePolygons(inputs["polygons"], settings["size"], settings["polygons"],
+                           settings["sparsity"], seed=settings["seed"])
+    return inputs
+
+
+def caseParameters(case, inputs, folder, settings):
+    """Processing parameters of a case, outputs in folder."""
+    scriptFile, parameters = CASES[case]
+    parameters = dict(parameters)
+    stackKey = "int16" if "int16" in case else "float32"
+
+    if scriptFile == "regular_points.py":
+        parameters.update({
+            "INPUT": inputs["polygons"],
+            "PIXEL_DIMENSION": settings["pointSpacing"],
+            "OUTPUT": os.path.join(folder, "points.gpkg")})
+    elif scriptFile == "polygon_mask.py":
+        parameters.update({
+            "INPUT": inputs["polygons"],
+            "PIXEL_DIMENSION": 10.0,
+            "REFERENCE": inputs["float32"],
+            "OUTPUT": os.path.join(folder, "mask.tif")})
+    elif scriptFile == "zonal_stack.py":
+        # the zonal statistics write in the polygon layer: a fresh copy per run
+        polygons = os.path.join(folder, "polygons.gpkg")
+        shutil.copyfile(inputs["polygons"], polygons)
+        parameters.update({
+            "POLYGONS": polygons,
+            "STACK": inputs[stackKey],
+            "PREFIX": "b_"})
+    else:
+        parameters.update({
+            "INPUT": inputs[stackKey],
+            "OUTPUT": os.path.join(folder, "converted.tif")})
+
+    return scriptFile, parameters
+
+# --------------------------------------------------------------------------------------------------------------------
+# 3 ----------------------------------------- Child process --------------------------------------------------------
+# --------------------------------------------------------------------------------------------------------------------
+
+def processIo():
+    """Counters of /proc/self/io (empty where not available)."""
+    try:
+        with open("/proc/self/io") as ioFile:
+            return {name: int(value) for name, value in (line.split(":") for line in ioFile if ":" in line)}
+    except (IOError, OSError):
+        return {}
+
+
+def runChild(job):
+    """Run one job in this process, return its measures."""
+    sys.path.insert(0, SCRIPT_FOLDER)
+    from rstools import headless
+    headless.startQgis()
+
+    from qgis.core import QgsProcessingContext, QgsProcessingFeedback
+    import processing
+
+    algorithm = headless.scriptAlgorithm(os.path.join(SCRIPT_FOLDER, job["script"])).create()
+    context = QgsProcessingContext()
+    feedback = QgsProcessingFeedback()
+
+    rssBefore = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    ioBefore = processIo()
+    usageBefore = resource.getrusage(resource.RUSAGE_SELF)
+    start = time.perf_counter()
+
+    status, message = "ok", ""
+    try:
+        processing.run(algorithm, job["parameters"], context=context, feedback=feedback)
+    except Exception as error:
+        status, message = "error", str(error)
+
+    wall = time.perf_counter() - start
+    usageAfter = resource.getrusage(resource.RUSAGE_SELF)
+    ioAfter = processIo()
+
+    headless.stopQgis()
+    return {
+        "status": status,
+        "message": message,
+        "wallSeconds": wall,
+        "cpuSeconds": (usageAfter.ru_utime - usageBefore.ru_utime) + (usageAfter.ru_stime - usageBefore.ru_stime),
+        "maxRssKb": usageAfter.ru_maxrss,
+        "startupRssKb": rssBefore,
+        "readBytes": ioAfter.get("read_bytes", 0) - ioBefore.get("read_bytes", 0),
+        "writeBytes": ioAfter.get("write_bytes", 0) - ioBefore.get("write_bytes", 0),
+        "readChars": ioAfter.get("rchar", 0) - ioBefore.get("rchar", 0),
+        "writeChars": ioAfter.get("wchar", 0) - ioBefore.get("wchar", 0)}
+
+# --------------------------------------------------------------------------------------------------------------------
+# 4 ----------------------------------------- Runner ---------------------------------------------------------------
+# --------------------------------------------------------------------------------------------------------------------
+
+def runJob(job, settings):
+    """Run a job in a fresh interpreter."""
+    environment = dict(os.environ)
+    environment.setdefault("QT_QPA_PLATFORM", "offscreen")
+    if not settings["withCache"]:
+        environment["RSTOOLS_CACHE_MB"] = "0"
+    elif not environment.get("RSTOOLS_CACHE_MB"):
+        environment["RSTOOLS_CACHE_MB"] = "4096"
+
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child"],
+        input=json.dumps(job),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        env=environment)
+
+    lines = completed.stdout.strip().splitlines()
+    try:
+        return json.loads(lines[-1])
+    except (IndexError, ValueError):
+        return {"status": "crashed", "message": completed.stderr[-2000:], "returnCode": completed.returncode}
+
+
+def gitCommit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=SCRIPT_FOLDER,
+                                       stderr=subprocess.DEVNULL, universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def runAll(settings):
+    inputs = makeInputs(settings)
+    cases = settings["cases"] or list(CASES)
+
+    results = []
+    for case in cases:
+        for repeat in range(settings["repeat"]):
+            folder = os.path.join(settings["work"], "runs", case, str(repeat))
+            shutil.rmtree(folder, ignore_errors=True)
+            os.makedirs(folder)
+
+            scriptFile, parameters = caseParameters(case, inputs, folder, settings)
+            measure = runJob({"script": scriptFile, "parameters": parameters}, settings)
+            measure.update({"case": case, "repeat": repeat})
+            results.append(measure)
+            print("{:<24} {:>2} {:<7} {:>9.2f} s {:>9.1f} MB".format(
+                case, repeat, measure["status"], measure.get("wallSeconds", float("nan")),
+                measure.get("maxRssKb", 0) / 1024.0))
+
+    from osgeo import gdal
+    return {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": gitCommit(),
+        "host": platform.node(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "python": platform.python_version(),
+        "gdal": gdal.__version__,
+        "settings": {name: value for name, value in settings.items() if name != "work"},
+        "results": results}
+
+
+def compare(oldPath, newPath):
+    """Median wall time and peak RSS per case of two result files."""
+    summaries = []
+    for path in (oldPath, newPath):
+        with open(path) as resultFile:
+            report = json.load(resultFile)
+        summary = {}
+        for measure in report["results"]:
+            if measure["status"] == "ok":
+                summary.setdefault(measure["case"], []).append(measure)
+        summaries.append(summary)
+
+    old, new = summaries
+    print("{:<24} {:>10} {:>10} {:>8} {:>10} {:>10}".format("case", "old s", "new s", "ratio", "old MB", "new MB"))
+    for case in sorted(set(old) & set(new)):
+        oldWall = statistics.median(measure["wallSeconds"] for measure in old[case])
+        newWall = statistics.median(measure["wallSeconds"] for measure in new[case])
+        oldRss = max(measure["maxRssKb"] for measure in old[case]) / 1024.0
+        newRss = max(measure["maxRssKb"] for measure in new[case]) / 1024.0
+        print("{:<24} {:>10.2f} {:>10.2f} {:>8.2f} {:>10.1f} {:>10.1f}".format(
+            case, oldWall, newWall, newWall / oldWall if oldWall else float("nan"), oldRss, newRss))
+
+# --------------------------------------------------------------------------------------------------------------------
+# 5 ----------------------------------------- Command line ---------------------------------------------------------
+# --------------------------------------------------------------------------------------------------------------------
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Benchmark the processing scripts on synthetic inputs")
+    parser.add_argument("--size", type=int, default=2048, help="stack width and height in pixels")
+    parser.add_argument("--bands", type=int, default=4, help="bands per stack")
+    parser.add_argument("--polygons", type=int, default=500, help="number of polygons")
+    parser.add_argument("--sparsity", type=float, default=0.3, help="share of the extent covered by polygons")
+    parser.add_argument("--point-spacing", type=float, default=40.0, help="regular points distance in metres")
+    parser.add_argument("--format", choices=("GTiff", "ENVI"), default="GTiff", help="stack format")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--cases", default="", help="comma separated cases: " + ", ".join(CASES))
+    parser.add_argument("--with-cache", action="store_true", help="enable the result cache")
+    parser.add_argument("--work", default=os.path.join(BENCHMARK_FOLDER, "work"), help="inputs and outputs folder")
+    parser.add_argument("--output", help="result JSON (default results/<timestamp>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two result files")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    options = parser.parse_args(arguments)
+
+    if options.child:
+        print(json.dumps(runChild(json.load(sys.stdin))))
+        return 0
+
+    if options.compare:
+        compare(*options.compare)
+        return 0
+
+    cases = [case.strip() for case in options.cases.split(",") if case.strip()]
+    unknown = [case for case in cases if case not in CASES]
+    if unknown:
+        parser.error("unknown cases: " + ", ".join(unknown))
+
+    settings = {
+        "size": options.size,
+        "bands": options.bands,
+        "polygons": options.polygons,
+        "sparsity": options.sparsity,
+        "pointSpacing": options.point_spacing,
+        "format": options.format,
+        "seed": options.seed,
+        "repeat": options.repeat,
+        "cases": cases,
+        "withCache": options.with_cache,
+        "work": os.path.abspath(options.work)}
+
+    report = runAll(settings)
+
+    output = options.output or os.path.join(
+        BENCHMARK_FOLDER, "results", datetime.datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as resultFile:
+        json.dump(report, resultFile, indent=2)
+    print("results written to " + output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+
+    synthetic.py
+
+    Date         : October 2026
+    Copyright : (C) 2026 by Giacomo Fontanelli
+    Email        : giacomofontanelli76 at gmail dot com
+
+***************************************************************************
+
+    This program is free software; you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation; either version 2 of the License, or
+    (at your option) any later version.
+
+***************************************************************************
+
+    Reproducible synthetic inputs for the benchmarks: multiband stacks
+    and polygon layers generated from a seed, with GDAL and OGR only
+
+***************************************************************************
+"""
+
+__author__ = 'Giacomo Fontanelli'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Giacomo Fontanelli'
+
+# --------------------------------------------------------------------------------------------------------------------
+# 1 -----------------------------------------------------------------------------------------------------------------
+# --------------------------------------------------------------------------------------------------------------------
+
+import math
+
+from osgeo import gdal, ogr, osr
+
+import numpy as np
+
+# Grid of every synthetic input: UTM 32N, 10 m pixels
+EPSG = 32632
+ORIGIN = (500000.0, 5000000.0)
+PIXEL = 10.0
+
+NODATA = {"Float32": -9999.0, "Int16": -32768}
+
+# --------------------------------------------------------------------------------------------------------------------
+# 2 ----------------------------------------- Stacks ---------------------------------------------------------------
+# --------------------------------------------------------------------------------------------------------------------
+
+def spatialReference():
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(EPSG)
+    return srs
+
+
+def geotransform():
+    return (ORIGIN[0], PIXEL, 0.0, ORIGIN[1], 0.0, -PIXEL)
+
+
+def makeStack(path, size, bands, dataType="Float32", seed=0, driverName="GTiff", blockRows=256):
+    """Write a size x size stack of bands.
+
+    Float32 stacks hold linear power (exponential, mean 0.1), Int16 stacks
+    integer dB values (-30 .. 5); 1% of the pixels are nodata. GTiff
+    stacks are tiled, ENVI stacks band sequential.
+    """
+    random = np.random.default_rng(seed)
+    options = []
+    if driverName == "GTiff":
+        options = ["TILED=YES", "BLOCKXSIZE=256", "BLOCKYSIZE=256", "BIGTIFF=IF_SAFER"]
+    elif driverName == "ENVI":
+        options = ["INTERLEAVE=BSQ"]
+
+    dataset = gdal.GetDriverByName(driverName).Create(
+        path, size, size, bands, gdal.GetDataTypeByName(dataType), options=options)
+    dataset.SetGeoTransform(geotransform())
+    dataset.SetProjection(spatialReference().ExportToWkt())
+
+    for band in range(1, bands + 1):
+        bandOut = dataset.GetRasterBand(band)
+        bandOut.SetNoDataValue(NODATA[dataType])
+        for yoff in range(0, size, blockRows):
+            height = min(blockRows, size - yoff)
+            if dataType == "Int16":
+                values = random.integers(-30, 6, size=(height, size)).astype(np.int16)
+            else:
+                values = random.exponential(0.1, size=(height, size)).astype(np.float32)
+            values[random.random((height, size)) < 0.01] = NODATA[dataType]
+            bandOut.WriteArray(values, 0, yoff)
+
+    dataset.FlushCache()
+    dataset = None
+    return path
+
+# --------------------------------------------------------------------------------------------------------------------
+# 3 ----------------------------------------- Polygons -------------------------------------------------------------
+# --------------------------------------------------------------------------------------------------------------------
+
+def makePolygons(path, size, count, sparsity=0.3, seed=0, vertices=12):
+    """Write count polygons over the size x size grid of the stacks.
+
+    sparsity is the share of the extent covered by the polygons (overlaps
+    aside): their radius follows from it. Each polygon is a jittered
+    circle of vertices points with an integer class (1-20) and a name.
+    """
+    random = np.random.default_rng(seed)
+    extent = size * PIXEL
+    radius = math.sqrt(sparsity * extent * extent / (count * math.pi))
+
+    driver = ogr.GetDriverByName("GPKG")
+    dataSource = driver.CreateDataSource(path)
+    layer = dataSource.CreateLayer("polygons", spatialReference(), ogr.wkbPolygon)
+    layer.CreateField(ogr.FieldDefn("class", ogr.OFTInteger))
+    layer.CreateField(ogr.FieldDefn("name", ogr.OFTString))
+
+    angles = np.linspace(0.0, 2.0 * math.pi, vertices, endpoint=False)
+    layer.StartTransaction()
+    for index in range(count):
+        centerX = ORIGIN[0] + random.uniform(radius, extent - radius)
+        centerY = ORIGIN[1] - random.uniform(radius, extent - radius)
+        radii = radius * random.uniform(0.7, 1.3, size=vertices)
+
+        ring = ogr.Geometry(ogr.wkbLinearRing)
+        for angle, distance in zip(angles, radii):
+            ring.AddPoint_2D(centerX + distance * math.cos(angle), centerY + distance * math.sin(angle))
+        ring.CloseRings()
+        polygon = ogr.Geometry(ogr.wkbPolygon)
+        polygon.AddGeometry(ring)
+
+        feature = ogr.Feature(layer.GetLayerDefn())
+        feature.SetField("class", int(random.integers(1, 21)))
+        feature.SetField("name", "polygon_{}".format(index))
+        feature.SetGeometry(polygon)
+        layer.CreateFeature(feature)
+    layer.CommitTransaction()
+
+    dataSource = None
+    return path
@@ -40,6 +40,8 @@ from qgis.core import (
     QgsProcessingAlgorithm,
     QgsProcessingParameterRasterLayer,
     QgsProcessingParameterRasterDestination,
+    QgsProcessingParameterNumber,
+    QgsProcessingParameterDefinition,
     QgsProcessingException,
     QgsProcessing,
     QgsRasterLayer)
@@ -48,17 +50,24 @@ from qgis.PyQt.QtCore import (
     QCoreApplication,
     QVariant)
 
-from qgis import processing
+import os
+import sys
+
+if os.path.dirname(os.path.abspath(__file__)) not in sys.path:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from rstools import instrument
 
 # --------------------------------------------------------------------------------------------------------------------
 # 2 ----- Define the algorithm as a class inheriting from QgsProcessingAlgorithm -------
 # --------------------------------------------------------------------------------------------------------------------
 
-class mioScript(QgsProcessingAlgorithm):
+class LinearToDbStack(QgsProcessingAlgorithm):
     
     # 2A
     INPUT  = "INPUT"
     OUTPUT = "OUTPUT"
+    MEMORY_BUDGET = "MEMORY_BUDGET"
  
     # 2B
     def tr(self, string):
@@ -66,7 +75,7 @@ class mioScript(QgsProcessingAlgorithm):
 
     # 2C
     def createInstance(self):
-        return mioScript()
+        return LinearToDbStack()
     
     # 2D
     def name(self):
@@ -105,23 +114,45 @@ class mioScript(QgsProcessingAlgorithm):
         self.addParameter(QgsProcessingParameterRasterDestination(
             self.OUTPUT,
             self.tr('Output dB stack')))
+
+        # 3C Memory budget: conversion windows and, a quarter of it, the block cache
+        memoryBudget = QgsProcessingParameterNumber(
+            self.MEMORY_BUDGET,
+            self.tr('Memory budget in MB (0 = RSTOOLS_MEMORY_MB or half the available memory)'),
+            type=QgsProcessingParameterNumber.Integer,
+            minValue=0,
+            defaultValue=0)
+        memoryBudget.setFlags(memoryBudget.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(memoryBudget)
             
     # --------------------------------------------------------------------------------------------------------------------
     # 4 ----------------------------------------- Import layers ----------------------------------------------------
     # --------------------------------------------------------------------------------------------------------------------
     
     # 4A
+    @instrument.traced
     def processAlgorithm(
         self, 
         parameters, 
         context, 
         feedback):
 
+        # 4A2 NumPy and the block engine, imported on the first run only
+        import numpy as np
+
+        from rstools import memory, stack
+
        # 4B Input string 
         pathStackIn = self.parameterAsString(
             parameters,
             self.INPUT,
             context)
+
+        # 4C Memory budget
+        budget = memory.MemoryBudget.fromSetting(self.parameterAsInt(
+            parameters,
+            self.MEMORY_BUDGET,
+            context)).apply()
  
         # -------------------------------------------------------------------------------------------------------------
         # 5 ------------------------------------- Check -----------------------------------------------------------
@@ -139,64 +170,30 @@ class mioScript(QgsProcessingAlgorithm):
         # 6 -------------------------------------- Processing ----------------------------------------------------
         # -------------------------------------------------------------------------------------------------------------    
         
-        #6A deriving input stack
+        #6A deriving input stack and output file
         stackIn = QgsRasterLayer(pathStackIn, "stack")
+        if not stackIn.isValid():
+            raise QgsProcessingException(self.invalidRasterError(parameters, self.INPUT))
 
-        # 6B loop over the bands
-        nBand = stackIn.bandCount()
-        
-        bandList = []
+        outputFile = self.parameterAsOutputLayer(
+            parameters,
+            self.OUTPUT,
+            context)
 
-        for band in range(1, nBand+1):
-        
-            # 6C db calculation 
-            operation = "10 * ( log10 ( " + pathStackIn + "@" + str(band) + " ) )"
-            
-            parametersCalc = {
-                "EXPRESSION": operation,
-                "LAYERS": stackIn,
-                "CELLSIZE": None,
-                "EXTENT": None,
-                "CRS": None,
-                "OUTPUT": "TEMPORARY_OUTPUT"}
-
-            # 6D
-            outRas = processing.run(
-                'qgis:rastercalculator',
-                parametersCalc,
-                is_child_algorithm = True,
-                context = context,
-                feedback = feedback)
-
-            # 6E 
-            bandList.append(outRas["OUTPUT"])
- 
-            # 6F Check for cancelation
-            if feedback.isCanceled():
-                return {}
-
-        # 6G stacking
-        parametersStack = {
-            "INPUT": bandList,
-            "PCT": False,
-            "SEPARATE": True,
-            "NODATA_INPUT": None,
-            "NODATA_OUTPUT": None,
-            "OPTIONS":"",
-            "EXTRA":"",
-            "DATA_TYPE": 5,
-            "OUTPUT": parameters[self.OUTPUT]}
-
-        # 6H
-        outStack = processing.run(
-            'gdal:merge', 
-            parametersStack,
-            is_child_algorithm = True,
-            context = context,
-            feedback = feedback)
-            
-        # 6I Check for cancelation
+        # 6B linear to dB conversion of every band, in strips sized on the memory budget
+        # read through the shared block cache, written straight to the output stack
+        with self.trace.stage("convert bands") as stage:
+            stack.convertStack(
+                stackIn.source(),
+                outputFile,
+                lambda values: 10.0 * np.log10(values),
+                windowRows=budget.stripRows(stackIn.width(), stack.CONVERT_PIXEL_BYTES),
+                feedback=feedback)
+            stage.count("bands", stackIn.bandCount())
+            stage.count("pixels", stackIn.bandCount() * stackIn.width() * stackIn.height())
+
+        # 6C Check for cancelation
         if feedback.isCanceled():
             return {}
             
-        return {self.OUTPUT: outStack["OUTPUT"]}
+        return {self.OUTPUT: outputFile}
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+
+    plugin.py
+
+    Date         : October 2026
+    Copyright : (C) 2026 by Giacomo Fontanelli
+    Email        : giacomofontanelli76 at gmail dot com
+
+***************************************************************************
+
+    This program is free software; you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation; either version 2 of the License, or
+    (at your option) any later version.
+
+***************************************************************************
+
+    QGIS plugin registering the processing provider
+
+***************************************************************************
+"""
+
+__author__ = 'Giacomo Fontanelli'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Giacomo Fontanelli'
+
+# --------------------------------------------------------------------------------------------------------------------
+# 1 -----------------------------------------------------------------------------------------------------------------
+# --------------------------------------------------------------------------------------------------------------------
+
+from qgis.core import QgsApplication
+
+from .provider import RsToolsProvider
+
+# --------------------------------------------------------------------------------------------------------------------
+# 2 ----------------------------------------- Plugin ---------------------------------------------------------------
+# --------------------------------------------------------------------------------------------------------------------
+
+class RsToolsPlugin(object):
+
+    def __init__(self, iface=None):
+        self.iface = iface
+        self.provider = None
+
+    # 2A also called by qgis_process, without a GUI
+    def initProcessing(self):
+        self.provider = RsToolsProvider()
+        QgsApplication.processingRegistry().addProvider(self.provider)
+
+    # 2B
+    def initGui(self):
+        self.initProcessing()
+
+    # 2C
+    def unload(self):
+        if self.provider is not None:
+            QgsApplication.processingRegistry().removeProvider(self.provider)
+            self.provider = None
@@ -39,6 +39,15 @@ from qgis.core import (
     QgsProcessingAlgorithm,
     QgsProcessingParameterFeatureSource,
     QgsProcessingParameterDistance,
+    QgsProcessingParameterEnum,
+    QgsProcessingParameterNumber,
+    QgsProcessingParameterRasterLayer,
+    QgsProcessingParameterBoolean,
+    QgsProcessingParameterString,
+    QgsProcessingParameterFileDestination,
+    QgsProcessingParameterFolderDestination,
+    QgsProcessingParameterField,
+    QgsProcessingParameterDefinition,
     QgsProcessingParameterRasterDestination,
     QgsProcessingException,
     QgsProcessing)
@@ -46,17 +55,36 @@ from qgis.core import (
 from qgis.PyQt.QtCore import (
     QCoreApplication)
 
-from qgis import processing
+import os
+import sys
+
+if os.path.dirname(os.path.abspath(__file__)) not in sys.path:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from rstools import instrument
 
 # --------------------------------------------------------------------------------------------------------------------
 # 2 ----- Define the algorithm as a class inheriting from QgsProcessingAlgorithm -------
 # --------------------------------------------------------------------------------------------------------------------
 
-class mioScript(QgsProcessingAlgorithm):
+class PolygonMask(QgsProcessingAlgorithm):
     
     # 2A
     INPUT = "INPUT"
     PIXEL_DIMENSION = "PIXEL_DIMENSION"
+    FIELD = "FIELD"
+    REFERENCE = "REFERENCE"
+    CROP = "CROP"
+    MODE = "MODE"
+    THREADS = "THREADS"
+    TILE_SIZE = "TILE_SIZE"
+    MEMORY_BUDGET = "MEMORY_BUDGET"
+    EXISTING = "EXISTING"
+    CHANGED = "CHANGED"
+    MANIFEST = "MANIFEST"
+    CLASS_MASKS = "CLASS_MASKS"
+    COMPACT_FORM = "COMPACT_FORM"
+    COMPACT = "COMPACT"
     OUTPUT = "OUTPUT"
  
     # 2B
@@ -65,7 +93,7 @@ class mioScript(QgsProcessingAlgorithm):
 
     # 2C
     def createInstance(self):
-        return mioScript()
+        return PolygonMask()
     
     # 2D
     def name(self):
@@ -85,7 +113,27 @@ class mioScript(QgsProcessingAlgorithm):
 
     # 2H
     def shortHelpString(self):
-        return self.tr("This script produces a 1-0 raster mask of polygons extension")
+        return self.tr("This script produces a 1-0 raster mask of polygons extension. "
+                       "With a class field the integer code of each polygon (1-65535) is burned "
+                       "instead, in a Byte or UInt16 label raster, and optionally one bit-packed "
+                       "mask per class (class_<code>.npz) is saved from the same pass. "
+                       "A compact copy of the 1-0 mask, bit-packed or run-length encoded per row "
+                       "(.npz, see rstools.packed), can be saved from the same pass too. "
+                       "The tiled mode rasterizes tile by tile and writes a tiled, sparse, "
+                       "DEFLATE compressed GeoTIFF: tiles without polygons are never written. "
+                       "With a reference raster the mask copies its geotransform, CRS and size "
+                       "(or a snapped sub-window around the polygons), so it matches the stack "
+                       "pixel for pixel and the point distance is ignored. "
+                       "With more than one thread the grid is split in tiles, rasterized "
+                       "by a pool of workers (0 = one per core). "
+                       "Tile size and worker count follow the memory budget, and a single pass "
+                       "mask larger than the budget is written in tiled mode. "
+                       "Update mode: given an existing mask and the geometry hash manifest written "
+                       "with it, only the tiles touched by the old or new geometries of the features "
+                       "that differ from the manifest (or of the changed/deleted feature IDs, when "
+                       "given) are rasterized again. The updated mask is written to the output, in "
+                       "the format of the existing mask; the output may be the existing file itself. "
+                       "Compressed masks are rewritten tile by tile so they do not grow")
 
     # --------------------------------------------------------------------------------------------------------------------
     # 3 ---------- Define the parameters of the processing framework -----------------------------
@@ -106,22 +154,123 @@ class mioScript(QgsProcessingAlgorithm):
             parentParameterName=self.INPUT,
             minValue=0.0,
             defaultValue=10.0))
+
+        # 3B2 Class code field
+        self.addParameter(QgsProcessingParameterField(
+            self.FIELD,
+            self.tr('Class code field (multi-class label raster)'),
+            parentLayerParameterName=self.INPUT,
+            type=QgsProcessingParameterField.Numeric,
+            optional=True))
+
+        # 3C Reference raster for the grid
+        self.addParameter(QgsProcessingParameterRasterLayer(
+            self.REFERENCE,
+            self.tr('Reference raster (grid alignment)'),
+            optional=True))
+
+        # 3D Crop the reference grid around the polygons
+        self.addParameter(QgsProcessingParameterBoolean(
+            self.CROP,
+            self.tr('Crop the reference grid to the polygons extent'),
+            defaultValue=False))
+
+        # 3E Output mode
+        self.addParameter(QgsProcessingParameterEnum(
+            self.MODE,
+            self.tr('Output mode'),
+            options=[self.tr('Single pass in memory'),
+                     self.tr('Tiled, sparse, DEFLATE compressed (GeoTIFF)')],
+            defaultValue=0))
+
+        # 3F Worker threads
+        self.addParameter(QgsProcessingParameterNumber(
+            self.THREADS,
+            self.tr('Rasterization threads (0 = all cores)'),
+            type=QgsProcessingParameterNumber.Integer,
+            minValue=0,
+            defaultValue=1))
+
+        tileSize = QgsProcessingParameterNumber(
+            self.TILE_SIZE,
+            self.tr('Tile size in pixels (multiple of 16, 0 = from the memory budget)'),
+            type=QgsProcessingParameterNumber.Integer,
+            minValue=0,
+            defaultValue=0)
+        tileSize.setFlags(tileSize.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(tileSize)
+
+        memoryBudget = QgsProcessingParameterNumber(
+            self.MEMORY_BUDGET,
+            self.tr('Memory budget in MB (0 = RSTOOLS_MEMORY_MB or half the available memory)'),
+            type=QgsProcessingParameterNumber.Integer,
+            minValue=0,
+            defaultValue=0)
+        memoryBudget.setFlags(memoryBudget.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(memoryBudget)
+
+        # 3G Existing mask to update in place
+        self.addParameter(QgsProcessingParameterRasterLayer(
+            self.EXISTING,
+            self.tr('Existing mask to update'),
+            optional=True))
+
+        # 3H Changed or deleted feature IDs
+        self.addParameter(QgsProcessingParameterString(
+            self.CHANGED,
+            self.tr('Changed or deleted feature IDs (comma separated)'),
+            optional=True))
             
-        # 3D Output raster
+        # 3I Output raster
         self.addParameter(QgsProcessingParameterRasterDestination(
             self.OUTPUT,
             self.tr('Output raster')))
 
+        # 3J Geometry hash manifest, read on update and then rewritten
+        self.addParameter(QgsProcessingParameterFileDestination(
+            self.MANIFEST,
+            self.tr('Geometry hash manifest'),
+            fileFilter='JSON (*.json)',
+            optional=True,
+            createByDefault=False))
+
+        # 3K Per-class bit-packed masks
+        self.addParameter(QgsProcessingParameterFolderDestination(
+            self.CLASS_MASKS,
+            self.tr('Folder for per-class bit-packed masks'),
+            optional=True,
+            createByDefault=False))
+
+        # 3L Compact form of the mask
+        self.addParameter(QgsProcessingParameterEnum(
+            self.COMPACT_FORM,
+            self.tr('Compact mask form'),
+            options=[self.tr('Bit-packed (8 pixels per byte)'),
+                     self.tr('Run-length encoded rows')],
+            defaultValue=0))
+
+        # 3M Compact mask file
+        self.addParameter(QgsProcessingParameterFileDestination(
+            self.COMPACT,
+            self.tr('Compact 1-0 mask'),
+            fileFilter='NumPy archive (*.npz)',
+            optional=True,
+            createByDefault=False))
+
     # --------------------------------------------------------------------------------------------------------------------
     # 4 ----------------------------------------- Import layers ----------------------------------------------------
     # --------------------------------------------------------------------------------------------------------------------
     
+    @instrument.traced
     def processAlgorithm(
         self, 
         parameters, 
         context, 
         feedback):
 
+        # 4A Engine modules (NumPy, GDAL), imported on the first run only
+        from rstools import masks, memory, packed
+
         # 4B Input polygon 
         source = self.parameterAsSource(
             parameters,
@@ -134,6 +283,78 @@ class mioScript(QgsProcessingAlgorithm):
             self.PIXEL_DIMENSION,
             context)
 
+        # 4C2 Class field and per-class masks folder
+        classFields = self.parameterAsFields(
+            parameters,
+            self.FIELD,
+            context)
+
+        classFolder = self.parameterAsString(
+            parameters,
+            self.CLASS_MASKS,
+            context)
+
+        # 4C3 Compact mask
+        compactForm = self.parameterAsEnum(
+            parameters,
+            self.COMPACT_FORM,
+            context)
+
+        compactFile = self.parameterAsFileOutput(
+            parameters,
+            self.COMPACT,
+            context)
+
+        # 4D Reference raster and crop
+        reference = self.parameterAsRasterLayer(
+            parameters,
+            self.REFERENCE,
+            context)
+
+        crop = self.parameterAsBool(
+            parameters,
+            self.CROP,
+            context)
+
+        # 4E Output mode, threads and tile size
+        mode = self.parameterAsEnum(
+            parameters,
+            self.MODE,
+            context)
+
+        threads = self.parameterAsInt(
+            parameters,
+            self.THREADS,
+            context)
+        if threads == 0:
+            threads = os.cpu_count() or 1
+
+        tileSize = self.parameterAsInt(
+            parameters,
+            self.TILE_SIZE,
+            context)
+
+        budget = memory.MemoryBudget.fromSetting(self.parameterAsInt(
+            parameters,
+            self.MEMORY_BUDGET,
+            context)).apply()
+
+        # 4F Update mode
+        existing = self.parameterAsRasterLayer(
+            parameters,
+            self.EXISTING,
+            context)
+
+        changed = self.parameterAsString(
+            parameters,
+            self.CHANGED,
+            context)
+
+        manifestFile = self.parameterAsFileOutput(
+            parameters,
+            self.MANIFEST,
+            context)
+
         # -------------------------------------------------------------------------------------------------------------
         # 5 ------------------------------------- Check -----------------------------------------------------------
         # -------------------------------------------------------------------------------------------------------------
@@ -142,54 +363,241 @@ class mioScript(QgsProcessingAlgorithm):
         if source is None:
             raise QgsProcessingException(self.invalidSourceError(parameters, INPUT))
    
-        # 5B Check for cancelation
+        # 5B Tiled output constraints, checked for every mode: the memory
+        # budget may switch a single pass run to tiled mode
+        if tileSize % 16 != 0:
+            raise QgsProcessingException(self.tr('Tile size must be a multiple of 16'))
+
+        # 5C Update mode needs the manifest stored with the existing mask,
+        # the changed IDs only narrow the features compared
+        changedFids = None
+        if changed:
+            try:
+                changedFids = [int(fid) for fid in changed.split(",") if fid.strip()]
+            except ValueError:
+                raise QgsProcessingException(self.tr('Changed feature IDs must be integers'))
+
+        manifest = None
+        if existing is not None and manifestFile and os.path.exists(manifestFile):
+            manifest = masks.readManifest(manifestFile)
+
+        if existing is not None and manifest is None:
+            raise QgsProcessingException(self.tr('Update mode needs the geometry hash manifest '
+                                                 'written with the existing mask'))
+
+        # 5D Class mode
+        classField = source.fields().lookupField(classFields[0]) if classFields else None
+        values = masks.CLASSES if classField is not None else masks.MASK
+        if classFolder and classField is None:
+            raise QgsProcessingException(self.tr('Per-class masks need a class code field'))
+
+        # 5E Check for cancelation
         if feedback.isCanceled():
             return {}
 
         # -------------------------------------------------------------------------------------------------------------
-        # 6 ------------------------------------ Rasterization -with GDAL ----------------------------------
+        # 6 ------------------------------------ Rasterization - in memory ---------------------------------
         # -------------------------------------------------------------------------------------------------------------
 
-        # 6A Retrieve border limits
-        ext = source.sourceExtent()
-        xmin = ext.xMinimum()
-        xmax = ext.xMaximum()
-        ymin = ext.yMinimum()
-        ymax = ext.yMaximum()
-
-        # 6B Raster number of column and row 
-        nCol = int((xmax - xmin) / pixelDim)
-        nRow = int((ymax - ymin) / pixelDim)
-
-        # 6C Parameters for rasterization
-        processPar = {
-            "INPUT":parameters[self.INPUT],
-            "FIELD":"",
-            "BURN":1,
-            "UNITS":0,
-            "WIDTH":nCol,
-            "HEIGHT":nRow,
-            "EXTENT": parameters[self.INPUT],
-            "NODATA":"nan",
-            "OPTIONS":"",
-            "DATA_TYPE":1,
-            "INIT":0,
-            "INVERT":False,
-            "EXTRA":"",
-            "OUTPUT": parameters[self.OUTPUT]}
-
-        # 6D Run rasterization
-        processOut = processing.run(
-            "gdal:rasterize",
-            processPar,
-            is_child_algorithm=False,
-            context=context,
-            feedback=feedback)
-        
-        # 6E Check for cancelation
+        # 6A Output file, the only write of the algorithm
+        outputFile = self.parameterAsOutputLayer(
+            parameters,
+            self.OUTPUT,
+            context)
+
+        if mode == 1 and existing is None and os.path.splitext(outputFile)[1].lower() not in (".tif", ".tiff"):
+            raise QgsProcessingException(self.tr('Tiled mode writes GeoTIFF files only'))
+
+        if existing is not None and \
+                os.path.splitext(outputFile)[1].lower() != os.path.splitext(existing.source())[1].lower():
+            raise QgsProcessingException(self.tr('The updated mask keeps the format of the existing mask'))
+
+        # 6B Polygons in an OGR memory layer, in the CRS of the existing
+        # or reference raster if any
+        gridLayer = existing if existing is not None else reference
+        with self.trace.stage("read polygons") as stage:
+            polygons = masks.PolygonSet(
+                source,
+                feedback=feedback,
+                crs=gridLayer.crs() if gridLayer is not None else None,
+                transformContext=context.transformContext(),
+                classField=classField)
+            stage.count("features", len(polygons))
+
+        # 6C Check for cancelation and class codes
+        if feedback.isCanceled():
+            return {}
+
+        try:
+            masks.valueType(polygons, values)
+        except ValueError as error:
+            raise QgsProcessingException(str(error))
+
+        # 6D Raster grid: existing or reference raster grid (or its snapped
+        # sub-window), otherwise the polygons extent
+        if gridLayer is not None:
+            grid = masks.MaskGrid.fromReference(gridLayer.source())
+            if crop and existing is None:
+                try:
+                    grid = grid.snap(polygons.extent())
+                except ValueError:
+                    raise QgsProcessingException(self.tr('Polygons do not overlap the reference raster'))
+        else:
+            grid = masks.MaskGrid.fromExtent(
+                source.sourceExtent(),
+                pixelDim,
+                source.sourceCrs().toWkt())
+
+        # 6D1 Tile size and threads within the memory budget: up to two
+        # tiles per worker are in flight, each a MEM dataset and its array
+        tileBytes = 2 * masks.pixelBytes(polygons, values)
+        if tileSize == 0:
+            tileSize = budget.windowSize(tileBytes, windows=2 * threads)
+        threads = budget.workers(threads, 2 * tileSize * tileSize * tileBytes)
+
+        # a single pass array larger than the budget is written tile by tile
+        if existing is None and mode == 0 and not budget.fits(tileBytes * grid.nCol * grid.nRow):
+            if os.path.splitext(outputFile)[1].lower() not in (".tif", ".tiff"):
+                raise QgsProcessingException(self.tr('The mask exceeds the memory budget: '
+                                                     'write a GeoTIFF in tiled mode'))
+            feedback.pushInfo(self.tr('The mask exceeds the memory budget, tiled mode used'))
+            mode = 1
+
+        # 6D2 Per-class bit-packed masks, filled from the same rasterization
+        classMasks = None
+        if classFolder:
+            if existing is not None:
+                feedback.pushInfo(self.tr('Per-class masks are not produced in update mode'))
+            else:
+                classMasks = masks.ClassMasks(polygons.classes, grid)
+
+        # 6D3 Compact 1-0 mask, bit-packed from the same rasterization
+        compactMask = None
+        if compactFile:
+            if existing is not None:
+                feedback.pushInfo(self.tr('The compact mask is not produced in update mode'))
+            else:
+                compactMask = packed.PackedMask.empty(grid.nCol, grid.nRow, grid.geotransform)
+
+        def onTile(xoff, yoff, tileArray):
+            if classMasks is not None:
+                classMasks.add(xoff, yoff, tileArray)
+            if compactMask is not None:
+                compactMask.setWindow(xoff, yoff, tileArray)
+
+        tileHook = onTile if classMasks is not None or compactMask is not None else None
+
+        # 6E Update mode: only the dirty tiles of the existing mask are
+        # rasterized again, the result goes to the output
+        if existing is not None:
+            try:
+                masks.checkUpdate(polygons, grid, existing.source(), manifest, values)
+            except (IOError, ValueError) as error:
+                raise QgsProcessingException(str(error))
+
+            updateTile = masks.blockSize(existing.source()) or tileSize
+            tiles = masks.dirtyTiles(
+                grid,
+                masks.dirtyRectangles(polygons, manifest, changedFids),
+                updateTile)
+
+            with self.trace.stage("update tiles") as stage:
+                try:
+                    updated = masks.updateMask(
+                        polygons,
+                        grid,
+                        existing.source(),
+                        outputFile,
+                        tiles,
+                        updateTile,
+                        values=values,
+                        feedback=feedback)
+                except (IOError, ValueError) as error:
+                    raise QgsProcessingException(str(error))
+                stage.count("tiles", len(tiles))
+
+            if updated is None:
+                return {}
+
+            feedback.pushInfo(self.tr('{} tiles updated').format(len(tiles)))
+
+        # 6F Tiled mode: rasterize and write only tiles with polygons
+        elif mode == 1:
+            with self.trace.stage("rasterize and write tiles") as stage:
+                try:
+                    written = masks.writeTiled(
+                        polygons,
+                        grid,
+                        outputFile,
+                        tileSize=tileSize,
+                        values=values,
+                        threads=threads,
+                        feedback=feedback,
+                        onTile=tileHook)
+                except IOError as error:
+                    raise QgsProcessingException(str(error))
+                stage.count("tiles", written)
+                stage.count("pixels", grid.nCol * grid.nRow)
+
+            feedback.pushInfo(self.tr('{} tiles written').format(written))
+
+        # 6G Run rasterization in a GDAL MEM dataset, tile by tile
+        # in a pool of workers when more than one thread is asked
+        else:
+            with self.trace.stage("rasterize") as stage:
+                if threads > 1:
+                    maskArray = masks.rasterizeTiled(
+                        polygons,
+                        grid,
+                        tileSize=tileSize,
+                        values=values,
+                        threads=threads,
+                        feedback=feedback,
+                        onTile=tileHook)
+                else:
+                    maskArray = masks.cachedRasterize(
+                        polygons,
+                        grid,
+                        values)
+                    if tileHook is not None:
+                        tileHook(0, 0, maskArray)
+                stage.count("pixels", grid.nCol * grid.nRow)
+
+            if feedback.isCanceled():
+                return {}
+
+            with self.trace.stage("write raster"):
+                masks.writeMask(
+                    maskArray,
+                    grid,
+                    outputFile)
+
+        # 6H Check for cancelation
         if feedback.isCanceled():
             return {}
+
+        # 6I Store the geometry hashes for the next update
+        results = {self.OUTPUT: outputFile}
+        if manifestFile:
+            with self.trace.stage("write manifest"):
+                masks.writeManifest(manifestFile, polygons, grid)
+            results[self.MANIFEST] = manifestFile
+
+        # 6J Per-class masks
+        if classMasks is not None:
+            os.makedirs(classFolder, exist_ok=True)
+            with self.trace.stage("write class masks") as stage:
+                classMasks.save(classFolder)
+                stage.count("classes", len(polygons.classes))
+            results[self.CLASS_MASKS] = classFolder
+
+        # 6K Compact mask, run-length rows derived from the packed bytes
+        if compactMask is not None:
+            with self.trace.stage("write compact mask"):
+                if compactForm == 1:
+                    compactMask.toRuns().save(compactFile)
+                else:
+                    compactMask.save(compactFile)
+            results[self.COMPACT] = compactFile
         
-        return {self.OUTPUT: processOut["OUTPUT"]}
-    
-       
+        return results
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+
+    provider.py
+
+    Date         : October 2026
+    Copyright : (C) 2026 by Giacomo Fontanelli
+    Email        : giacomofontanelli76 at gmail dot com
+
+***************************************************************************
+
+    This program is free software; you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation; either version 2 of the License, or
+    (at your option) any later version.
+
+***************************************************************************
+
+    Processing provider of the scripts of this folder. Only the
+    algorithm metadata is loaded here: NumPy, GDAL and the rstools
+    engine are imported by each algorithm on its first run
+
+***************************************************************************
+"""
+
+__author__ = 'Giacomo Fontanelli'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Giacomo Fontanelli'
+
+# --------------------------------------------------------------------------------------------------------------------
+# 1 -----------------------------------------------------------------------------------------------------------------
+# --------------------------------------------------------------------------------------------------------------------
+
+import os
+
+from qgis.core import QgsProcessingProvider
+
+from qgis.PyQt.QtGui import QIcon
+
+from .dB_to_linear_stack import DbToLinearStack
+from .linear_to_db_stack import LinearToDbStack
+from .polygon_mask import PolygonMask
+from .regular_points import RegularPoints
+from .zonal_stack import ZonalStatisticsStack
+
+ALGORITHMS = (
+    DbToLinearStack,
+    LinearToDbStack,
+    PolygonMask,
+    RegularPoints,
+    ZonalStatisticsStack)
+
+# --------------------------------------------------------------------------------------------------------------------
+# 2 ----------------------------------------- Provider -------------------------------------------------------------
+# --------------------------------------------------------------------------------------------------------------------
+
+class RsToolsProvider(QgsProcessingProvider):
+
+    # 2A
+    def loadAlgorithms(self):
+        for algorithm in ALGORITHMS:
+            self.addAlgorithm(algorithm())
+
+    # 2B
+    def id(self):
+        return 'rstools'
+
+    # 2C
+    def name(self):
+        return 'RS tools'
+
+    # 2D
+    def longName(self):
+        return 'Remote sensing stack tools'
+
+    # 2E
+    def icon(self):
+        iconPath = os.path.join(os.path.dirname(__file__), 'icon.png')
+        return QIcon(iconPath) if os.path.exists(iconPath) else QgsProcessingProvider.icon(self)
@@ -40,6 +40,10 @@ from qgis.core import (
     QgsProcessingAlgorithm,
     QgsProcessingParameterFeatureSource,
     QgsProcessingParameterDistance,
+    QgsProcessingParameterField,
+    QgsProcessingParameterString,
+    QgsProcessingParameterNumber,
+    QgsProcessingParameterDefinition,
     QgsProcessingParameterRasterDestination,
     QgsProcessingParameterFeatureSink,
     QgsProcessingException,
@@ -56,20 +60,26 @@ from qgis.PyQt.QtCore import (
     QCoreApplication,
     QVariant)
 
-from qgis import processing
+import os
+import sys
 
-import numpy as np
-import gdal
+if os.path.dirname(os.path.abspath(__file__)) not in sys.path:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from rstools import instrument
 
 # --------------------------------------------------------------------------------------------------------------------
 # 2 ----- Define the algorithm as a class inheriting from QgsProcessingAlgorithm -------
 # --------------------------------------------------------------------------------------------------------------------
 
-class mioScript(QgsProcessingAlgorithm):
+class RegularPoints(QgsProcessingAlgorithm):
     
     # 2A
     INPUT = "INPUT"
     PIXEL_DIMENSION = "PIXEL_DIMENSION"
+    FIELDS = "FIELDS"
+    SPACINGS = "SPACINGS"
+    MEMORY_BUDGET = "MEMORY_BUDGET"
     OUTPUT = "OUTPUT"
  
     # 2B
@@ -78,7 +88,7 @@ class mioScript(QgsProcessingAlgorithm):
 
     # 2C
     def createInstance(self):
-        return mioScript()
+        return RegularPoints()
     
     # 2D
     def name(self):
@@ -98,7 +108,18 @@ class mioScript(QgsProcessingAlgorithm):
 
     # 2H
     def shortHelpString(self):
-        return self.tr("This script produces a 1-0 raster mask of polygons extension and a regular points net")
+        return self.tr("This script produces a 1-0 raster mask of polygons extension and a regular points net. "
+                       "Each point carries the ID of the polygon it falls in (poly_id) and, optionally, "
+                       "a copy of the selected polygon attributes, so no spatial join is needed afterwards "
+                       "(attributes named like an output field are copied as poly_<name>, numbered when "
+                       "still taken: id becomes poly_id_2). "
+                       "With a list of spacings (e.g. 10,20,40,80, each dividing the next) the polygons are "
+                       "rasterized once at the finest spacing and every coarser net is taken by strided "
+                       "subsampling of the same array; all levels go in the output with a spacing field. "
+                       "Coarser points sit on the coarse cell centers and take the value of the fine "
+                       "pixel holding that center (or the next one when the center is on a pixel edge). "
+                       "When the label raster exceeds the memory budget it is rasterized in strips "
+                       "of full rows, again for each level")
 
     # --------------------------------------------------------------------------------------------------------------------
     # 3 ---------- Define the parameters of the processing framework -----------------------------
@@ -119,8 +140,32 @@ class mioScript(QgsProcessingAlgorithm):
             parentParameterName=self.INPUT,
             minValue=0.0,
             defaultValue=10.0))
+
+        # 3C Polygon attributes copied on the points
+        self.addParameter(QgsProcessingParameterField(
+            self.FIELDS,
+            self.tr('Polygon attributes to copy'),
+            parentLayerParameterName=self.INPUT,
+            allowMultiple=True,
+            optional=True))
+
+        # 3D Spacings of a multi-resolution pyramid
+        self.addParameter(QgsProcessingParameterString(
+            self.SPACINGS,
+            self.tr('Point spacings for a multi-resolution net (comma separated, overrides the distance)'),
+            optional=True))
+
+        # 3D2 Memory budget
+        memoryBudget = QgsProcessingParameterNumber(
+            self.MEMORY_BUDGET,
+            self.tr('Memory budget in MB (0 = RSTOOLS_MEMORY_MB or half the available memory)'),
+            type=QgsProcessingParameterNumber.Integer,
+            minValue=0,
+            defaultValue=0)
+        memoryBudget.setFlags(memoryBudget.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(memoryBudget)
             
-        # 3D Output shape points
+        # 3E Output shape points
         self.addParameter(QgsProcessingParameterFeatureSink(
             self.OUTPUT,
             self.tr('Random points'),
@@ -130,12 +175,16 @@ class mioScript(QgsProcessingAlgorithm):
     # 4 ----------------------------------------- Import layers ----------------------------------------------------
     # --------------------------------------------------------------------------------------------------------------------
     
+    @instrument.traced
     def processAlgorithm(
         self, 
         parameters, 
         context, 
         feedback):
 
+        # 4A0 Engine modules (NumPy, GDAL), imported on the first run only
+        from rstools import masks, memory
+
         # 4A Input polygons 
         source = self.parameterAsSource(
             parameters,
@@ -147,8 +196,34 @@ class mioScript(QgsProcessingAlgorithm):
             parameters,
             self.PIXEL_DIMENSION,
             context)
+
+        # 4C Polygon attributes
+        copyFields = self.parameterAsFields(
+            parameters,
+            self.FIELDS,
+            context)
+
+        # 4D Spacings, the finest one is the raster pixel
+        spacingText = self.parameterAsString(
+            parameters,
+            self.SPACINGS,
+            context)
+
+        try:
+            spacings = sorted(set(float(value) for value in spacingText.split(",") if value.strip()))
+        except ValueError:
+            raise QgsProcessingException(self.tr('Spacings must be numbers'))
+
+        if spacings:
+            pixelDim = spacings[0]
+
+        # 4D2 Memory budget
+        budget = memory.MemoryBudget.fromSetting(self.parameterAsInt(
+            parameters,
+            self.MEMORY_BUDGET,
+            context)).apply()
         
-        # 4C Output point shapefile
+        # 4E Output point shapefile
         fields = QgsFields()
         fields.append(QgsField(
             "id",
@@ -156,6 +231,29 @@ class mioScript(QgsProcessingAlgorithm):
             "",
             1,
             0))
+        fields.append(QgsField(
+            "poly_id",
+            QVariant.LongLong))
+
+        if spacings:
+            fields.append(QgsField(
+                "spacing",
+                QVariant.Double))
+
+        copyIndexes = [source.fields().lookupField(name) for name in copyFields]
+        # copied attributes named like an output field get a poly_ prefix,
+        # and a number when still taken (id -> poly_id_2)
+        for index in copyIndexes:
+            field = QgsField(source.fields().at(index))
+            name = field.name()
+            count = 1
+            while fields.lookupField(field.name()) >= 0:
+                count += 1
+                field.setName("poly_" + name if count == 2 else "poly_{}_{}".format(name, count - 1))
+            if not fields.append(field):
+                raise QgsProcessingException(self.tr(
+                    'Cannot copy the polygon attribute {}: the output already has a field {}').format(
+                        source.fields().at(index).name(), field.name()))
         
         (sink, dest_id) = self.parameterAsSink(
             parameters, 
@@ -173,62 +271,69 @@ class mioScript(QgsProcessingAlgorithm):
         if source is None:
             raise QgsProcessingException(self.invalidSourceError(parameters, INPUT))
    
-        # 5B Check for cancelation
+        # 5B Spacings must be multiples of each other
+        steps = [1]
+        if spacings and spacings[0] <= 0:
+            raise QgsProcessingException(self.tr('Spacings must be positive'))
+        for coarse, fine in zip(spacings[1:], spacings[:-1]):
+            if abs(coarse / fine - round(coarse / fine)) > 1e-6:
+                raise QgsProcessingException(self.tr('Each spacing must divide the next one evenly'))
+        if spacings:
+            steps = [int(round(spacing / pixelDim)) for spacing in spacings]
+
+        # 5C Check for cancelation
         if feedback.isCanceled():
             return {}
 
         # -------------------------------------------------------------------------------------------------------------
-        # 6 ------------------------------------ Rasterization - with GDAL ---------------------------------
+        # 6 ------------------------------------ Rasterization - in memory ---------------------------------
         # -------------------------------------------------------------------------------------------------------------
 
-        # 6A Retrieve border limits
-        ext = source.sourceExtent()
-        Xmin  = ext.xMinimum()
-        Xmax = ext.xMaximum()
-        Ymin  = ext.yMinimum()
-        Ymax = ext.yMaximum()
-
-        # 6B Raster number of column and row 
-        nCol   = int((Xmax - Xmin) / pixelDim)
-        nRow = int((Ymax - Ymin) / pixelDim)
-
-        # 6C Parameters for rasterization
-        processPar = {
-            "INPUT": parameters[self.INPUT],
-            "FIELD": "",
-            "BURN": 1,
-            "UNITS": 0,
-            "WIDTH": nCol,
-            "HEIGHT": nRow,
-            "EXTENT": parameters[self.INPUT],
-            "NODATA": "nan",
-            "OPTIONS": "",
-            "DATA_TYPE": 1,
-            "INIT": 0,
-            "INVERT": False,
-            "EXTRA": "",
-            "OUTPUT": "TEMPORARY_OUTPUT"}
-
-        # 6D Run rasterization
-        processOut = processing.run(
-            "gdal:rasterize",
-            processPar,
-            is_child_algorithm = True,
-            context = context,
-            feedback = feedback)
-        
-        # 6E Check for cancelation
+        # 6A Labelled copy of the polygons: label N is the N-th feature,
+        # its ID and attributes are stored at index N of the lookup lists
+        with self.trace.stage("read polygons") as stage:
+            polygons = masks.PolygonSet(
+                source,
+                attributes=copyIndexes,
+                feedback=feedback)
+            stage.count("features", len(polygons))
+
+        polyFid = polygons.fids
+        polyAttr = polygons.attributes
+
+        # 6B Check for cancelation
         if feedback.isCanceled():
             return {}
-        
+
+        # 6C Raster grid on the polygons extent
+        grid = masks.MaskGrid.fromExtent(
+            source.sourceExtent(),
+            pixelDim,
+            source.sourceCrs().toWkt())
+
+        Xmin = grid.xMin
+        Ymax = grid.yMax
+
         # -------------------------------------------------------------------------------------------------------------
         # 7 ----------------------- Open in NUMPY ------------------------------------------------------------
         # -------------------------------------------------------------------------------------------------------------
 
-        # 7A open the raster in GDAL and then in numpy
-        rasterGDAL = gdal.Open(processOut["OUTPUT"])
-        band = rasterGDAL.GetRasterBand(1)
-        tempArray = band.ReadAsArray()
+        # 7A rasterize the labels in a GDAL MEM dataset, no file is written
+        # unless the result cache is enabled (RSTOOLS_CACHE_MB).
+        # Labels larger than the memory budget are rasterized in strips
+        # while writing the points. A pixel costs the UInt32 label and its
+        # MEM dataset and, when labelled, the two int64 indexes of
+        # np.nonzero and the label list of addPoints (full cover assumed)
+        labelBytes = 2 * masks.pixelBytes(polygons, masks.LABELS) + 2 * 8 + 4
+        tempArray = None
+        stripRows = budget.stripRows(grid.nCol, labelBytes)
+        if budget.fits(labelBytes * grid.nCol * grid.nRow):
+            with self.trace.stage("rasterize labels") as stage:
+                tempArray = masks.cachedRasterize(
+                    polygons,
+                    grid,
+                    values=masks.LABELS)
+                stage.count("pixels", grid.nCol * grid.nRow)
 
         # ------------------------------------------------------------------------------------------------------------
         # 8 ---------------------- Points -------------------------------------------------------------------------
@@ -236,30 +341,99 @@ class mioScript(QgsProcessingAlgorithm):
 
         # 8A attribute table
         features = QgsFeature()
-        features.initAttributes(1)
+        features.initAttributes(fields.count())
         features.setFields(fields)
-        
-        # 8E retrieve points
-        count = 0
+
+        # 8B one level per spacing, coarse levels by strided subsampling:
+        # coarse cell j covers fine pixels j*step .. j*step+step-1, its
+        # center falls in fine pixel j*step + step//2
         id0 = 1
-        pointList = np.where(tempArray == 1)
+        for step in steps:
+            nRowLevel = (grid.nRow // step) * step
+            nColLevel = (grid.nCol // step) * step
+            extra = [pixelDim * step] if spacings else []
+
+            levelId0 = id0
+            with self.trace.stage("points {:g}".format(pixelDim * step)) as stage:
+                if tempArray is not None:
+                    levelArray = tempArray[step // 2:nRowLevel:step, step // 2:nColLevel:step]
+                    id0 = self.addPoints(
+                        sink,
+                        features,
+                        levelArray,
+                        Xmin,
+                        Ymax,
+                        pixelDim * step,
+                        id0,
+                        polyFid,
+                        polyAttr,
+                        extra)
+
+                # 8C strips of whole coarse rows, same points in the same order
+                elif nColLevel > 0:
+                    rows = max(1, stripRows // step) * step
+                    for yoff in range(0, nRowLevel, rows):
+                        stripArray = masks.rasterizeWindow(
+                            polygons,
+                            grid,
+                            0,
+                            yoff,
+                            nColLevel,
+                            min(rows, nRowLevel - yoff),
+                            values=masks.LABELS)
+                        if stripArray is None:
+                            continue
+
+                        id0 = self.addPoints(
+                            sink,
+                            features,
+                            stripArray[step // 2::step, step // 2::step],
+                            Xmin,
+                            Ymax - pixelDim * yoff,
+                            pixelDim * step,
+                            id0,
+                            polyFid,
+                            polyAttr,
+                            extra)
+
+                        if feedback.isCanceled():
+                            return {}
+                stage.count("points", id0 - levelId0)
+
+            if feedback.isCanceled():
+                return {}
+            
+        return {self.OUTPUT: dest_id}
+
+    # --------------------------------------------------------------------------------------------------------------------
+    # 9 ----------------------------------------- Write points ----------------------------------------------------
+    # --------------------------------------------------------------------------------------------------------------------
+
+    def addPoints(self, sink, features, labelArray, Xmin, Ymax, spacing, id0, polyFid, polyAttr, extra):
+        """Add one point per labelled cell of labelArray, return the next id."""
+        import numpy as np
+
+        # 9A retrieve points and the label of their polygon
+        count = 0
+        pointList = np.nonzero(labelArray)
+        labelList = labelArray[pointList]
 
         for indexY in pointList[0]:
             indexX = pointList[1][count]
 
-            Xcoord = (Xmin + (pixelDim/2.0)) + (pixelDim * indexX)
-            Ycoord = (Ymax -  (pixelDim/2.0)) -  (pixelDim * indexY)
+            Xcoord = (Xmin + (spacing/2.0)) + (spacing * indexX)
+            Ycoord = (Ymax -  (spacing/2.0)) -  (spacing * indexY)
     
             pt = QgsPointXY(Xcoord,Ycoord)
             geom = QgsGeometry.fromPointXY(pt)
  
-            # 8F create featurs
-            features.setAttributes([id0])
+            # 9B create featurs
+            label = labelList[count]
+            features.setAttributes([id0, polyFid[label]] + extra + polyAttr[label])
             features.setGeometry(geom)
             sink.addFeature(features, QgsFeatureSink.FastInsert)
     
             count = count + 1
             id0 = id0 + 1
-            
-        return {self.OUTPUT: dest_id}
-    
+
+        return id0
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+
+    batch.py
+
+    Date         : October 2026
+    Copyright : (C) 2026 by Giacomo Fontanelli
+    Email        : giacomofontanelli76 at gmail dot com
+
+***************************************************************************
+
+    This program is free software; you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation; either version 2 of the License, or
+    (at your option) any later version.
+
+***************************************************************************
+
+    Headless batch runner: a pool of worker processes, each starting
+    QGIS and processing once, runs the jobs of a JSON manifest and
+    reports the status of every job
+
+    python -m rstools.batch jobs.json --workers 8 --report status.jsonl
+
+    jobs.json is a list of jobs, or {"jobs": [...]}, each job being
+    {"id": "...", "algorithm": "...", "parameters": {...}}; algorithm is a
+    processing id (native:buffer, rstools:Raster polygon mask), the name of
+    an algorithm of this folder (Raster polygon mask) or a script file
+    path (polygon_mask.py)
+
+***************************************************************************
+"""
+
+__author__ = 'Giacomo Fontanelli'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Giacomo Fontanelli'
+
+# --------------------------------------------------------------------------------------------------------------------
+# 1 -----------------------------------------------------------------------------------------------------------------
+# --------------------------------------------------------------------------------------------------------------------
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+
+if os.path.dirname(os.path.dirname(os.path.abspath(__file__))) not in sys.path:
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# --------------------------------------------------------------------------------------------------------------------
+# 2 ----------------------------------------- Worker ---------------------------------------------------------------
+# --------------------------------------------------------------------------------------------------------------------
+
+def initWorker(memoryMb):
+    """Pool initializer: QGIS, processing and the provider, once per worker."""
+    if memoryMb:
+        os.environ["RSTOOLS_MEMORY_MB"] = str(memoryMb)
+
+    from rstools import headless
+    headless.startQgis()
+
+
+def resolve(algorithm, baseFolder):
+    """Algorithm to run for the algorithm field of a job."""
+    from qgis.core import QgsApplication
+    from rstools import headless
+
+    if algorithm.endswith(".py"):
+        path = algorithm if os.path.isabs(algorithm) else os.path.join(baseFolder, algorithm)
+        if not os.path.exists(path):
+            path = os.path.join(headless.SCRIPT_FOLDER, algorithm)
+        return headless.scriptAlgorithm(path).create()
+
+    registry = QgsApplication.processingRegistry()
+    registered = registry.createAlgorithmById(algorithm)
+    if registered is None:
+        registered = registry.createAlgorithmById(headless.PROVIDER_ID + ":" + algorithm)
+    if registered is None:
+        raise ValueError("unknown algorithm " + algorithm)
+    return registered
+
+
+def runJob(item):
+    """Run one job in a worker, return its status record."""
+    index, job, baseFolder = item
+    from qgis.core import QgsProcessingContext, QgsProcessingFeedback
+    import processing
+
+    record = {
+        "id": job.get("id", index),
+        "algorithm": job.get("algorithm"),
+        "worker": os.getpid()}
+    start = time.perf_counter()
+
+    try:
+        algorithm = resolve(job["algorithm"], baseFolder)
+        context = QgsProcessingContext()
+        feedback = QgsProcessingFeedback()
+        results = processing.run(algorithm, job.get("parameters", {}), context=context, feedback=feedback)
+        record["status"] = "canceled" if feedback.isCanceled() else "ok"
+        record["results"] = {name: _jsonValue(value) for name, value in (results or {}).items()}
+    except Exception as error:
+        record["status"] = "error"
+        record["message"] = str(error)
+        record["traceback"] = traceback.format_exc()
+
+    record["seconds"] = time.perf_counter() - start
+    return record
+
+
+def _jsonValue(value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [_jsonValue(item) for item in value]
+    if isinstance(value, dict):
+        return {str(name): _jsonValue(item) for name, item in value.items()}
+    return str(value)
+
+# --------------------------------------------------------------------------------------------------------------------
+# 3 ----------------------------------------- Runner ---------------------------------------------------------------
+# --------------------------------------------------------------------------------------------------------------------
+
+def readManifest(path):
+    with open(path) as manifestFile:
+        manifest = json.load(manifestFile)
+    jobs = manifest["jobs"] if isinstance(manifest, dict) else manifest
+    for index, job in enumerate(jobs):
+        if "algorithm" not in job:
+            raise ValueError("job {} has no algorithm".format(job.get("id", index)))
+    return jobs
+
+
+def runBatch(jobs, baseFolder, workers=None, memoryMb=None, jobsPerWorker=None, report=None):
+    """Run jobs in a pool of warm workers, yield the status records as they end.
+
+    memoryMb is the memory budget of the whole batch, split between the
+    workers; jobsPerWorker restarts a worker after that many jobs.
+    """
+    workers = workers or os.cpu_count() or 1
+    workerMemory = int(memoryMb / workers) if memoryMb else None
+
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(
+            processes=workers,
+            initializer=initWorker,
+            initargs=(workerMemory,),
+            maxtasksperchild=jobsPerWorker) as pool:
+        items = [(index, job, baseFolder) for index, job in enumerate(jobs)]
+        for record in pool.imap_unordered(runJob, items):
+            if report is not None:
+                report.write(json.dumps(record) + "\n")
+                report.flush()
+            yield record
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Run processing jobs with warm QGIS workers")
+    parser.add_argument("manifest", help="JSON list of jobs {id, algorithm, parameters}")
+    parser.add_argument("--workers", type=int, default=0, help="worker processes (0 = one per core)")
+    parser.add_argument("--memory-mb", type=float, default=0,
+                        help="memory budget of the batch, split between the workers (0 = RSTOOLS_MEMORY_MB)")
+    parser.add_argument("--jobs-per-worker", type=int, default=0, help="restart workers after N jobs (0 = never)")
+    parser.add_argument("--report", help="JSON lines status file (default standard output)")
+    options = parser.parse_args(arguments)
+
+    jobs = readManifest(options.manifest)
+    memoryMb = options.memory_mb or float(os.environ.get("RSTOOLS_MEMORY_MB", "0") or 0)
+    report = open(options.report, "w") if options.report else sys.stdout
+
+    counts = {}
+    start = time.perf_counter()
+    try:
+        for record in runBatch(
+                jobs,
+                os.path.dirname(os.path.abspath(options.manifest)),
+                workers=options.workers or None,
+                memoryMb=memoryMb or None,
+                jobsPerWorker=options.jobs_per_worker or None,
+                report=report):
+            counts[record["status"]] = counts.get(record["status"], 0) + 1
+            if options.report:
+                print("{} {} {:.2f} s".format(record["status"], record["id"], record["seconds"]))
+    finally:
+        if options.report:
+            report.close()
+
+    sys.stderr.write("{} jobs in {:.1f} s: {}\n".format(
+        len(jobs), time.perf_counter() - start,
+        ", ".join("{} {}".format(value, name) for name, value in sorted(counts.items()))))
+    return 0 if counts.get("ok", 0) == len(jobs) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+
+    blocks.py
+
+    Date         : October 2026
+    Copyright : (C) 2026 by Giacomo Fontanelli
+    Email        : giacomofontanelli76 at gmail dot com
+
+***************************************************************************
+
+    This program is free software; you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation; either version 2 of the License, or
+    (at your option) any later version.
+
+***************************************************************************
+
+    Process-wide LRU cache of decoded stack blocks, keyed by
+    (dataset, band, block x, block y), within a memory budget. Evicted
+    blocks can be spilled compressed to a local folder
+
+    RSTOOLS_BLOCK_CACHE_MB    memory budget in MB (default 512)
+    RSTOOLS_BLOCK_SPILL_DIR   spill folder, e.g. on a local SSD (default none)
+    RSTOOLS_BLOCK_SPILL_MB    size limit of the spill folder in MB (default 4096),
+                              the oldest files are removed first
+
+***************************************************************************
+"""
+
+__author__ = 'Giacomo Fontanelli'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Giacomo Fontanelli'
+
+# --------------------------------------------------------------------------------------------------------------------
+# 1 -----------------------------------------------------------------------------------------------------------------
+# --------------------------------------------------------------------------------------------------------------------
+
+import hashlib
+import io
+import os
+import threading
+import zlib
+
+from collections import OrderedDict
+
+import numpy as np
+
+# Spill files: a zlib compressed .npy
+SPILL_EXTENSION = ".npy.zlib"
+
+# --------------------------------------------------------------------------------------------------------------------
+# 2 ----------------------------------------- Block cache ----------------------------------------------------------
+# --------------------------------------------------------------------------------------------------------------------
+
+class BlockCache(object):
+    """LRU cache of read-only NumPy blocks within budgetBytes."""
+
+    def __init__(self, budgetBytes=None, spillFolder=None, spillBytes=None):
+        if budgetBytes is None:
+            budgetBytes = int(float(os.environ.get("RSTOOLS_BLOCK_CACHE_MB", "512")) * 1024 * 1024)
+        if spillFolder is None:
+            spillFolder = os.environ.get("RSTOOLS_BLOCK_SPILL_DIR") or None
+        if spillBytes is None:
+            spillBytes = int(float(os.environ.get("RSTOOLS_BLOCK_SPILL_MB", "4096")) * 1024 * 1024)
+
+        self.budgetBytes = budgetBytes
+        self.spillFolder = spillFolder
+        self.spillBytes = spillBytes
+        self.usedBytes = 0
+        self.spilledBytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._blocks = OrderedDict()
+        self._lock = threading.Lock()
+        # spill files, oldest first, as path -> size; the folder is
+        # scanned on the first spill
+        self._spilled = None
+        self._spillLock = threading.Lock()
+
+    def get(self, key, read):
+        """Block of key, read() decodes it on a miss."""
+        with self._lock:
+            block = self._blocks.get(key)
+            if block is not None:
+                self._blocks.move_to_end(key)
+                self.hits += 1
+                return block
+
+        block = self._unspill(key)
+        if block is None:
+            block = read()
+        block.setflags(write=False)
+
+        with self._lock:
+            self.misses += 1
+            if block.nbytes <= self.budgetBytes and key not in self._blocks:
+                self._blocks[key] = block
+                self.usedBytes += block.nbytes
+            evicted = self._evict()
+        self._spillAll(evicted)
+        return block
+
+    def resize(self, budgetBytes):
+        with self._lock:
+            self.budgetBytes = budgetBytes
+            evicted = self._evict()
+        self._spillAll(evicted)
+
+    def clear(self):
+        """Drop every block, spilled ones included."""
+        with self._lock:
+            self._blocks.clear()
+            self.usedBytes = 0
+        if self.spillFolder is None:
+            return
+        with self._spillLock:
+            for name in _listDir(self.spillFolder):
+                if name.endswith(SPILL_EXTENSION):
+                    _remove(os.path.join(self.spillFolder, name))
+            self._spilled = OrderedDict()
+            self.spilledBytes = 0
+
+    def _evict(self):
+        """Remove least recently used blocks over the budget, return them.
+
+        Called with the lock held; the caller spills them after releasing it.
+        """
+        evicted = []
+        while self.usedBytes > self.budgetBytes and self._blocks:
+            key, block = self._blocks.popitem(last=False)
+            self.usedBytes -= block.nbytes
+            evicted.append((key, block))
+        return evicted
+
+    # 2A ----- spill to local folder, within spillBytes
+
+    def _spillPath(self, key):
+        name = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.spillFolder, name + SPILL_EXTENSION)
+
+    def _spillAll(self, evicted):
+        if self.spillFolder is None:
+            return
+        for key, block in evicted:
+            self._spill(key, block)
+
+    def _spill(self, key, block):
+        path = self._spillPath(key)
+        if os.path.exists(path):
+            return
+        buffer = io.BytesIO()
+        np.save(buffer, block)
+        data = zlib.compress(buffer.getvalue(), 1)
+        if len(data) > self.spillBytes:
+            return
+
+        os.makedirs(self.spillFolder, exist_ok=True)
+        staging = path + ".part"
+        with open(staging, "wb") as spillFile:
+            spillFile.write(data)
+        os.replace(staging, path)
+
+        with self._spillLock:
+            spilled = self._spillFiles()
+            self.spilledBytes += len(data) - spilled.pop(path, 0)
+            spilled[path] = len(data)
+            while self.spilledBytes > self.spillBytes and spilled:
+                oldest, size = spilled.popitem(last=False)
+                _remove(oldest)
+                self.spilledBytes -= size
+
+    def _spillFiles(self):
+        """Spill files of the folder, oldest first; called with the spill lock held."""
+        if self._spilled is None:
+            files = []
+            for name in _listDir(self.spillFolder):
+                if name.endswith(SPILL_EXTENSION):
+                    path = os.path.join(self.spillFolder, name)
+                    try:
+                        files.append((os.path.getmtime(path), path, os.path.getsize(path)))
+                    except OSError:
+                        continue
+            self._spilled = OrderedDict((path, size) for _, path, size in sorted(files))
+            self.spilledBytes = sum(self._spilled.values())
+        return self._spilled
+
+    def _unspill(self, key):
+        """Block of key read back from the spill folder, the file is removed."""
+        if self.spillFolder is None:
+            return None
+        path = self._spillPath(key)
+        try:
+            with open(path, "rb") as spillFile:
+                block = np.load(io.BytesIO(zlib.decompress(spillFile.read())))
+        except (IOError, OSError, ValueError, zlib.error):
+            return None
+
+        with self._spillLock:
+            if self._spilled is not None and path in self._spilled:
+                self.spilledBytes -= self._spilled.pop(path)
+            _remove(path)
+        return block
+
+
+_blockCache = None
+
+
+def blockCache():
+    """Process-wide block cache configured from the environment."""
+    global _blockCache
+    if _blockCache is None:
+        _blockCache = BlockCache()
+    return _blockCache
+
+# --------------------------------------------------------------------------------------------------------------------
+# 3 ----------------------------------------- Helpers --------------------------------------------------------------
+# --------------------------------------------------------------------------------------------------------------------
+
+def _listDir(folder):
+    try:
+        return os.listdir(folder)
+    except OSError:
+        return []
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+
+    cache.py
+
+    Date         : October 2026
+    Copyright : (C) 2026 by Giacomo Fontanelli
+    Email        : giacomofontanelli76 at gmail dot com
+
+***************************************************************************
+
+    This program is free software; you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation; either version 2 of the License, or
+    (at your option) any later version.
+
+***************************************************************************
+
+    Local cache for intermediate results, off unless a size limit is set:
+    rasterized arrays are stored under a hash of their inputs (polygon
+    digest, grid) and parameters, with LRU eviction over the size limit
+
+    RSTOOLS_CACHE_DIR    cache folder (default ~/.cache/rstools)
+    RSTOOLS_CACHE_MB     size limit in MB (default 0, the cache is disabled)
+
+***************************************************************************
+"""
+
+__author__ = 'Giacomo Fontanelli'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Giacomo Fontanelli'
+
+# --------------------------------------------------------------------------------------------------------------------
+# 1 -----------------------------------------------------------------------------------------------------------------
+# --------------------------------------------------------------------------------------------------------------------
+
+import hashlib
+import json
+import os
+import shutil
+import uuid
+
+import numpy as np
+
+RESULT_FILE = "result.json"
+
+# --------------------------------------------------------------------------------------------------------------------
+# 2 ----------------------------------------- Cache ----------------------------------------------------------------
+# --------------------------------------------------------------------------------------------------------------------
+
+class ResultCache(object):
+    """Store of files addressed by a hash of their inputs, one folder per key.
+
+    An entry is <folder>/<key[:2]>/<key>/ holding the cached files and
+    result.json; its modification time is the last access used by the
+    LRU eviction.
+    """
+
+    def __init__(self, folder=None, maxBytes=None):
+        if folder is None:
+            folder = os.environ.get("RSTOOLS_CACHE_DIR") or os.path.join(
+                os.path.expanduser("~"), ".cache", "rstools")
+        if maxBytes is None:
+            maxBytes = int(float(os.environ.get("RSTOOLS_CACHE_MB", "0") or 0) * 1024 * 1024)
+
+        self.folder = folder
+        self.maxBytes = maxBytes
+
+    @property
+    def enabled(self):
+        return self.maxBytes > 0
+
+    # 2A ----- keys
+
+    def key(self, *parts):
+        """Hash of parts: strings, numbers and lists of them, as JSON."""
+        text = json.dumps(parts, sort_keys=True)
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    # 2B ----- entries
+
+    def entry(self, key):
+        return os.path.join(self.folder, key[:2], key)
+
+    def lookup(self, key):
+        """Stored result of key (dict of output name -> file path) or None."""
+        if not self.enabled:
+            return None
+        entry = self.entry(key)
+        resultFile = os.path.join(entry, RESULT_FILE)
+        try:
+            with open(resultFile) as result:
+                files = json.load(result)
+            os.utime(resultFile)
+        except (IOError, OSError, ValueError):
+            return None
+        return {name: os.path.join(entry, fileName) for name, fileName in files.items()}
+
+    def store(self, key, produce):
+        """Run produce(folder) -> {name: file in folder} and keep its files under key.
+
+        produce returns None when canceled: nothing is stored.
+        """
+        staging = os.path.join(self.folder, "staging-" + uuid.uuid4().hex)
+        os.makedirs(staging)
+        try:
+            files = produce(staging)
+            if files is None:
+                shutil.rmtree(staging, ignore_errors=True)
+                return None
+            with open(os.path.join(staging, RESULT_FILE), "w") as result:
+                json.dump({name: os.path.relpath(path, staging) for name, path in files.items()}, result)
+
+            entry = self.entry(key)
+            os.makedirs(os.path.dirname(entry), exist_ok=True)
+            try:
+                os.rename(staging, entry)
+            except OSError:
+                # Stored meanwhile by another process
+                shutil.rmtree(staging, ignore_errors=True)
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        self.evict(keep=self.entry(key))
+        return self.lookup(key)
+
+    def evict(self, keep=None):
+        """Remove the least recently used entries until under the size limit."""
+        entries = []
+        total = 0
+        for prefix in _listDir(self.folder):
+            prefixFolder = os.path.join(self.folder, prefix)
+            if len(prefix) != 2 or not os.path.isdir(prefixFolder):
+                continue
+            for key in _listDir(prefixFolder):
+                entry = os.path.join(prefixFolder, key)
+                size = sum(os.path.getsize(os.path.join(entry, name)) for name in _listDir(entry))
+                try:
+                    accessed = os.path.getmtime(os.path.join(entry, RESULT_FILE))
+                except OSError:
+                    accessed = 0.0
+                entries.append((accessed, size, entry))
+                total += size
+
+        for accessed, size, entry in sorted(entries):
+            if total <= self.maxBytes:
+                break
+            if entry == keep:
+                continue
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+    # 2C ----- arrays
+
+    def array(self, key, produce):
+        """NumPy array stored under key, produce() computes it on a miss."""
+        if not self.enabled:
+            return produce()
+
+        cached = self.lookup(key)
+        if cached is not None:
+            return np.load(cached["array"])
+
+        array = produce()
+
+        def write(folder):
+            path = os.path.join(folder, "array.npy")
+            np.save(path, array)
+            return {"array": path}
+
+        self.store(key, write)
+        return array
+
+    def loadArray(self, key):
+        """NumPy array stored under key, None on a miss."""
+        cached = self.lookup(key)
+        return np.load(cached["array"]) if cached is not None else None
+
+
+_defaultCache = None
+
+
+def defaultCache():
+    """Process-wide cache configured from the environment."""
+    global _defaultCache
+    if _defaultCache is None:
+        _defaultCache = ResultCache()
+    return _defaultCache
+
+# --------------------------------------------------------------------------------------------------------------------
+# 3 ----------------------------------------- Helpers --------------------------------------------------------------
+# --------------------------------------------------------------------------------------------------------------------
+
+def _listDir(folder):
+    try:
+        return os.listdir(folder)
+    except OSError:
+        return []
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+
+    headless.py
+
+    Date         : October 2026
+    Copyright : (C) 2026 by Giacomo Fontanelli
+    Email        : giacomofontanelli76 at gmail dot com
+
+***************************************************************************
+
+    This program is free software; you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation; either version 2 of the License, or
+    (at your option) any later version.
+
+***************************************************************************
+
+    QGIS without a GUI for command line tools: one QgsApplication and
+    one processing registry per process, with the provider of this folder
+    registered, and single script files loaded by path
+
+***************************************************************************
+"""
+
+__author__ = 'Giacomo Fontanelli'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Giacomo Fontanelli'
+
+# --------------------------------------------------------------------------------------------------------------------
+# 1 -----------------------------------------------------------------------------------------------------------------
+# --------------------------------------------------------------------------------------------------------------------
+
+import importlib
+import importlib.util
+import os
+import sys
+
+from qgis.core import (
+    QgsApplication,
+    QgsProcessingAlgorithm)
+
+SCRIPT_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the folder is imported as a package under this name, whatever its own
+PLUGIN_PACKAGE = "rstools_plugin"
+PROVIDER_ID = "rstools"
+
+_application = None
+_plugin = None
+_scripts = {}
+
+# --------------------------------------------------------------------------------------------------------------------
+# 2 ----------------------------------------- QGIS -----------------------------------------------------------------
+# --------------------------------------------------------------------------------------------------------------------
+
+def startQgis():
+    """Start QGIS and processing once in this process."""
+    global _application
+    if _application is not None:
+        return _application
+
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    _application = QgsApplication([], False)
+    _application.initQgis()
+
+    plugins = os.path.join(QgsApplication.pkgDataPath(), "python", "plugins")
+    if plugins not in sys.path:
+        sys.path.append(plugins)
+
+    from processing.core.Processing import Processing
+    Processing.initialize()
+    registerProvider()
+    return _application
+
+
+def registerProvider():
+    """Add the provider of this folder to the processing registry."""
+    global _plugin
+    if _plugin is not None:
+        return
+
+    if PLUGIN_PACKAGE not in sys.modules:
+        spec = importlib.util.spec_from_file_location(
+            PLUGIN_PACKAGE,
+            os.path.join(SCRIPT_FOLDER, "__init__.py"),
+            submodule_search_locations=[SCRIPT_FOLDER])
+        package = importlib.util.module_from_spec(spec)
+        sys.modules[PLUGIN_PACKAGE] = package
+        spec.loader.exec_module(package)
+
+    _plugin = importlib.import_module(PLUGIN_PACKAGE + ".plugin").RsToolsPlugin()
+    _plugin.initProcessing()
+
+
+def stopQgis():
+    global _application, _plugin
+    if _plugin is not None:
+        _plugin.unload()
+        _plugin = None
+    if _application is not None:
+        _application.exitQgis()
+        _application = None
+
+# --------------------------------------------------------------------------------------------------------------------
+# 3 ----------------------------------------- Scripts --------------------------------------------------------------
+# --------------------------------------------------------------------------------------------------------------------
+
+def scriptAlgorithm(path):
+    """Algorithm defined in a script file, loaded once per process.
+
+    The returned instance is a template: run algorithm.create() copies.
+    """
+    path = os.path.abspath(path)
+    if path in _scripts:
+        return _scripts[path]
+
+    name = os.path.splitext(os.path.basename(path))[0]
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    for value in vars(module).values():
+        if isinstance(value, type) and issubclass(value, QgsProcessingAlgorithm) \
+                and value.__module__ == module.__name__:
+            _scripts[path] = value().create()
+            return _scripts[path]
+    raise ValueError("no processing algorithm in " + path)
+
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+
+    instrument.py
+
+    Date         : October 2026
+    Copyright : (C) 2026 by Giacomo Fontanelli
+    Email        : giacomofontanelli76 at gmail dot com
+
+***************************************************************************
+
+    This program is free software; you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation; either version 2 of the License, or
+    (at your option) any later version.
+
+***************************************************************************
+
+    Per-stage instrumentation of the algorithms: wall and CPU time, peak
+    memory, bytes read and written, feature and pixel counts. A summary
+    goes to the processing feedback, a JSON trace to a folder if set
+
+    RSTOOLS_TRACE_DIR    folder of the JSON traces (default none)
+
+***************************************************************************
+"""
+
+__author__ = 'Giacomo Fontanelli'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Giacomo Fontanelli'
+
+# --------------------------------------------------------------------------------------------------------------------
+# 1 -----------------------------------------------------------------------------------------------------------------
+# --------------------------------------------------------------------------------------------------------------------
+
+import datetime
+import functools
+import json
+import os
+import platform
+import re
+import time
+import uuid
+
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # Windows: no peak memory without /proc either
+    resource = None
+
+MB = 1024.0 * 1024.0
+
+# --------------------------------------------------------------------------------------------------------------------
+# 2 ----------------------------------------- Process counters -----------------------------------------------------
+# --------------------------------------------------------------------------------------------------------------------
+
+def _processIo():
+    """Bytes read and written by the process, all threads included.
+
+    read_bytes/write_bytes reach the storage, rchar/wchar also count page
+    cache hits and network file systems.
+    """
+    try:
+        with open("/proc/self/io") as ioFile:
+            return {name: int(value) for name, value in (line.split(":") for line in ioFile if ":" in line)}
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def _memory():
+    """(current RSS, peak RSS) of the process in bytes."""
+    try:
+        with open("/proc/self/status") as statusFile:
+            status = statusFile.read()
+        current = int(re.search(r"VmRSS:\s+(\d+)", status).group(1)) * 1024
+        peak = int(re.search(r"VmHWM:\s+(\d+)", status).group(1)) * 1024
+        return current, peak
+    except (IOError, OSError, AttributeError):
+        if resource is None:
+            return 0, 0
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes, bytes on macOS
+        return 0, peak if platform.system() == "Darwin" else peak * 1024
+
+
+def _snapshot():
+    current, peak = _memory()
+    return {
+        "wall": time.perf_counter(),
+        "cpu": time.process_time(),
+        "rss": current,
+        "peak": peak,
+        "io": _processIo()}
+
+# --------------------------------------------------------------------------------------------------------------------
+# 3 ----------------------------------------- Trace ----------------------------------------------------------------
+# --------------------------------------------------------------------------------------------------------------------
+
+class Stage(object):
+    """Measures of one stage of an algorithm."""
+
+    def __init__(self, name):
+        self.name = name
+        self.counts = {}
+        self.measures = {}
+
+    def count(self, name, value=1):
+        """Add value to a count of the stage (features, pixels, tiles...)."""
+        self.counts[name] = self.counts.get(name, 0) + int(value)
+
+    def close(self, before, after):
+        self.measures = {
+            "wallSeconds": after["wall"] - before["wall"],
+            "cpuSeconds": after["cpu"] - before["cpu"],
+            "peakRssMb": after["peak"] / MB,
+            "rssDeltaMb": (after["rss"] - before["rss"]) / MB,
+            "readBytes": after["io"].get("read_bytes", 0) - before["io"].get("read_bytes", 0),
+            "writeBytes": after["io"].get("write_bytes", 0) - before["io"].get("write_bytes", 0),
+            "readChars": after["io"].get("rchar", 0) - before["io"].get("rchar", 0),
+            "writeChars": after["io"].get("wchar", 0) - before["io"].get("wchar", 0)}
+
+    def asDict(self):
+        record = {"name": self.name, "counts": self.counts}
+        record.update(self.measures)
+        return record
+
+
+class Trace(object):
+    """Stages of one algorithm run.
+
+    The peak RSS of a stage is the process high-water mark at its end:
+    a stage raising it is the one that allocated the memory.
+    """
+
+    def __init__(self, algorithmId, feedback=None):
+        self.algorithmId = algorithmId
+        self.feedback = feedback
+        self.stages = []
+        self.started = datetime.datetime.now()
+        self.status = "ok"
+        self._start = _snapshot()
+
+    @contextmanager
+    def stage(self, name):
+        """Measure the block of a with statement as a stage."""
+        stage = Stage(name)
+        before = _snapshot()
+        try:
+            yield stage
+        finally:
+            stage.close(before, _snapshot())
+            self.stages.append(stage)
+
+    def finish(self, status=None):
+        """Push the summary to the feedback and write the JSON trace."""
+        if status is not None:
+            self.status = status
+        total = Stage("total")
+        total.close(self._start, _snapshot())
+        total.measures["peakRssMb"] = max([total.measures["peakRssMb"]] +
+                                          [stage.measures["peakRssMb"] for stage in self.stages])
+        for stage in self.stages:
+            for name, value in stage.counts.items():
+                total.count(name, value)
+
+        if self.feedback is not None:
+            self.feedback.pushInfo(self.summary(total))
+
+        folder = os.environ.get("RSTOOLS_TRACE_DIR")
+        if folder:
+            self.write(folder, total)
+
+    def summary(self, total):
+        lines = ["{:<28} {:>8} {:>8} {:>9} {:>9} {:>9}  {}".format(
+            "stage", "wall s", "cpu s", "peak MB", "read MB", "write MB", "counts")]
+        for stage in self.stages + [total]:
+            measures = stage.measures
+            lines.append("{:<28} {:>8.2f} {:>8.2f} {:>9.1f} {:>9.1f} {:>9.1f}  {}".format(
+                stage.name[:28],
+                measures["wallSeconds"],
+                measures["cpuSeconds"],
+                measures["peakRssMb"],
+                measures["readChars"] / MB,
+                measures["writeChars"] / MB,
+                ", ".join("{}={}".format(name, value) for name, value in sorted(stage.counts.items()))))
+        return "\n".join(lines)
+
+    def write(self, folder, total):
+        record = {
+            "algorithm": self.algorithmId,
+            "started": self.started.isoformat(timespec="seconds"),
+            "host": platform.node(),
+            "pid": os.getpid(),
+            "status": self.status,
+            "total": total.asDict(),
+            "stages": [stage.asDict() for stage in self.stages]}
+
+        name = "{}-{}-{}.json".format(
+            re.sub(r"[^A-Za-z0-9_-]+", "_", self.algorithmId),
+            self.started.strftime("%Y%m%d-%H%M%S"),
+            uuid.uuid4().hex[:8])
+        try:
+            os.makedirs(folder, exist_ok=True)
+            staging = os.path.join(folder, "." + name + ".part")
+            with open(staging, "w") as traceFile:
+                json.dump(record, traceFile, indent=2)
+            os.replace(staging, os.path.join(folder, name))
+        except (IOError, OSError) as error:
+            if self.feedback is not None:
+                self.feedback.reportError("Trace not written: " + str(error))
+
+
+def traced(processAlgorithm):
+    """Decorator of processAlgorithm: self.trace is the Trace of the run,
+    finished (summary and JSON) on return, cancel or error."""
+
+    @functools.wraps(processAlgorithm)
+    def wrapper(self, parameters, context, feedback):
+        self.trace = Trace(self.name(), feedback)
+        try:
+            results = processAlgorithm(self, parameters, context, feedback)
+        except Exception:
+            self.trace.finish("error")
+            raise
+        self.trace.finish("canceled" if feedback is not None and feedback.isCanceled() else "ok")
+        return results
+
+    return wrapper
@@ -0,0 +1,827 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+
+    masks.py
+
+    Date         : October 2026
+    Copyright : (C) 2026 by Giacomo Fontanelli
+    Email        : giacomofontanelli76 at gmail dot com
+
+***************************************************************************
+
+    This program is free software; you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation; either version 2 of the License, or
+    (at your option) any later version.
+
+***************************************************************************
+
+    Polygon mask builder: rasterizes a polygon source into a GDAL MEM
+    dataset and returns a NumPy array. Files are written only on request
+
+***************************************************************************
+"""
+
+__author__ = 'Giacomo Fontanelli'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Giacomo Fontanelli'
+
+# --------------------------------------------------------------------------------------------------------------------
+# 1 -----------------------------------------------------------------------------------------------------------------
+# --------------------------------------------------------------------------------------------------------------------
+
+import hashlib
+import json
+import math
+import os
+import threading
+import uuid
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from qgis.core import (
+    QgsCoordinateTransform,
+    QgsFeatureRequest,
+    QgsGeometry,
+    QgsProject,
+    QgsRasterFileWriter,
+    QgsRasterLayer,
+    QgsRectangle,
+    QgsSpatialIndex,
+    QgsWkbTypes)
+
+from osgeo import gdal, gdal_array, ogr, osr
+
+import numpy as np
+
+from rstools import cache, packed
+
+# Values burned in the raster
+MASK = "mask"
+LABELS = "label"
+CLASSES = "class"
+
+# Fraction of a pixel ignored when fitting a grid on an extent
+GRID_TOLERANCE = 1e-9
+
+# --------------------------------------------------------------------------------------------------------------------
+# 2 ----------------------------------------- Grid -----------------------------------------------------------------
+# --------------------------------------------------------------------------------------------------------------------
+
+class MaskGrid(object):
+    """Raster grid of a mask: GDAL geotransform, size and CRS (WKT)."""
+
+    def __init__(self, geotransform, nCol, nRow, crsWkt=""):
+        self.geotransform = tuple(geotransform)
+        self.nCol = int(nCol)
+        self.nRow = int(nRow)
+        self.crsWkt = crsWkt
+
+    @classmethod
+    def fromExtent(cls, extent, pixelDim, crsWkt=""):
+        """Grid anchored on the upper left corner of a QgsRectangle.
+
+        The last column and row cover the partial pixels of the extent, at
+        least one pixel is kept even for an extent narrower than pixelDim.
+        """
+        nCol = max(1, int(math.ceil(extent.width() / pixelDim - GRID_TOLERANCE)))
+        nRow = max(1, int(math.ceil(extent.height() / pixelDim - GRID_TOLERANCE)))
+        geotransform = (extent.xMinimum(), pixelDim, 0.0, extent.yMaximum(), 0.0, -pixelDim)
+        return cls(geotransform, nCol, nRow, crsWkt)
+
+    @classmethod
+    def fromReference(cls, path):
+        """Grid of a reference raster: same geotransform, size and CRS."""
+        dataset = gdal.Open(path)
+        if dataset is None:
+            raise IOError("cannot open reference raster " + path)
+
+        geotransform = dataset.GetGeoTransform()
+        if geotransform[2] != 0.0 or geotransform[4] != 0.0:
+            raise ValueError("rotated reference rasters are not supported")
+        return cls(geotransform, dataset.RasterXSize, dataset.RasterYSize, dataset.GetProjection())
+
+    def snap(self, extent):
+        """Smallest sub grid covering a QgsRectangle, snapped to the pixels.
+
+        The sub grid shares pixel size and origin alignment with this grid,
+        its pixel (0, 0) is pixel (xoff, yoff) of this grid.
+        """
+        gt = self.geotransform
+        xoff = int(math.floor((extent.xMinimum() - gt[0]) / gt[1]))
+        xend = int(math.ceil((extent.xMaximum() - gt[0]) / gt[1]))
+        yoff = int(math.floor((extent.yMaximum() - gt[3]) / gt[5]))
+        yend = int(math.ceil((extent.yMinimum() - gt[3]) / gt[5]))
+
+        xoff, xend = max(xoff, 0), min(xend, self.nCol)
+        yoff, yend = max(yoff, 0), min(yend, self.nRow)
+        if xend <= xoff or yend <= yoff:
+            raise ValueError("extent does not overlap the grid")
+        return self.window(xoff, yoff, xend - xoff, yend - yoff)
+
+    def offsetIn(self, other):
+        """Pixel offset (xoff, yoff) of this grid inside an aligned grid."""
+        return (
+            int(round((self.geotransform[0] - other.geotransform[0]) / other.geotransform[1])),
+            int(round((self.geotransform[3] - other.geotransform[3]) / other.geotransform[5])))
+
+    @property
+    def xMin(self):
+        return self.geotransform[0]
+
+    @property
+    def yMax(self):
+        return self.geotransform[3]
+
+    @property
+    def pixelX(self):
+        return self.geotransform[1]
+
+    @property
+    def pixelY(self):
+        return -self.geotransform[5]
+
+    def extent(self):
+        """Grid extent as a QgsRectangle."""
+        gt = self.geotransform
+        return QgsRectangle(
+            gt[0],
+            gt[3] + self.nRow * gt[5],
+            gt[0] + self.nCol * gt[1],
+            gt[3])
+
+    def tiles(self, tileSize):
+        """Pixel windows (xoff, yoff, width, height) of tileSize x tileSize."""
+        for yoff in range(0, self.nRow, tileSize):
+            for xoff in range(0, self.nCol, tileSize):
+                yield (xoff, yoff, min(tileSize, self.nCol - xoff), min(tileSize, self.nRow - yoff))
+
+    def window(self, xoff, yoff, width, height):
+        """Sub grid of width x height pixels starting at pixel (xoff, yoff)."""
+        gt = self.geotransform
+        geotransform = (gt[0] + xoff * gt[1], gt[1], 0.0, gt[3] + yoff * gt[5], 0.0, gt[5])
+        return MaskGrid(geotransform, width, height, self.crsWkt)
+
+# --------------------------------------------------------------------------------------------------------------------
+# 3 ----------------------------------------- Polygons -------------------------------------------------------------
+# --------------------------------------------------------------------------------------------------------------------
+
+class PolygonSet(object):
+    """Polygons of a feature source copied in an OGR memory layer.
+
+    Feature N of the source (starting from 1) is stored with label N (also
+    its OGR FID), its feature ID and requested attributes at index N of fids
+    and attributes. A spatial index on labels is built on first use.
+    Geometries are reprojected to crs when it differs from the source CRS.
+    With classField (a field index) the integer class code of each polygon
+    is stored too, NULL codes are burned as 0. The WKB of each polygon is
+    kept at index N of wkb too, a read-only store tile subsets are built
+    from by several threads.
+    """
+
+    LABEL = "label"
+    CLASS = "class"
+
+    def __init__(self, source, attributes=None, request=None, feedback=None,
+                 crs=None, transformContext=None, classField=None):
+        attributes = list(attributes or [])
+        if request is None:
+            request = QgsFeatureRequest().setSubsetOfAttributes(
+                attributes + ([classField] if classField is not None else []))
+
+        transform = None
+        if crs is not None and crs.isValid() and crs != source.sourceCrs():
+            if transformContext is None:
+                transformContext = QgsProject.instance().transformContext()
+            transform = QgsCoordinateTransform(source.sourceCrs(), crs, transformContext)
+        else:
+            crs = source.sourceCrs()
+
+        srs = osr.SpatialReference()
+        srs.ImportFromWkt(crs.toWkt())
+
+        self.dataset = ogr.GetDriverByName("Memory").CreateDataSource("polygons")
+        self.layer = self.dataset.CreateLayer("polygons", srs, ogr.wkbMultiPolygon)
+        self.layer.CreateField(ogr.FieldDefn(self.LABEL, ogr.OFTInteger))
+        self.layer.CreateField(ogr.FieldDefn(self.CLASS, ogr.OFTInteger))
+        self.classField = classField
+        self.classes = set()
+        self.fids = [None]
+        self.attributes = [[]]
+        self.bounds = []
+        self.wkb = [None]
+        self.codes = [0]
+        self._index = None
+        self._lock = threading.Lock()
+
+        layerDefn = self.layer.GetLayerDefn()
+        for label, feature in enumerate(source.getFeatures(request), 1):
+            self.fids.append(feature.id())
+            self.attributes.append([feature.attributes()[index] for index in attributes])
+            self.wkb.append(None)
+            self.codes.append(0)
+
+            geometry = feature.geometry()
+            if transform is not None and not geometry.isNull():
+                geometry.transform(transform)
+            if not geometry.isNull():
+                self.bounds.append((label, geometry.boundingBox()))
+
+                ogrFeature = ogr.Feature(layerDefn)
+                ogrFeature.SetFID(label)
+                ogrFeature.SetField(self.LABEL, label)
+                if classField is not None:
+                    try:
+                        code = int(feature.attributes()[classField])
+                    except (TypeError, ValueError):
+                        code = 0
+                    ogrFeature.SetField(self.CLASS, code)
+                    self.codes[label] = code
+                    if code != 0:
+                        self.classes.add(code)
+                self.wkb[label] = _toWkb(geometry)
+                ogrFeature.SetGeometryDirectly(ogr.CreateGeometryFromWkb(self.wkb[label]))
+                self.layer.CreateFeature(ogrFeature)
+
+            if feedback is not None and feedback.isCanceled():
+                break
+
+    def __len__(self):
+        return len(self.fids) - 1
+
+    def extent(self):
+        """Bounding box of all polygons, in the CRS of the set."""
+        extent = QgsRectangle()
+        extent.setMinimal()
+        for _, bbox in self.bounds:
+            extent.combineExtentWith(bbox)
+        return extent
+
+    def digest(self):
+        """SHA-256 of every geometry, label and class code, in label order."""
+        digest = hashlib.sha256()
+        for label, _ in self.bounds:
+            ogrFeature = self.layer.GetFeature(label)
+            digest.update(str((label, ogrFeature.GetField(self.CLASS))).encode())
+            digest.update(ogrFeature.GetGeometryRef().ExportToWkb())
+        return digest.hexdigest()
+
+    def manifest(self):
+        """Geometry hash and bounding box of each polygon, keyed by feature ID."""
+        features = {}
+        for label, bbox in self.bounds:
+            ogrFeature = self.layer.GetFeature(label)
+            digest = hashlib.sha1(ogrFeature.GetGeometryRef().ExportToWkb())
+            if self.classField is not None:
+                digest.update(str(ogrFeature.GetField(self.CLASS)).encode())
+            features[str(self.fids[label])] = [
+                digest.hexdigest(),
+                bbox.xMinimum(),
+                bbox.yMinimum(),
+                bbox.xMaximum(),
+                bbox.yMaximum()]
+        return features
+
+    def intersects(self, rectangle):
+        """Labels of the polygons whose bounding box intersects rectangle.
+
+        Safe from several threads: queries are serialized on a lock.
+        """
+        with self._lock:
+            if self._index is None:
+                self._index = QgsSpatialIndex()
+                for label, bbox in self.bounds:
+                    self._index.addFeature(label, bbox)
+            return self._index.intersects(rectangle)
+
+    def subset(self, labels):
+        """OGR memory layer with the polygons of labels, as (dataset, layer).
+
+        Built from the WKB store, never from the shared OGR layer: safe
+        from several threads.
+        """
+        dataset = ogr.GetDriverByName("Memory").CreateDataSource("subset")
+        subsetLayer = dataset.CreateLayer("subset", self.layer.GetSpatialRef(), ogr.wkbMultiPolygon)
+        subsetLayer.CreateField(ogr.FieldDefn(self.LABEL, ogr.OFTInteger))
+        subsetLayer.CreateField(ogr.FieldDefn(self.CLASS, ogr.OFTInteger))
+        layerDefn = subsetLayer.GetLayerDefn()
+        for label in sorted(labels):
+            ogrFeature = ogr.Feature(layerDefn)
+            ogrFeature.SetFID(label)
+            ogrFeature.SetField(self.LABEL, label)
+            ogrFeature.SetField(self.CLASS, self.codes[label])
+            ogrFeature.SetGeometryDirectly(ogr.CreateGeometryFromWkb(self.wkb[label]))
+            subsetLayer.CreateFeature(ogrFeature)
+        return dataset, subsetLayer
+
+
+def _toWkb(geometry):
+    """WKB of a QgsGeometry, curves are segmentized first."""
+    if QgsWkbTypes.isCurvedType(geometry.wkbType()):
+        geometry = QgsGeometry(geometry.constGet().segmentize())
+    return bytes(geometry.asWkb())
+
+# --------------------------------------------------------------------------------------------------------------------
+# 4 ----------------------------------------- Rasterization --------------------------------------------------------
+# --------------------------------------------------------------------------------------------------------------------
+
+def memDataset(grid, dataType=gdal.GDT_Byte, bands=1):
+    """Empty GDAL MEM dataset on grid."""
+    dataset = gdal.GetDriverByName("MEM").Create("", grid.nCol, grid.nRow, bands, dataType)
+    dataset.SetGeoTransform(grid.geotransform)
+    if grid.crsWkt:
+        dataset.SetProjection(grid.crsWkt)
+    return dataset
+
+
+def valueType(polygons, values=MASK):
+    """GDAL data type of a raster burned with values.
+
+    MASK is Byte, LABELS UInt32, CLASSES the smallest of Byte and UInt16
+    holding every class code.
+    """
+    if values == LABELS:
+        return gdal.GDT_UInt32
+    if values == CLASSES:
+        if polygons.classes and (min(polygons.classes) < 0 or max(polygons.classes) > 65535):
+            raise ValueError("class codes must be between 1 and 65535")
+        if polygons.classes and max(polygons.classes) > 255:
+            return gdal.GDT_UInt16
+    return gdal.GDT_Byte
+
+
+def pixelBytes(polygons, values=MASK):
+    """Bytes per pixel of a raster burned with values."""
+    return gdal.GetDataTypeSize(valueType(polygons, values)) // 8
+
+
+def cacheKey(polygons, grid, values=MASK):
+    """Key of a rasterized array in the result cache."""
+    return cache.defaultCache().key(
+        "rasterize",
+        polygons.digest(),
+        list(grid.geotransform),
+        grid.nCol,
+        grid.nRow,
+        grid.crsWkt,
+        values)
+
+
+def _burn(dataset, layer, values):
+    if values == MASK:
+        gdal.RasterizeLayer(dataset, [1], layer, burn_values=[1])
+    else:
+        gdal.RasterizeLayer(dataset, [1], layer, options=["ATTRIBUTE=" + values])
+
+
+def rasterize(polygons, grid, values=MASK):
+    """Rasterize a PolygonSet on grid and return the NumPy array.
+
+    The array is a 1-0 Byte mask (MASK), the UInt32 polygon labels
+    (LABELS) or the class codes (CLASSES), 0 outside the polygons.
+    """
+    dataset = memDataset(grid, valueType(polygons, values))
+    _burn(dataset, polygons.layer, values)
+    return dataset.GetRasterBand(1).ReadAsArray()
+
+
+def cachedRasterize(polygons, grid, values=MASK):
+    """rasterize() through the result cache, when it is enabled.
+
+    A 1-0 mask is also derived from the polygon labels cached for the same
+    polygons and grid.
+    """
+    resultCache = cache.defaultCache()
+    if not resultCache.enabled:
+        return rasterize(polygons, grid, values=values)
+
+    if values == MASK:
+        labelArray = resultCache.loadArray(cacheKey(polygons, grid, LABELS))
+        if labelArray is not None:
+            return (labelArray > 0).astype(np.uint8)
+
+    return resultCache.array(
+        cacheKey(polygons, grid, values),
+        lambda: rasterize(polygons, grid, values=values))
+
+
+def rasterizeWindow(polygons, grid, xoff, yoff, width, height, values=MASK):
+    """Rasterize only the polygons touching a pixel window of grid.
+
+    Returns None when no polygon bounding box intersects the window.
+    """
+    job = _windowJob(polygons, grid, (xoff, yoff, width, height))
+    if job is None:
+        return None
+    return _burnWindow(job, valueType(polygons, values), values)
+
+
+def iterTiles(polygons, grid, tileSize=512, values=MASK, threads=1):
+    """Yield (xoff, yoff, array) for every tile of grid, in row order.
+
+    array is None for tiles without polygons. With threads > 1 the tiles
+    are burned by a pool of worker threads, each running the whole tile:
+    spatial index query (the index is shared, queries are serialized),
+    polygon subset built from the shared WKB store and GDAL
+    rasterization on its own MEM dataset. The calling thread only
+    collects the results, in order.
+    """
+    tiles = grid.tiles(tileSize)
+
+    if threads <= 1:
+        for tile in tiles:
+            yield tile[0], tile[1], rasterizeWindow(polygons, grid, *tile, values=values)
+        return
+
+    dataType = valueType(polygons, values)
+
+    def burnTile(tile):
+        job = _windowJob(polygons, grid, tile)
+        return _burnWindow(job, dataType, values) if job is not None else None
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        pending = deque()
+        for tile in tiles:
+            pending.append((tile, executor.submit(burnTile, tile)))
+
+            # Keep a bounded number of tiles in flight
+            while len(pending) > 2 * threads:
+                yield _tileResult(pending.popleft())
+
+        while pending:
+            yield _tileResult(pending.popleft())
+
+
+def _windowJob(polygons, grid, tile):
+    window = grid.window(*tile)
+    hits = polygons.intersects(window.extent())
+    if not hits:
+        return None
+    subsetDataset, subsetLayer = polygons.subset(hits)
+    return window, subsetDataset, subsetLayer
+
+
+def _burnWindow(job, dataType, values):
+    window, subsetDataset, subsetLayer = job
+    dataset = memDataset(window, dataType)
+    _burn(dataset, subsetLayer, values)
+    return dataset.GetRasterBand(1).ReadAsArray()
+
+
+def _tileResult(item):
+    tile, future = item
+    return tile[0], tile[1], future.result()
+
+
+def rasterizeTiled(polygons, grid, tileSize=512, values=MASK, threads=1, feedback=None, onTile=None):
+    """Rasterize the whole grid tile by tile (in parallel) into one array.
+
+    onTile(xoff, yoff, array) is called for every tile with polygons.
+    """
+    dataType = gdal_array.GDALTypeCodeToNumericTypeCode(valueType(polygons, values))
+    array = np.zeros((grid.nRow, grid.nCol), dtype=dataType)
+
+    nTiles = _tileCount(grid, tileSize)
+    for count, (xoff, yoff, tileArray) in enumerate(iterTiles(polygons, grid, tileSize, values, threads)):
+        if tileArray is not None:
+            array[yoff:yoff + tileArray.shape[0], xoff:xoff + tileArray.shape[1]] = tileArray
+            if onTile is not None:
+                onTile(xoff, yoff, tileArray)
+
+        if feedback is not None:
+            feedback.setProgress(100.0 * (count + 1) / nTiles)
+            if feedback.isCanceled():
+                break
+
+    return array
+
+
+def _tileCount(grid, tileSize):
+    return ((grid.nCol + tileSize - 1) // tileSize) * ((grid.nRow + tileSize - 1) // tileSize)
+
+
+class ClassMasks(object):
+    """One packed.PackedMask per class code, filled from label tiles.
+
+    Tiles must start at x offsets multiple of 8 and be 8 pixels wide
+    multiples unless on the last column, as from grid.tiles(16 * n).
+    """
+
+    def __init__(self, codes, grid):
+        self.masks = {code: packed.PackedMask.empty(grid.nCol, grid.nRow, grid.geotransform)
+                      for code in codes}
+
+    def add(self, xoff, yoff, tileArray):
+        for code in np.unique(tileArray):
+            if int(code) in self.masks:
+                self.masks[int(code)].setWindow(xoff, yoff, tileArray == code)
+
+    def save(self, folder):
+        """Write class_<code>.npz files in folder, return their paths."""
+        paths = []
+        for code in sorted(self.masks):
+            path = os.path.join(folder, "class_{}.npz".format(code))
+            self.masks[code].save(path)
+            paths.append(path)
+        return paths
+
+
+# --------------------------------------------------------------------------------------------------------------------
+# 5 ----------------------------------------- Output ---------------------------------------------------------------
+# --------------------------------------------------------------------------------------------------------------------
+
+def arrayDataset(array, grid):
+    """GDAL MEM dataset holding array on grid."""
+    dataset = memDataset(grid, gdal.GetDataTypeByName(_gdalTypeName(array)))
+    dataset.GetRasterBand(1).WriteArray(array)
+    return dataset
+
+
+def writeMask(array, grid, path, options=None):
+    """Write array on grid to path, the driver follows the file extension."""
+    extension = os.path.splitext(path)[1].lstrip(".")
+    driverName = QgsRasterFileWriter.driverForExtension(extension) or "GTiff"
+
+    dataset = gdal.GetDriverByName(driverName).CreateCopy(
+        path,
+        arrayDataset(array, grid),
+        options=options or [])
+    dataset.FlushCache()
+    dataset = None
+    return path
+
+
+def tiledOptions(tileSize, compress="DEFLATE"):
+    """GeoTIFF creation options for tiled, sparse, DEFLATE compressed masks."""
+    return [
+        "TILED=YES",
+        "BLOCKXSIZE={}".format(tileSize),
+        "BLOCKYSIZE={}".format(tileSize),
+        "COMPRESS={}".format(compress),
+        "SPARSE_OK=TRUE",
+        "BIGTIFF=IF_SAFER"]
+
+
+def writeTiled(polygons, grid, path, tileSize=512, values=MASK, threads=1, feedback=None, onTile=None):
+    """Rasterize tile by tile into a tiled, sparse, compressed GeoTIFF.
+
+    Tiles without polygons are never allocated nor written, they read back
+    as 0. Tiles are burned by threads workers and written here, in order;
+    onTile(xoff, yoff, array) is called for every tile written.
+    Returns the number of tiles written.
+    """
+    dataType = valueType(polygons, values)
+    dataset = gdal.GetDriverByName("GTiff").Create(
+        path,
+        grid.nCol,
+        grid.nRow,
+        1,
+        dataType,
+        options=tiledOptions(tileSize))
+    if dataset is None:
+        raise IOError("cannot create " + path)
+    dataset.SetGeoTransform(grid.geotransform)
+    if grid.crsWkt:
+        dataset.SetProjection(grid.crsWkt)
+    band = dataset.GetRasterBand(1)
+
+    nTiles = _tileCount(grid, tileSize)
+    written = 0
+    for count, (xoff, yoff, tileArray) in enumerate(iterTiles(polygons, grid, tileSize, values, threads)):
+        if tileArray is not None and tileArray.any():
+            band.WriteArray(tileArray, xoff, yoff)
+            written += 1
+            if onTile is not None:
+                onTile(xoff, yoff, tileArray)
+
+        if feedback is not None:
+            feedback.setProgress(100.0 * (count + 1) / nTiles)
+            if feedback.isCanceled():
+                break
+
+    dataset.FlushCache()
+    dataset = None
+    return written
+
+
+# --------------------------------------------------------------------------------------------------------------------
+# 6 ----------------------------------------- Incremental update ---------------------------------------------------
+# --------------------------------------------------------------------------------------------------------------------
+
+def writeManifest(path, polygons, grid):
+    """Store the geometry hashes of polygons and the mask grid as JSON."""
+    with open(path, "w") as manifestFile:
+        json.dump({
+            "geotransform": list(grid.geotransform),
+            "nCol": grid.nCol,
+            "nRow": grid.nRow,
+            "features": polygons.manifest()}, manifestFile)
+    return path
+
+
+def readManifest(path):
+    with open(path) as manifestFile:
+        return json.load(manifestFile)
+
+
+def checkUpdate(polygons, grid, path, manifest, values=MASK):
+    """Raise ValueError when the existing mask at path cannot take an update.
+
+    The manifest must describe the grid of the mask, and the band data type
+    must hold the values to burn.
+    """
+    tolerance = 1e-6 * max(abs(grid.pixelX), abs(grid.pixelY))
+    if (manifest.get("nCol"), manifest.get("nRow")) != (grid.nCol, grid.nRow) \
+            or len(manifest.get("geotransform", [])) != 6 \
+            or any(abs(a - b) > tolerance for a, b in zip(manifest["geotransform"], grid.geotransform)):
+        raise ValueError("the manifest was written for another grid than the existing mask")
+
+    dataset = gdal.Open(path)
+    if dataset is None:
+        raise IOError("cannot open mask for update " + path)
+    bandType = gdal_array.GDALTypeCodeToNumericTypeCode(dataset.GetRasterBand(1).DataType)
+    if values == CLASSES and polygons.classes and np.issubdtype(bandType, np.integer) \
+            and max(polygons.classes) > np.iinfo(bandType).max:
+        raise ValueError("class codes up to {} do not fit the {} band of the existing mask".format(
+            max(polygons.classes), gdal.GetDataTypeName(dataset.GetRasterBand(1).DataType)))
+
+
+def dirtyRectangles(polygons, manifest=None, changedFids=None):
+    """Footprints to refresh after an edit of the polygon layer.
+
+    With changedFids, the old (manifest) and new bounding boxes of those
+    features; otherwise the features whose hash differs from the manifest,
+    plus the added and deleted ones.
+    """
+    oldFeatures = manifest["features"] if manifest is not None else {}
+    newFeatures = polygons.manifest()
+
+    if changedFids is not None:
+        keys = set(str(fid) for fid in changedFids)
+    else:
+        keys = set(oldFeatures) ^ set(newFeatures)
+        keys.update(key for key in set(oldFeatures) & set(newFeatures)
+                    if oldFeatures[key][0] != newFeatures[key][0])
+
+    rectangles = []
+    for key in keys:
+        for features in (oldFeatures, newFeatures):
+            if key in features:
+                rectangles.append(QgsRectangle(*features[key][1:5]))
+    return rectangles
+
+
+def dirtyTiles(grid, rectangles, tileSize):
+    """Tiles of grid, as pixel windows, touched by any of rectangles."""
+    gt = grid.geotransform
+    nTileX = (grid.nCol + tileSize - 1) // tileSize
+    nTileY = (grid.nRow + tileSize - 1) // tileSize
+
+    tiles = set()
+    for rectangle in rectangles:
+        col0 = int(math.floor((rectangle.xMinimum() - gt[0]) / gt[1])) // tileSize
+        col1 = int(math.floor((rectangle.xMaximum() - gt[0]) / gt[1])) // tileSize
+        row0 = int(math.floor((rectangle.yMaximum() - gt[3]) / gt[5])) // tileSize
+        row1 = int(math.floor((rectangle.yMinimum() - gt[3]) / gt[5])) // tileSize
+        for tileY in range(max(row0, 0), min(row1, nTileY - 1) + 1):
+            for tileX in range(max(col0, 0), min(col1, nTileX - 1) + 1):
+                tiles.add((tileX, tileY))
+
+    windows = []
+    for tileX, tileY in sorted(tiles, key=lambda tile: (tile[1], tile[0])):
+        xoff, yoff = tileX * tileSize, tileY * tileSize
+        windows.append((xoff, yoff, min(tileSize, grid.nCol - xoff), min(tileSize, grid.nRow - yoff)))
+    return windows
+
+
+def blockSize(path):
+    """Tile size of a tiled raster with square blocks, None otherwise."""
+    dataset = gdal.Open(path)
+    blockX, blockY = dataset.GetRasterBand(1).GetBlockSize()
+    if blockX == blockY and blockX < dataset.RasterXSize:
+        return blockX
+    return None
+
+
+def updateMask(polygons, grid, existingPath, outputPath, tiles, tileSize, values=MASK, feedback=None):
+    """Write the existing mask with the given tiles rasterized again to outputPath.
+
+    An uncompressed mask is copied (unless outputPath is the existing file)
+    and updated in place. A compressed GeoTIFF is rewritten tile by tile,
+    clean tiles copied and dirty ones rasterized, so that no replaced tile
+    is left in the file; outputPath may be existingPath, the new file then
+    replaces it at the end. Returns the number of dirty tiles, None when
+    canceled.
+    """
+    source = gdal.Open(existingPath)
+    if source is None:
+        raise IOError("cannot open mask for update " + existingPath)
+    driver = source.GetDriver()
+    compression = source.GetMetadataItem("COMPRESSION", "IMAGE_STRUCTURE")
+    samePath = os.path.realpath(existingPath) == os.path.realpath(outputPath)
+
+    if not compression:
+        source = None
+        if not samePath:
+            if os.path.exists(outputPath):
+                driver.Delete(outputPath)
+            if driver.CopyFiles(outputPath, existingPath) != 0:
+                raise IOError("cannot copy {} to {}".format(existingPath, outputPath))
+        return updateTiles(polygons, grid, outputPath, tiles, values, feedback)
+
+    if driver.ShortName != "GTiff":
+        raise ValueError("compressed masks are updated as GeoTIFF only")
+
+    # compressed GeoTIFF: every tile written once, in a new file
+    staging = outputPath + ".updating.tif" if samePath else outputPath
+    sourceBand = source.GetRasterBand(1)
+    dataset = gdal.GetDriverByName("GTiff").Create(
+        staging,
+        grid.nCol,
+        grid.nRow,
+        1,
+        sourceBand.DataType,
+        options=tiledOptions(tileSize, compression))
+    if dataset is None:
+        raise IOError("cannot create " + staging)
+    dataset.SetGeoTransform(source.GetGeoTransform())
+    dataset.SetProjection(source.GetProjection())
+    band = dataset.GetRasterBand(1)
+    if sourceBand.GetNoDataValue() is not None:
+        band.SetNoDataValue(sourceBand.GetNoDataValue())
+
+    dirty = set((xoff, yoff) for xoff, yoff, _, _ in tiles)
+    nTiles = _tileCount(grid, tileSize)
+    for count, (xoff, yoff, width, height) in enumerate(grid.tiles(tileSize)):
+        if (xoff, yoff) in dirty:
+            tileArray = rasterizeWindow(polygons, grid, xoff, yoff, width, height, values)
+        else:
+            tileArray = sourceBand.ReadAsArray(xoff, yoff, width, height)
+        if tileArray is not None and tileArray.any():
+            band.WriteArray(tileArray, xoff, yoff)
+
+        if feedback is not None:
+            feedback.setProgress(100.0 * (count + 1) / nTiles)
+            if feedback.isCanceled():
+                dataset = None
+                gdal.GetDriverByName("GTiff").Delete(staging)
+                return None
+
+    dataset.FlushCache()
+    dataset = None
+    source = None
+    if staging != outputPath:
+        os.replace(staging, outputPath)
+    return len(tiles)
+
+
+def updateTiles(polygons, grid, path, tiles, values=MASK, feedback=None):
+    """Re-rasterize the given tiles of an existing mask in place.
+
+    Every other pixel of the file is left untouched.
+    """
+    dataset = gdal.Open(path, gdal.GA_Update)
+    if dataset is None:
+        raise IOError("cannot open mask for update " + path)
+    band = dataset.GetRasterBand(1)
+    dataType = gdal_array.GDALTypeCodeToNumericTypeCode(band.DataType)
+
+    for count, (xoff, yoff, width, height) in enumerate(tiles):
+        tileArray = rasterizeWindow(polygons, grid, xoff, yoff, width, height, values)
+        if tileArray is None:
+            tileArray = np.zeros((height, width), dtype=dataType)
+        band.WriteArray(tileArray, xoff, yoff)
+
+        if feedback is not None:
+            feedback.setProgress(100.0 * (count + 1) / max(len(tiles), 1))
+            if feedback.isCanceled():
+                break
+
+    dataset.FlushCache()
+    dataset = None
+    return len(tiles)
+
+# --------------------------------------------------------------------------------------------------------------------
+# 7 ----------------------------------------- Memory layer ---------------------------------------------------------
+# --------------------------------------------------------------------------------------------------------------------
+
+def memoryLayer(array, grid, name="mask"):
+    """QgsRasterLayer reading array from a /vsimem/ GeoTIFF."""
+    path = "/vsimem/rstools_{}.tif".format(uuid.uuid4().hex)
+    gdal.GetDriverByName("GTiff").CreateCopy(path, arrayDataset(array, grid))
+    return QgsRasterLayer(path, name, "gdal")
+
+
+def _gdalTypeName(array):
+    return {
+        "uint8": "Byte",
+        "int8": "Int8",
+        "uint16": "UInt16",
+        "int16": "Int16",
+        "uint32": "UInt32",
+        "int32": "Int32",
+        "float32": "Float32",
+        "float64": "Float64"}[array.dtype.name]
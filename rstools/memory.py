@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+
+    memory.py
+
+    Date         : October 2026
+    Copyright : (C) 2026 by Giacomo Fontanelli
+    Email        : giacomofontanelli76 at gmail dot com
+
+***************************************************************************
+
+    This program is free software; you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation; either version 2 of the License, or
+    (at your option) any later version.
+
+***************************************************************************
+
+    Memory budget shared by the algorithms: window sizes, worker counts
+    and the block cache are derived from it
+
+    RSTOOLS_MEMORY_MB    budget in MB (default half of the memory available
+                         to the process, cgroup limits included)
+
+***************************************************************************
+"""
+
+__author__ = 'Giacomo Fontanelli'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Giacomo Fontanelli'
+
+# --------------------------------------------------------------------------------------------------------------------
+# 1 -----------------------------------------------------------------------------------------------------------------
+# --------------------------------------------------------------------------------------------------------------------
+
+import os
+
+from rstools import blocks
+
+# Shares of the budget: working windows of the algorithm, block cache;
+# the rest is left to GDAL, QGIS and the interpreter
+WINDOW_SHARE = 0.50
+CACHE_SHARE = 0.25
+
+CGROUP_LIMITS = (
+    "/sys/fs/cgroup/memory.max",
+    "/sys/fs/cgroup/memory/memory.limit_in_bytes")
+
+# --------------------------------------------------------------------------------------------------------------------
+# 2 ----------------------------------------- Budget ---------------------------------------------------------------
+# --------------------------------------------------------------------------------------------------------------------
+
+class MemoryBudget(object):
+    """Memory an algorithm may use, split into windows and block cache."""
+
+    def __init__(self, totalBytes):
+        self.totalBytes = int(totalBytes)
+        self.windowBytes = int(self.totalBytes * WINDOW_SHARE)
+        self.cacheBytes = int(self.totalBytes * CACHE_SHARE)
+
+    @classmethod
+    def fromSetting(cls, megabytes=0):
+        """Budget of the MEMORY_BUDGET parameter, RSTOOLS_MEMORY_MB when 0,
+        otherwise half of the available memory."""
+        if not megabytes:
+            setting = os.environ.get("RSTOOLS_MEMORY_MB", "").strip()
+            try:
+                megabytes = float(setting or 0)
+            except ValueError:
+                from qgis.core import QgsProcessingException
+                raise QgsProcessingException(
+                    "RSTOOLS_MEMORY_MB must be a number of megabytes, not '{}'".format(setting))
+        if megabytes > 0:
+            return cls(megabytes * 1024 * 1024)
+        return cls(availableBytes() // 2)
+
+    def workers(self, requested, bytesPerWorker):
+        """Worker count up to requested whose windows fit the budget, at least 1."""
+        return max(1, min(requested, self.windowBytes // max(1, bytesPerWorker)))
+
+    def windowSize(self, bytesPerPixel, windows=1, multiple=16, minimum=256, maximum=4096):
+        """Side of the square windows, a multiple of multiple, so that
+        windows of them fit the budget."""
+        side = int((self.windowBytes / float(bytesPerPixel * windows)) ** 0.5)
+        side = min(maximum, max(minimum, side))
+        return max(multiple, side // multiple * multiple)
+
+    def stripRows(self, nCol, bytesPerPixel, minimum=1):
+        """Rows of a full width strip fitting the budget."""
+        return max(minimum, self.windowBytes // max(1, nCol * bytesPerPixel))
+
+    def fits(self, nBytes):
+        return nBytes <= self.windowBytes
+
+    def apply(self):
+        """Resize the shared block cache to its share of the budget."""
+        blocks.blockCache().resize(self.cacheBytes)
+        return self
+
+
+def availableBytes():
+    """Physical memory, or the cgroup limit of the process when lower."""
+    try:
+        total = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        total = 8 * 1024 ** 3
+
+    for path in CGROUP_LIMITS:
+        try:
+            with open(path) as limitFile:
+                limit = limitFile.read().strip()
+        except (IOError, OSError):
+            continue
+        if limit.isdigit():
+            total = min(total, int(limit))
+    return total
@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+
+    packed.py
+
+    Date         : October 2026
+    Copyright : (C) 2026 by Giacomo Fontanelli
+    Email        : giacomofontanelli76 at gmail dot com
+
+***************************************************************************
+
+    This program is free software; you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation; either version 2 of the License, or
+    (at your option) any later version.
+
+***************************************************************************
+
+    Compact 1-0 masks: bit-packed rows (np.packbits layout) and per-row
+    run-length encoding, with area, intersection, union and run iteration
+    computed on the compact form
+
+***************************************************************************
+"""
+
+__author__ = 'Giacomo Fontanelli'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Giacomo Fontanelli'
+
+# --------------------------------------------------------------------------------------------------------------------
+# 1 -----------------------------------------------------------------------------------------------------------------
+# --------------------------------------------------------------------------------------------------------------------
+
+import numpy as np
+
+# Number of bits set in each byte value
+_POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+# Pixel offsets (0 = most significant bit) of the bits set in each byte
+# value, padded with -1
+_BIT_OFFSETS = np.array(
+    [[offset for offset in range(8) if value & (0x80 >> offset)] + [-1] * (8 - bin(value).count("1"))
+     for value in range(256)],
+    dtype=np.int8)
+
+# --------------------------------------------------------------------------------------------------------------------
+# 2 ----------------------------------------- Bit-packed mask ------------------------------------------------------
+# --------------------------------------------------------------------------------------------------------------------
+
+class PackedMask(object):
+    """1-0 mask with 8 pixels per byte, rows packed as np.packbits(axis=1)."""
+
+    KIND = "packed"
+
+    def __init__(self, bits, nCol, geotransform):
+        self.bits = bits
+        self.nCol = int(nCol)
+        self.nRow = bits.shape[0]
+        self.geotransform = tuple(geotransform)
+
+    @classmethod
+    def empty(cls, nCol, nRow, geotransform):
+        return cls(np.zeros((nRow, (nCol + 7) // 8), dtype=np.uint8), nCol, geotransform)
+
+    @classmethod
+    def fromArray(cls, array, geotransform):
+        return cls(np.packbits(array != 0, axis=1), array.shape[1], geotransform)
+
+    def setWindow(self, xoff, yoff, array):
+        """Store a window of a 1-0 array.
+
+        xoff must be a multiple of 8, and so must the window width unless
+        the window ends on the last column: other windows would overwrite
+        the bits of their neighbours sharing a byte.
+        """
+        if xoff % 8 != 0:
+            raise ValueError("window x offset must be a multiple of 8")
+        if array.shape[1] % 8 != 0 and xoff + array.shape[1] != self.nCol:
+            raise ValueError("window width must be a multiple of 8 or end on the last column")
+        packedWindow = np.packbits(array != 0, axis=1)
+        self.bits[yoff:yoff + array.shape[0], xoff // 8:xoff // 8 + packedWindow.shape[1]] = packedWindow
+
+    def toArray(self):
+        return np.unpackbits(self.bits, axis=1, count=self.nCol)
+
+    def count(self):
+        """Number of pixels set to 1."""
+        return int(_POPCOUNT[self.bits].sum(dtype=np.int64))
+
+    def area(self):
+        """Area of the pixels set to 1, in map units."""
+        return self.count() * _pixelArea(self.geotransform)
+
+    def intersection(self, other):
+        _checkGrid(self, other)
+        return PackedMask(self.bits & other.bits, self.nCol, self.geotransform)
+
+    def union(self, other):
+        _checkGrid(self, other)
+        return PackedMask(self.bits | other.bits, self.nCol, self.geotransform)
+
+    def runs(self):
+        """Yield (row, start, end) of each run of 1s, end excluded."""
+        for row, start, end in zip(*self.runArrays()):
+            yield int(row), int(start), int(end)
+
+    def runArrays(self):
+        """Rows, starts and ends of the runs of 1s, from the packed bytes.
+
+        A byte holds a run edge wherever a bit differs from the previous
+        pixel: byte ^ (byte >> 1), with the last bit of the previous byte
+        shifted in on top. Only bytes holding edges are expanded, through
+        a lookup table of bit offsets; rows never get unpacked.
+        """
+        # a zero byte after each row closes the runs ending on the last column
+        bits = np.zeros((self.nRow, self.bits.shape[1] + 1), dtype=np.uint8)
+        bits[:, :-1] = self.bits
+        previous = np.zeros_like(bits)
+        previous[:, 1:] = (bits[:, :-1] & 1) << 7
+        edges = bits ^ ((bits >> 1) | previous)
+
+        rows, byteIndexes = np.nonzero(edges)
+        offsets = _BIT_OFFSETS[edges[rows, byteIndexes]]
+        found = offsets >= 0
+        positions = (byteIndexes.astype(np.int64) * 8)[:, np.newaxis] + offsets
+        rows = np.broadcast_to(rows[:, np.newaxis], offsets.shape)[found]
+        positions = positions[found]
+
+        # edges alternate start, end in every row
+        return rows[0::2], positions[0::2], positions[1::2]
+
+    def toRuns(self):
+        """Same mask as a RunMask."""
+        rows, starts, ends = self.runArrays()
+        return RunMask.fromRows(rows, starts, ends, self.nCol, self.nRow, self.geotransform)
+
+    def save(self, path):
+        with open(path, "wb") as maskFile:
+            np.savez_compressed(
+                maskFile,
+                kind=self.KIND,
+                bits=self.bits,
+                nCol=self.nCol,
+                geotransform=np.array(self.geotransform))
+
+# --------------------------------------------------------------------------------------------------------------------
+# 3 ----------------------------------------- Run-length mask ------------------------------------------------------
+# --------------------------------------------------------------------------------------------------------------------
+
+class RunMask(object):
+    """1-0 mask as runs of 1s, row by row.
+
+    The runs of row r are starts[rowPtr[r]:rowPtr[r + 1]] and the matching
+    ends (excluded), sorted by column.
+    """
+
+    KIND = "runs"
+
+    def __init__(self, rowPtr, starts, ends, nCol, geotransform):
+        self.rowPtr = rowPtr
+        self.starts = starts
+        self.ends = ends
+        self.nCol = int(nCol)
+        self.nRow = len(rowPtr) - 1
+        self.geotransform = tuple(geotransform)
+
+    @classmethod
+    def fromRows(cls, rows, starts, ends, nCol, nRow, geotransform):
+        """Build from run rows, starts and ends sorted by row then column."""
+        rowPtr = np.zeros(nRow + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=nRow), out=rowPtr[1:])
+        return cls(rowPtr, starts.astype(np.int32), ends.astype(np.int32), nCol, geotransform)
+
+    @classmethod
+    def fromArray(cls, array, geotransform):
+        rows, starts, ends = arrayRuns(array)
+        return cls.fromRows(rows, starts, ends, array.shape[1], array.shape[0], geotransform)
+
+    def toArray(self):
+        array = np.zeros((self.nRow, self.nCol), dtype=np.uint8)
+        for row, start, end in self.runs():
+            array[row, start:end] = 1
+        return array
+
+    def count(self):
+        """Number of pixels set to 1."""
+        return int((self.ends - self.starts).sum(dtype=np.int64))
+
+    def area(self):
+        """Area of the pixels set to 1, in map units."""
+        return self.count() * _pixelArea(self.geotransform)
+
+    def intersection(self, other):
+        return self._combine(other, 2)
+
+    def union(self, other):
+        return self._combine(other, 1)
+
+    def runs(self):
+        """Yield (row, start, end) of each run of 1s, end excluded."""
+        rows = np.repeat(np.arange(self.nRow), np.diff(self.rowPtr))
+        for row, start, end in zip(rows, self.starts, self.ends):
+            yield int(row), int(start), int(end)
+
+    def save(self, path):
+        with open(path, "wb") as maskFile:
+            np.savez_compressed(
+                maskFile,
+                kind=self.KIND,
+                rowPtr=self.rowPtr,
+                starts=self.starts,
+                ends=self.ends,
+                nCol=self.nCol,
+                geotransform=np.array(self.geotransform))
+
+    def _combine(self, other, level):
+        """Runs covered by at least level of the two masks.
+
+        Runs are placed on a single line (row * (nCol + 1) + column) and
+        swept as +1/-1 events, so no row loop and no unpacking is needed.
+        """
+        _checkGrid(self, other)
+        stride = self.nCol + 1
+
+        positions = np.concatenate([
+            self._linear(self.starts), other._linear(other.starts),
+            self._linear(self.ends), other._linear(other.ends)])
+        nStarts = len(self.starts) + len(other.starts)
+        deltas = np.concatenate([
+            np.ones(nStarts, dtype=np.int8),
+            -np.ones(len(positions) - nStarts, dtype=np.int8)])
+
+        # At equal position starts come first, so touching runs merge
+        order = np.lexsort((-deltas, positions))
+        positions = positions[order]
+        depth = np.cumsum(deltas[order])
+        before = depth - deltas[order]
+
+        newStarts = positions[(depth >= level) & (before < level)]
+        newEnds = positions[(depth < level) & (before >= level)]
+        keep = newEnds > newStarts
+        newStarts = newStarts[keep]
+        newEnds = newEnds[keep]
+
+        return RunMask.fromRows(
+            newStarts // stride,
+            newStarts % stride,
+            newEnds - (newStarts // stride) * stride,
+            self.nCol,
+            self.nRow,
+            self.geotransform)
+
+    def _linear(self, columns):
+        rows = np.repeat(np.arange(self.nRow, dtype=np.int64), np.diff(self.rowPtr))
+        return rows * (self.nCol + 1) + columns
+
+# --------------------------------------------------------------------------------------------------------------------
+# 4 ----------------------------------------- Helpers --------------------------------------------------------------
+# --------------------------------------------------------------------------------------------------------------------
+
+def load(path):
+    """Load a PackedMask or a RunMask saved with save()."""
+    with np.load(path) as data:
+        kind = str(data["kind"])
+        geotransform = tuple(data["geotransform"])
+        if kind == PackedMask.KIND:
+            return PackedMask(data["bits"], int(data["nCol"]), geotransform)
+        return RunMask(data["rowPtr"], data["starts"], data["ends"], int(data["nCol"]), geotransform)
+
+
+def arrayRuns(array):
+    """Rows, starts and ends of the runs of non zero values of a 2D array."""
+    padded = np.zeros((array.shape[0], array.shape[1] + 2), dtype=np.int8)
+    padded[:, 1:-1] = array != 0
+    edges = np.diff(padded, axis=1)
+    rows, starts = np.nonzero(edges == 1)
+    _, ends = np.nonzero(edges == -1)
+    return rows, starts, ends
+
+
+def _pixelArea(geotransform):
+    return abs(geotransform[1] * geotransform[5])
+
+
+def _checkGrid(mask, other):
+    if (mask.nCol, mask.nRow, mask.geotransform) != (other.nCol, other.nRow, other.geotransform):
+        raise ValueError("masks are not on the same grid")
@@ -0,0 +1,347 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+
+    stack.py
+
+    Date         : October 2026
+    Copyright : (C) 2026 by Giacomo Fontanelli
+    Email        : giacomofontanelli76 at gmail dot com
+
+***************************************************************************
+
+    This program is free software; you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation; either version 2 of the License, or
+    (at your option) any later version.
+
+***************************************************************************
+
+    Stack reading through the shared block cache, memory mapped reading
+    of uncompressed ENVI and ESRI .hdr (BSQ/BIL/BIP) stacks, and a block by
+    block band conversion engine used by the stack converters
+
+***************************************************************************
+"""
+
+__author__ = 'Giacomo Fontanelli'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Giacomo Fontanelli'
+
+# --------------------------------------------------------------------------------------------------------------------
+# 1 -----------------------------------------------------------------------------------------------------------------
+# --------------------------------------------------------------------------------------------------------------------
+
+import os
+import re
+
+from qgis.core import (
+    QgsProcessingException,
+    QgsRasterFileWriter)
+
+from osgeo import gdal, gdal_array
+
+import numpy as np
+
+from rstools import blocks
+
+# Smallest block read from the stack, in pixels: strip organised files
+# are read several rows at a time
+MIN_BLOCK_PIXELS = 256 * 256
+
+# Working memory of the band conversion per window pixel: the window as
+# read (up to 8 bytes), Float32 values, function temporary and result,
+# and the invalid pixel masks
+CONVERT_PIXEL_BYTES = 8 + 4 + 4 + 4 + 2
+
+# --------------------------------------------------------------------------------------------------------------------
+# 2 ----------------------------------------- Reader ---------------------------------------------------------------
+# --------------------------------------------------------------------------------------------------------------------
+
+class StackReader(object):
+    """Windows of a multiband raster read block by block through the block cache."""
+
+    def __init__(self, path, cache=None):
+        self.path = path
+        self.dataset = gdal.Open(path)
+        if self.dataset is None:
+            raise IOError("cannot open stack " + path)
+
+        self.cache = cache if cache is not None else blocks.blockCache()
+        self.bandCount = self.dataset.RasterCount
+        self.xSize = self.dataset.RasterXSize
+        self.ySize = self.dataset.RasterYSize
+        self.geotransform = self.dataset.GetGeoTransform()
+        self.projection = self.dataset.GetProjection()
+
+        blockX, blockY = self.dataset.GetRasterBand(1).GetBlockSize()
+        blockY *= max(1, MIN_BLOCK_PIXELS // (blockX * blockY))
+        self.blockX = min(blockX, self.xSize)
+        self.blockY = min(blockY, self.ySize)
+
+        # a rewritten file must not hit the blocks of its previous version
+        status = os.stat(path) if os.path.exists(path) else None
+        self.identity = (os.path.realpath(path), status.st_mtime_ns if status else 0, self.blockX, self.blockY)
+
+    def noData(self, band):
+        return self.dataset.GetRasterBand(band).GetNoDataValue()
+
+    def dataType(self, band):
+        return gdal.GetDataTypeName(self.dataset.GetRasterBand(band).DataType)
+
+    def blockWindows(self):
+        """Pixel windows (xoff, yoff, width, height) of the natural blocks."""
+        for yoff in range(0, self.ySize, self.blockY):
+            for xoff in range(0, self.xSize, self.blockX):
+                yield (xoff, yoff, min(self.blockX, self.xSize - xoff), min(self.blockY, self.ySize - yoff))
+
+    def stripWindows(self, rows):
+        """Full width windows of rows rows, a multiple of the block height when larger."""
+        if rows >= self.blockY:
+            rows -= rows % self.blockY
+        rows = max(1, rows)
+        for yoff in range(0, self.ySize, rows):
+            yield (0, yoff, self.xSize, min(rows, self.ySize - yoff))
+
+    def block(self, band, blockCol, blockRow):
+        """Read-only array of one block, from the cache when possible."""
+        xoff, yoff = blockCol * self.blockX, blockRow * self.blockY
+        width = min(self.blockX, self.xSize - xoff)
+        height = min(self.blockY, self.ySize - yoff)
+
+        def read():
+            return self.dataset.GetRasterBand(band).ReadAsArray(xoff, yoff, width, height)
+
+        return self.cache.get(self.identity + (band, blockCol, blockRow), read)
+
+    def readWindow(self, band, xoff, yoff, width, height):
+        """Array of a pixel window, assembled from cached blocks.
+
+        A window matching one block is returned as the read-only block.
+        """
+        col0, col1 = xoff // self.blockX, (xoff + width - 1) // self.blockX
+        row0, row1 = yoff // self.blockY, (yoff + height - 1) // self.blockY
+
+        if col0 == col1 and row0 == row1:
+            block = self.block(band, col0, row0)
+            x, y = xoff - col0 * self.blockX, yoff - row0 * self.blockY
+            return block[y:y + height, x:x + width]
+
+        window = None
+        for blockRow in range(row0, row1 + 1):
+            for blockCol in range(col0, col1 + 1):
+                block = self.block(band, blockCol, blockRow)
+                if window is None:
+                    window = np.empty((height, width), dtype=block.dtype)
+
+                blockX0, blockY0 = blockCol * self.blockX, blockRow * self.blockY
+                x0, y0 = max(xoff, blockX0), max(yoff, blockY0)
+                x1 = min(xoff + width, blockX0 + block.shape[1])
+                y1 = min(yoff + height, blockY0 + block.shape[0])
+                window[y0 - yoff:y1 - yoff, x0 - xoff:x1 - xoff] = \
+                    block[y0 - blockY0:y1 - blockY0, x0 - blockX0:x1 - blockX0]
+        return window
+
+
+# 2A ----- memory mapped raw stacks
+
+class MemmapReader(StackReader):
+    """Reader of an uncompressed raw stack whose windows are numpy.memmap views.
+
+    Windows are read-only views on the page cache: no copy, no block cache.
+    """
+
+    def __init__(self, path, layout, cache=None):
+        super(MemmapReader, self).__init__(path, cache)
+        dataPath, offset, interleave, littleEndian = layout
+
+        dtype = np.dtype(gdal_array.GDALTypeCodeToNumericTypeCode(
+            self.dataset.GetRasterBand(1).DataType))
+        dtype = dtype.newbyteorder("<" if littleEndian else ">")
+
+        shape = {
+            "BAND": (self.bandCount, self.ySize, self.xSize),
+            "LINE": (self.ySize, self.bandCount, self.xSize),
+            "PIXEL": (self.ySize, self.xSize, self.bandCount)}[interleave]
+        self.interleave = interleave
+        self.array = np.memmap(dataPath, dtype=dtype, mode="r", offset=offset, shape=shape)
+
+    def bandView(self, band):
+        """Whole band as a (ySize, xSize) view."""
+        if self.interleave == "BAND":
+            return self.array[band - 1]
+        if self.interleave == "LINE":
+            return self.array[:, band - 1, :]
+        return self.array[:, :, band - 1]
+
+    def block(self, band, blockCol, blockRow):
+        xoff, yoff = blockCol * self.blockX, blockRow * self.blockY
+        return self.bandView(band)[yoff:yoff + self.blockY, xoff:xoff + self.blockX]
+
+    def readWindow(self, band, xoff, yoff, width, height):
+        return self.bandView(band)[yoff:yoff + height, xoff:xoff + width]
+
+
+def rawLayout(dataset):
+    """(data file, header offset, interleave, little endian) of a raw stack.
+
+    Only uncompressed ENVI and ESRI .hdr stacks with one data type and no
+    padding are described; None for every other file.
+    """
+    driver = dataset.GetDriver().ShortName
+    if driver not in ("ENVI", "EHdr") or dataset.RasterCount == 0:
+        return None
+
+    interleave = dataset.GetMetadataItem("INTERLEAVE", "IMAGE_STRUCTURE")
+    dataTypes = {dataset.GetRasterBand(band).DataType for band in range(1, dataset.RasterCount + 1)}
+    dataPath = dataset.GetDescription()
+    headers = [name for name in (dataset.GetFileList() or []) if name.lower().endswith(".hdr")]
+    if interleave not in ("BAND", "LINE", "PIXEL") or len(dataTypes) != 1 \
+            or not os.path.isfile(dataPath) or not headers:
+        return None
+
+    try:
+        with open(headers[0]) as headerFile:
+            header = headerFile.read()
+    except (IOError, OSError, UnicodeDecodeError):
+        return None
+
+    itemSize = gdal.GetDataTypeSize(dataTypes.pop()) // 8
+    xSize, ySize, bandCount = dataset.RasterXSize, dataset.RasterYSize, dataset.RasterCount
+
+    if driver == "ENVI":
+        keys = {key.strip().lower(): value.strip()
+                for key, value in re.findall(r"^([^=\n]+)=(\{[^}]*\}|[^\n]*)", header, re.M)}
+        if keys.get("file compression", "0") != "0":
+            return None
+        offset = int(keys.get("header offset", "0"))
+        littleEndian = keys.get("byte order", "0") == "0"
+    else:
+        keys = {}
+        for line in header.splitlines():
+            words = line.split()
+            if len(words) >= 2:
+                keys[words[0].upper()] = words[1]
+        bandRowBytes = xSize * itemSize
+        totalRowBytes = bandRowBytes * (1 if interleave == "BAND" else bandCount)
+        if int(keys.get("NBITS", itemSize * 8)) != itemSize * 8 \
+                or int(keys.get("BANDROWBYTES", bandRowBytes)) != bandRowBytes \
+                or int(keys.get("TOTALROWBYTES", totalRowBytes)) != totalRowBytes \
+                or int(keys.get("BANDGAPBYTES", 0)) != 0:
+            return None
+        offset = int(keys.get("SKIPBYTES", "0"))
+        littleEndian = keys.get("BYTEORDER", "I").upper() in ("I", "LSBFIRST")
+
+    if offset + xSize * ySize * bandCount * itemSize > os.path.getsize(dataPath):
+        return None
+    return (dataPath, offset, interleave, littleEndian)
+
+
+def openStack(path):
+    """Reader of a stack, memory mapped when the layout allows it."""
+    dataset = gdal.Open(path)
+    layout = rawLayout(dataset) if dataset is not None else None
+    dataset = None
+    if layout is not None:
+        return MemmapReader(path, layout)
+    return StackReader(path)
+
+# --------------------------------------------------------------------------------------------------------------------
+# 3 ----------------------------------------- Band conversion ------------------------------------------------------
+# --------------------------------------------------------------------------------------------------------------------
+
+def convertStack(pathIn, pathOut, function, noDataOut=-9999.0, windowRows=None, feedback=None):
+    """Write function(values) of every band of a stack as Float32, block by block.
+
+    Input nodata pixels and non finite results are written as the input
+    nodata value, or noDataOut when the input band has none. With
+    windowRows the stack is converted in full width strips of that many
+    rows instead of its natural blocks. Formats that
+    only support CreateCopy are written to a GeoTIFF next to pathOut and
+    copied once at the end. Returns None when canceled.
+    """
+    reader = openStack(pathIn)
+
+    extension = os.path.splitext(pathOut)[1].lstrip(".")
+    driverName = QgsRasterFileWriter.driverForExtension(extension) or "GTiff"
+    driver = outputDriver(driverName)
+
+    # CreateCopy only formats: a GeoTIFF first, copied at the end
+    createDriver, pathCreate = driver, pathOut
+    if driver.GetMetadataItem(gdal.DCAP_CREATE) != "YES":
+        createDriver = gdal.GetDriverByName("GTiff")
+        pathCreate = os.path.splitext(pathOut)[0] + ".converting.tif"
+
+    options = ["BIGTIFF=IF_SAFER"] if createDriver.ShortName == "GTiff" else []
+    dataset = createDriver.Create(
+        pathCreate,
+        reader.xSize,
+        reader.ySize,
+        reader.bandCount,
+        gdal.GDT_Float32,
+        options=options)
+    if dataset is None:
+        raise QgsProcessingException("Cannot create {}: {}".format(pathCreate, gdal.GetLastErrorMsg()))
+    dataset.SetGeoTransform(reader.geotransform)
+    dataset.SetProjection(reader.projection)
+
+    windows = list(reader.stripWindows(windowRows) if windowRows else reader.blockWindows())
+    total = reader.bandCount * len(windows)
+    count = 0
+
+    for band in range(1, reader.bandCount + 1):
+        noDataIn = reader.noData(band)
+        bandNoData = noDataIn if noDataIn is not None else noDataOut
+        bandOut = dataset.GetRasterBand(band)
+        bandOut.SetNoDataValue(bandNoData)
+
+        for xoff, yoff, width, height in windows:
+            values = np.asarray(reader.readWindow(band, xoff, yoff, width, height), dtype=np.float32)
+            with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+                result = function(values).astype(np.float32)
+
+            invalid = ~np.isfinite(result)
+            if noDataIn is not None:
+                invalid |= values == noDataIn
+            result[invalid] = bandNoData
+            bandOut.WriteArray(result, xoff, yoff)
+
+            count += 1
+            if feedback is not None:
+                feedback.setProgress(100.0 * count / total)
+                if feedback.isCanceled():
+                    dataset = None
+                    _removeStaging(pathCreate, pathOut)
+                    return None
+
+    dataset.FlushCache()
+
+    if pathCreate != pathOut:
+        copied = driver.CreateCopy(pathOut, dataset)
+        dataset = None
+        _removeStaging(pathCreate, pathOut)
+        if copied is None:
+            raise QgsProcessingException("Cannot write {}: {}".format(pathOut, gdal.GetLastErrorMsg()))
+        copied = None
+
+    dataset = None
+    return pathOut
+
+
+def outputDriver(driverName):
+    """GDAL driver writing Float32 stacks, QgsProcessingException otherwise."""
+    driver = gdal.GetDriverByName(driverName)
+    if driver is None or (driver.GetMetadataItem(gdal.DCAP_CREATE) != "YES"
+                          and driver.GetMetadataItem(gdal.DCAP_CREATECOPY) != "YES"):
+        raise QgsProcessingException("The {} format cannot be written by GDAL".format(driverName))
+
+    dataTypes = driver.GetMetadataItem(gdal.DMD_CREATIONDATATYPES)
+    if dataTypes and "Float32" not in dataTypes.split():
+        raise QgsProcessingException("The {} format cannot hold Float32 bands".format(driverName))
+    return driver
+
+
+def _removeStaging(pathCreate, pathOut):
+    if pathCreate != pathOut:
+        gdal.GetDriverByName("GTiff").Delete(pathCreate)
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+
+    zonal.py
+
+    Date         : October 2026
+    Copyright : (C) 2026 by Giacomo Fontanelli
+    Email        : giacomofontanelli76 at gmail dot com
+
+***************************************************************************
+
+    This program is free software; you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation; either version 2 of the License, or
+    (at your option) any later version.
+
+***************************************************************************
+
+    Zonal statistics of a stack computed block by block on polygon labels
+    rasterized on the stack grid, with an optional dB to linear power
+    conversion applied inside the reduction
+
+***************************************************************************
+"""
+
+__author__ = 'Giacomo Fontanelli'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Giacomo Fontanelli'
+
+# --------------------------------------------------------------------------------------------------------------------
+# 1 -----------------------------------------------------------------------------------------------------------------
+# --------------------------------------------------------------------------------------------------------------------
+
+import numpy as np
+
+from rstools import masks, stack
+
+# Working memory of the reduction per window pixel: labels and their MEM
+# dataset, the band window, values and labels of the valid pixels
+WINDOW_PIXEL_BYTES = 4 + 4 + 8 + 8 + 8
+
+# Value domains
+AS_STORED = 0
+DB_TO_DB = 1
+DB_TO_LINEAR = 2
+
+# Statistics, same order and names as qgis:zonalstatistics
+STAT_NAMES = ["count", "sum", "mean", "median", "stdev", "min", "max",
+              "range", "minority", "majority", "variety", "variance"]
+
+# Names of at most 4 characters, for formats limiting field names to 10
+STAT_SHORT_NAMES = ["cnt", "sum", "mean", "med", "std", "min", "max",
+                    "rng", "mnty", "mjty", "vrty", "var"]
+
+# Statistics the block reduction supports, per output domain
+SUPPORTED = {
+    DB_TO_DB: set([0, 1, 2, 5, 6, 7]),
+    DB_TO_LINEAR: set([0, 1, 2, 4, 5, 6, 7, 11])}
+
+# --------------------------------------------------------------------------------------------------------------------
+# 2 ----------------------------------------- Accumulator ----------------------------------------------------------
+# --------------------------------------------------------------------------------------------------------------------
+
+class BandAccumulator(object):
+    """Count, sum, sum of squares, min and max per polygon label."""
+
+    def __init__(self, nLabels):
+        size = nLabels + 1
+        self.count = np.zeros(size, dtype=np.int64)
+        self.sum = np.zeros(size, dtype=np.float64)
+        self.sumSq = np.zeros(size, dtype=np.float64)
+        self.min = np.full(size, np.inf)
+        self.max = np.full(size, -np.inf)
+
+    def add(self, labels, values):
+        size = len(self.count)
+        self.count += np.bincount(labels, minlength=size)
+        self.sum += np.bincount(labels, weights=values, minlength=size)
+        self.sumSq += np.bincount(labels, weights=values * values, minlength=size)
+        if len(labels) == 0:
+            return
+
+        # min and max per label with reduceat instead of the slow ufunc.at:
+        # first over the runs of equal labels the window rows are made of,
+        # then over the run heads sorted by label
+        runs = _groupStarts(labels)
+        runLabels = labels[runs]
+        runMin = np.minimum.reduceat(values, runs)
+        runMax = np.maximum.reduceat(values, runs)
+
+        order = np.argsort(runLabels, kind="stable")
+        runLabels = runLabels[order]
+        groups = _groupStarts(runLabels)
+        groupLabels = runLabels[groups]
+        self.min[groupLabels] = np.minimum(self.min[groupLabels], np.minimum.reduceat(runMin[order], groups))
+        self.max[groupLabels] = np.maximum(self.max[groupLabels], np.maximum.reduceat(runMax[order], groups))
+
+    def statistic(self, stat, domain):
+        """Array of one statistic per label, NaN where the count is 0."""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            count = self.count.astype(np.float64)
+            empty = self.count == 0
+            mean = self.sum / count
+
+            if stat == 0:
+                return count
+            if stat == 1:
+                result = self.sum
+            elif stat == 2:
+                result = mean
+            elif stat in (4, 11):
+                variance = np.maximum(self.sumSq / count - mean * mean, 0.0)
+                result = np.sqrt(variance) if stat == 4 else variance
+            elif stat == 5:
+                result = self.min
+            elif stat == 6:
+                result = self.max
+            elif stat == 7:
+                if domain == DB_TO_DB:
+                    result = toDb(self.max) - toDb(self.min)
+                else:
+                    result = self.max - self.min
+            else:
+                raise ValueError("statistic not supported: " + STAT_NAMES[stat])
+
+            if domain == DB_TO_DB and stat != 7:
+                result = toDb(result)
+
+            return np.where(empty, np.nan, result)
+
+
+def _groupStarts(keys):
+    """Indexes where a run of equal keys starts."""
+    return np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+
+# --------------------------------------------------------------------------------------------------------------------
+# 3 ----------------------------------------- Reduction ------------------------------------------------------------
+# --------------------------------------------------------------------------------------------------------------------
+
+def toLinear(values):
+    return np.power(10.0, values / 10.0)
+
+
+def toDb(values):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return 10.0 * np.log10(values)
+
+
+def zonalStack(polygons, stackPath, domain=DB_TO_DB, windowSize=512, feedback=None):
+    """Accumulate every band of a stack per polygon label.
+
+    polygons must be in the stack CRS. Pixels are assigned to the polygon
+    holding their center (the last one where polygons overlap); band nodata
+    and non finite values are skipped. Stack blocks are read through the
+    shared block cache. Returns one BandAccumulator per band.
+    """
+    reader = stack.openStack(stackPath)
+    stackGrid = masks.MaskGrid.fromReference(stackPath)
+    try:
+        grid = stackGrid.snap(polygons.extent())
+    except ValueError:
+        grid = None
+
+    accumulators = [BandAccumulator(len(polygons)) for _ in range(reader.bandCount)]
+    if grid is None:
+        return accumulators
+
+    gridXoff, gridYoff = grid.offsetIn(stackGrid)
+    noData = [reader.noData(band) for band in range(1, reader.bandCount + 1)]
+
+    tiles = list(grid.tiles(windowSize))
+    for count, (xoff, yoff, width, height) in enumerate(tiles):
+        labels = masks.rasterizeWindow(polygons, grid, xoff, yoff, width, height, values=masks.LABELS)
+        if labels is not None and labels.any():
+            inside = labels > 0
+
+            for band, (bandNoData, accumulator) in enumerate(zip(noData, accumulators), 1):
+                block = reader.readWindow(band, gridXoff + xoff, gridYoff + yoff, width, height)
+                valid = inside & np.isfinite(block)
+                if bandNoData is not None:
+                    valid &= block != bandNoData
+
+                values = block[valid].astype(np.float64)
+                if domain != AS_STORED:
+                    values = toLinear(values)
+                accumulator.add(labels[valid].astype(np.int64), values)
+
+        if feedback is not None:
+            feedback.setProgress(100.0 * (count + 1) / len(tiles))
+            if feedback.isCanceled():
+                break
+
+    return accumulators
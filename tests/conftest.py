@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+
+    conftest.py
+
+    Date         : October 2026
+    Copyright : (C) 2026 by Giacomo Fontanelli
+    Email        : giacomofontanelli76 at gmail dot com
+
+***************************************************************************
+
+    This program is free software; you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation; either version 2 of the License, or
+    (at your option) any later version.
+
+***************************************************************************
+
+    Test setup: the script folder on sys.path, so that the rstools engine
+    imports as in the processing scripts, and a QGIS application for the
+    tests of the modules that need one
+
+***************************************************************************
+"""
+
+__author__ = 'Giacomo Fontanelli'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Giacomo Fontanelli'
+
+import os
+import sys
+
+import pytest
+
+SCRIPT_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SCRIPT_FOLDER not in sys.path:
+    sys.path.insert(0, SCRIPT_FOLDER)
+
+
+@pytest.fixture(scope="session")
+def qgisApplication():
+    """QgsApplication without GUI, started once for the session."""
+    qgisCore = pytest.importorskip("qgis.core")
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    application = qgisCore.QgsApplication([], False)
+    application.initQgis()
+    yield application
+    application.exitQgis()
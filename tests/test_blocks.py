@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+
+    test_blocks.py
+
+    Date         : October 2026
+    Copyright : (C) 2026 by Giacomo Fontanelli
+    Email        : giacomofontanelli76 at gmail dot com
+
+***************************************************************************
+
+    This program is free software; you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation; either version 2 of the License, or
+    (at your option) any later version.
+
+***************************************************************************
+
+    Block cache: hits, LRU eviction within the budget and spill
+
+***************************************************************************
+"""
+
+__author__ = 'Giacomo Fontanelli'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Giacomo Fontanelli'
+
+import os
+
+import numpy as np
+import pytest
+
+from rstools import blocks
+
+BLOCK_BYTES = 100 * 8
+
+
+def block(value):
+    return lambda: np.full(100, value, dtype=np.float64)
+
+
+def test_hitsAndReadOnly():
+    cache = blocks.BlockCache(budgetBytes=10 * BLOCK_BYTES)
+    first = cache.get("a", block(1))
+    second = cache.get("a", block(2))
+
+    assert second is first
+    assert (cache.hits, cache.misses) == (1, 1)
+    with pytest.raises(ValueError):
+        first[0] = 0
+
+
+def test_leastRecentlyUsedEvicted():
+    cache = blocks.BlockCache(budgetBytes=2 * BLOCK_BYTES)
+    cache.get("a", block(1))
+    cache.get("b", block(2))
+    cache.get("a", block(1))
+    cache.get("c", block(3))
+
+    assert cache.usedBytes == 2 * BLOCK_BYTES
+    assert cache.get("a", block(-1))[0] == 1
+    assert cache.get("b", block(-1))[0] == -1
+
+
+def test_blockOverBudgetNotKept():
+    cache = blocks.BlockCache(budgetBytes=BLOCK_BYTES // 2)
+    cache.get("a", block(1))
+    assert cache.usedBytes == 0
+
+
+def test_resize():
+    cache = blocks.BlockCache(budgetBytes=4 * BLOCK_BYTES)
+    for key in "abcd":
+        cache.get(key, block(1))
+    cache.resize(BLOCK_BYTES)
+    assert cache.usedBytes == BLOCK_BYTES
+    cache.clear()
+    assert cache.usedBytes == 0
+
+
+def test_spill(tmp_path):
+    cache = blocks.BlockCache(budgetBytes=BLOCK_BYTES, spillFolder=str(tmp_path))
+    cache.get("a", block(1))
+    cache.get("b", block(2))
+    assert [name[-len(blocks.SPILL_EXTENSION):] for name in os.listdir(str(tmp_path))] == [blocks.SPILL_EXTENSION]
+
+    # a was evicted to the spill folder and is read back, not recomputed;
+    # its file goes, b is spilled in turn
+    assert cache.get("a", block(-1))[0] == 1
+    assert len(os.listdir(str(tmp_path))) == 1
+    assert cache.get("b", block(-1))[0] == 2
+
+    cache.clear()
+    assert os.listdir(str(tmp_path)) == []
+    assert cache.spilledBytes == 0
+
+
+def test_spillFolderLimit(tmp_path):
+    rng = np.random.default_rng(0)
+    blocksByKey = {key: rng.random(100) for key in range(10)}
+    cache = blocks.BlockCache(budgetBytes=BLOCK_BYTES, spillFolder=str(tmp_path), spillBytes=3 * BLOCK_BYTES)
+    for key in range(10):
+        cache.get(key, lambda: blocksByKey[key].copy())
+
+    sizes = [os.path.getsize(os.path.join(str(tmp_path), name)) for name in os.listdir(str(tmp_path))]
+    assert sum(sizes) == cache.spilledBytes <= 3 * BLOCK_BYTES
+    assert 0 < len(sizes) < 9
+
+    # the oldest spill files were removed: those blocks are read again
+    assert cache.get(0, lambda: np.zeros(100))[0] == 0
+    assert np.array_equal(cache.get(8, lambda: np.zeros(100)), blocksByKey[8])
+
+
+def test_spillFolderLimitAcrossCaches(tmp_path):
+    first = blocks.BlockCache(budgetBytes=BLOCK_BYTES, spillFolder=str(tmp_path))
+    for key in range(5):
+        first.get(key, block(key))
+
+    assert len(os.listdir(str(tmp_path))) == 4
+    fileBytes = max(os.path.getsize(os.path.join(str(tmp_path), name)) for name in os.listdir(str(tmp_path)))
+
+    # a new cache (process) finds the old files and keeps the folder in its limit
+    second = blocks.BlockCache(budgetBytes=BLOCK_BYTES, spillFolder=str(tmp_path), spillBytes=2 * fileBytes)
+    second.get("x", block(1))
+    second.get("y", block(2))
+    names = os.listdir(str(tmp_path))
+    assert second._spillPath("x") in [os.path.join(str(tmp_path), name) for name in names]
+    assert len(names) <= 2
+    assert sum(os.path.getsize(os.path.join(str(tmp_path), name)) for name in names) == second.spilledBytes
+
+
+def test_spillOutsideLock(tmp_path, monkeypatch):
+    cache = blocks.BlockCache(budgetBytes=BLOCK_BYTES, spillFolder=str(tmp_path))
+    spill = cache._spill
+    spilled = []
+
+    def checkedSpill(key, spilledBlock):
+        assert not cache._lock.locked()
+        spilled.append(key)
+        spill(key, spilledBlock)
+
+    monkeypatch.setattr(cache, "_spill", checkedSpill)
+    cache.get("a", block(1))
+    cache.get("b", block(2))
+    cache.resize(0)
+    assert spilled == ["a", "b"]
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+
+    test_cache.py
+
+    Date         : October 2026
+    Copyright : (C) 2026 by Giacomo Fontanelli
+    Email        : giacomofontanelli76 at gmail dot com
+
+***************************************************************************
+
+    This program is free software; you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation; either version 2 of the License, or
+    (at your option) any later version.
+
+***************************************************************************
+
+    Result cache: keys, opt-in, store/lookup and LRU eviction
+
+***************************************************************************
+"""
+
+__author__ = 'Giacomo Fontanelli'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Giacomo Fontanelli'
+
+import os
+
+import numpy as np
+import pytest
+
+from rstools import cache
+
+MB = 1024 * 1024
+
+
+def writeFile(name, nBytes):
+    def produce(staging):
+        path = os.path.join(staging, name)
+        with open(path, "wb") as output:
+            output.write(b"\0" * nBytes)
+        return {"file": path}
+    return produce
+
+
+def test_disabledByDefault(tmp_path, monkeypatch):
+    monkeypatch.delenv("RSTOOLS_CACHE_MB", raising=False)
+    resultCache = cache.ResultCache(folder=str(tmp_path))
+    assert not resultCache.enabled
+
+    calls = []
+    resultCache.array("key", lambda: calls.append(1) or np.arange(3))
+    resultCache.array("key", lambda: calls.append(1) or np.arange(3))
+    assert len(calls) == 2
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_keys(tmp_path, monkeypatch):
+    resultCache = cache.ResultCache(folder=str(tmp_path / "cache"), maxBytes=MB)
+    first = resultCache.key("rasterize", "digest", [0.0, 10.0], 100, "mask")
+    assert first == resultCache.key("rasterize", "digest", (0.0, 10.0), 100, "mask")
+    assert first != resultCache.key("rasterize", "digest", [0.0, 10.0], 100, "label")
+
+    # strings are hashed as they are, never looked up as files
+    monkeypatch.chdir(str(tmp_path))
+    (tmp_path / "mask").write_bytes(b"unrelated")
+    assert first == resultCache.key("rasterize", "digest", [0.0, 10.0], 100, "mask")
+
+
+def test_unhashable():
+    with pytest.raises(TypeError):
+        cache.ResultCache(maxBytes=MB).key(object())
+
+
+def test_arrayRoundTrip(tmp_path):
+    resultCache = cache.ResultCache(folder=str(tmp_path), maxBytes=MB)
+    array = np.random.default_rng(0).random((20, 30))
+
+    assert np.array_equal(resultCache.array("key", lambda: array), array)
+    assert np.array_equal(resultCache.array("key", lambda: None), array)
+    assert np.array_equal(resultCache.loadArray("key"), array)
+    assert resultCache.loadArray("other") is None
+
+
+def test_storeAndLookup(tmp_path):
+    resultCache = cache.ResultCache(folder=str(tmp_path), maxBytes=MB)
+    assert resultCache.lookup("key") is None
+
+    stored = resultCache.store("key", writeFile("mask.tif", 100))
+    assert os.path.getsize(stored["file"]) == 100
+    assert resultCache.lookup("key") == stored
+
+    # canceled: nothing stored, no staging folder left
+    assert resultCache.store("other", lambda folder: None) is None
+    assert resultCache.lookup("other") is None
+    assert not [name for name in os.listdir(str(tmp_path)) if name.startswith("staging-")]
+
+
+def test_leastRecentlyUsedEvicted(tmp_path):
+    resultCache = cache.ResultCache(folder=str(tmp_path), maxBytes=3500)
+    for age, key in enumerate(["aa1", "bb2", "cc3"]):
+        resultCache.store(key, writeFile("data.bin", 1000))
+        resultFile = os.path.join(resultCache.entry(key), cache.RESULT_FILE)
+        os.utime(resultFile, (1000 + age, 1000 + age))
+
+    # aa1 used last: bb2 is now the least recently used
+    resultCache.lookup("aa1")
+    resultCache.store("dd4", writeFile("data.bin", 1000))
+
+    assert resultCache.lookup("bb2") is None
+    assert resultCache.lookup("cc3") is not None
+    assert resultCache.lookup("aa1") is not None
+    assert resultCache.lookup("dd4") is not None
+
+
+def test_entryOverLimitKept(tmp_path):
+    resultCache = cache.ResultCache(folder=str(tmp_path), maxBytes=10)
+    assert resultCache.store("key", writeFile("data.bin", 1000)) is not None
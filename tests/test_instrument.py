@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+
+    test_instrument.py
+
+    Date         : October 2026
+    Copyright : (C) 2026 by Giacomo Fontanelli
+    Email        : giacomofontanelli76 at gmail dot com
+
+***************************************************************************
+
+    This program is free software; you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation; either version 2 of the License, or
+    (at your option) any later version.
+
+***************************************************************************
+
+    Process counters without /proc nor the resource module (Windows)
+
+***************************************************************************
+"""
+
+__author__ = 'Giacomo Fontanelli'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Giacomo Fontanelli'
+
+from rstools import instrument
+
+
+def noProc(path, *arguments, **options):
+    raise IOError(path)
+
+
+def test_countersWithoutProc(monkeypatch):
+    monkeypatch.setattr(instrument, "open", noProc, raising=False)
+    monkeypatch.setattr(instrument, "resource", None)
+
+    assert instrument._memory() == (0, 0)
+    assert instrument._processIo() == {}
+    assert instrument._snapshot()["peak"] == 0
+
+
+def test_peakFromResource(monkeypatch):
+    if instrument.resource is None:
+        return
+    monkeypatch.setattr(instrument, "open", noProc, raising=False)
+    current, peak = instrument._memory()
+    assert current == 0
+    assert peak > 0
@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+
+    test_masks.py
+
+    Date         : October 2026
+    Copyright : (C) 2026 by Giacomo Fontanelli
+    Email        : giacomofontanelli76 at gmail dot com
+
+***************************************************************************
+
+    This program is free software; you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation; either version 2 of the License, or
+    (at your option) any later version.
+
+***************************************************************************
+
+    Polygon masks: incremental updates on dirty tiles against a full
+    rasterization of the edited polygons
+
+***************************************************************************
+"""
+
+__author__ = 'Giacomo Fontanelli'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Giacomo Fontanelli'
+
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip("qgis.core")
+pytest.importorskip("osgeo.gdal")
+
+from qgis.core import (
+    QgsFeature,
+    QgsGeometry,
+    QgsRectangle,
+    QgsVectorLayer)
+
+from osgeo import gdal
+
+from rstools import masks
+
+PIXEL = 10.0
+N_COL, N_ROW = 200, 160
+GEOTRANSFORM = (500000.0, PIXEL, 0.0, 5001600.0, 0.0, -PIXEL)
+TILE = 16
+
+
+def grid():
+    return masks.MaskGrid(GEOTRANSFORM, N_COL, N_ROW)
+
+
+def randomRectangles(seed, count):
+    """(code, xMin, yMin, xMax, yMax) of rectangles over the grid, some
+    crossing its border."""
+    rng = np.random.default_rng(seed)
+    rectangles = []
+    for _ in range(count):
+        x0 = GEOTRANSFORM[0] + rng.uniform(-50.0, N_COL * PIXEL - 50.0)
+        y0 = GEOTRANSFORM[3] - N_ROW * PIXEL + rng.uniform(-50.0, N_ROW * PIXEL - 50.0)
+        rectangles.append((
+            int(rng.integers(1, 9)),
+            x0,
+            y0,
+            x0 + rng.uniform(15.0, 150.0),
+            y0 + rng.uniform(15.0, 150.0)))
+    return rectangles
+
+
+def polygonLayer(rectangles):
+    layer = QgsVectorLayer("Polygon?crs=EPSG:32632&field=code:integer", "polygons", "memory")
+    return layer, addRectangles(layer, rectangles)
+
+
+def addRectangles(layer, rectangles):
+    features = []
+    for code, xMin, yMin, xMax, yMax in rectangles:
+        feature = QgsFeature(layer.fields())
+        feature.setGeometry(QgsGeometry.fromRect(QgsRectangle(xMin, yMin, xMax, yMax)))
+        feature.setAttributes([code])
+        features.append(feature)
+    ok, added = layer.dataProvider().addFeatures(features)
+    assert ok
+    return [feature.id() for feature in added]
+
+
+def editLayer(layer, fids):
+    """Move a polygon, change a class code, delete a polygon and add one."""
+    provider = layer.dataProvider()
+    provider.changeGeometryValues({fids[0]: QgsGeometry.fromRect(QgsRectangle(500300.0, 5000300.0, 500420.0, 5000390.0))})
+    provider.changeAttributeValues({fids[1]: {0: 9}})
+    provider.deleteFeatures([fids[2]])
+    addRectangles(layer, [(5, 501500.0, 5001100.0, 501580.0, 5001230.0)])
+
+
+def readArray(path):
+    return gdal.Open(path).GetRasterBand(1).ReadAsArray()
+
+
+def writeExisting(tmp_path, polygons, values, compress):
+    path = str(tmp_path / "mask.tif")
+    masks.writeMask(masks.rasterize(polygons, grid(), values), grid(), path,
+                    options=masks.tiledOptions(TILE, compress))
+    manifestPath = masks.writeManifest(str(tmp_path / "mask.json"), polygons, grid())
+    return path, masks.readManifest(manifestPath)
+
+
+@pytest.mark.parametrize("values", [masks.MASK, masks.CLASSES])
+@pytest.mark.parametrize("compress", ["NONE", "DEFLATE"])
+@pytest.mark.parametrize("inPlace", [False, True])
+def test_updateMatchesFullRasterization(qgisApplication, tmp_path, values, compress, inPlace):
+    layer, fids = polygonLayer(randomRectangles(0, 20))
+    existing, manifest = writeExisting(tmp_path, masks.PolygonSet(layer, classField=0), values, compress)
+    before = readArray(existing)
+
+    editLayer(layer, fids)
+    edited = masks.PolygonSet(layer, classField=0)
+    masks.checkUpdate(edited, grid(), existing, manifest, values)
+    tiles = masks.dirtyTiles(grid(), masks.dirtyRectangles(edited, manifest), TILE)
+    assert 0 < len(tiles) < masks._tileCount(grid(), TILE)
+
+    output = existing if inPlace else str(tmp_path / "updated.tif")
+    assert masks.updateMask(edited, grid(), existing, output, tiles, TILE, values) == len(tiles)
+
+    np.testing.assert_array_equal(readArray(output), masks.rasterize(edited, grid(), values))
+    if not inPlace:
+        np.testing.assert_array_equal(readArray(existing), before)
+
+
+def test_compressedUpdateDoesNotGrow(qgisApplication, tmp_path):
+    layer, fids = polygonLayer(randomRectangles(1, 20))
+    existing, manifest = writeExisting(tmp_path, masks.PolygonSet(layer), masks.MASK, "DEFLATE")
+
+    editLayer(layer, fids)
+    edited = masks.PolygonSet(layer)
+    tiles = masks.dirtyTiles(grid(), masks.dirtyRectangles(edited, manifest), TILE)
+
+    sizes = []
+    for _ in range(3):
+        masks.updateMask(edited, grid(), existing, existing, tiles, TILE)
+        sizes.append(os.path.getsize(existing))
+    assert sizes[0] == sizes[1] == sizes[2]
+    assert not os.path.exists(existing + ".updating.tif")
+
+
+def test_dirtyRectanglesOfChangedFids(qgisApplication):
+    layer, fids = polygonLayer([(1, 500100.0, 5000100.0, 500200.0, 5000200.0),
+                                (2, 500500.0, 5000500.0, 500600.0, 5000600.0)])
+    manifest = {"features": masks.PolygonSet(layer).manifest()}
+    layer.dataProvider().changeGeometryValues(
+        {fids[0]: QgsGeometry.fromRect(QgsRectangle(500700.0, 5000700.0, 500800.0, 5000800.0))})
+    edited = masks.PolygonSet(layer)
+
+    rectangles = masks.dirtyRectangles(edited, manifest, changedFids=[fids[0]])
+    assert sorted(rectangle.toString(0) for rectangle in rectangles) == sorted([
+        QgsRectangle(500100.0, 5000100.0, 500200.0, 5000200.0).toString(0),
+        QgsRectangle(500700.0, 5000700.0, 500800.0, 5000800.0).toString(0)])
+    # same result from the hashes alone
+    assert len(masks.dirtyRectangles(edited, manifest)) == 2
+
+
+def test_dirtyTiles(qgisApplication):
+    x0, y0 = GEOTRANSFORM[0], GEOTRANSFORM[3]
+    side = TILE * PIXEL
+
+    inside = QgsRectangle(x0 + 10.0, y0 - 50.0, x0 + 50.0, y0 - 10.0)
+    assert masks.dirtyTiles(grid(), [inside], TILE) == [(0, 0, TILE, TILE)]
+
+    across = QgsRectangle(x0 + side - 5.0, y0 - side - 5.0, x0 + side + 5.0, y0 - side + 5.0)
+    assert masks.dirtyTiles(grid(), [across], TILE) == [
+        (0, 0, TILE, TILE), (TILE, 0, TILE, TILE), (0, TILE, TILE, TILE), (TILE, TILE, TILE, TILE)]
+
+    # clipped to the grid, last column narrower
+    corner = QgsRectangle(x0 + N_COL * PIXEL - 5.0, y0 - 5.0, x0 + N_COL * PIXEL + 500.0, y0 + 500.0)
+    assert masks.dirtyTiles(grid(), [corner], TILE) == [(192, 0, N_COL - 192, TILE)]
+
+    outside = QgsRectangle(x0 - 500.0, y0 + 100.0, x0 - 100.0, y0 + 500.0)
+    assert masks.dirtyTiles(grid(), [outside], TILE) == []
+
+    # each tile once, in row order
+    assert masks.dirtyTiles(grid(), [across, inside, across], TILE) == masks.dirtyTiles(grid(), [across], TILE)
+
+
+def test_checkUpdateRejects(qgisApplication, tmp_path):
+    layer, _ = polygonLayer(randomRectangles(2, 5))
+    polygons = masks.PolygonSet(layer, classField=0)
+    existing, manifest = writeExisting(tmp_path, polygons, masks.CLASSES, "DEFLATE")
+
+    otherGrid = dict(manifest, nCol=N_COL + 1)
+    with pytest.raises(ValueError):
+        masks.checkUpdate(polygons, grid(), existing, otherGrid, masks.CLASSES)
+
+    addRectangles(layer, [(300, 500100.0, 5000100.0, 500200.0, 5000200.0)])
+    with pytest.raises(ValueError):
+        masks.checkUpdate(masks.PolygonSet(layer, classField=0), grid(), existing, manifest, masks.CLASSES)
+
+
+@pytest.mark.parametrize("values", [masks.MASK, masks.LABELS, masks.CLASSES])
+def test_threadedTilesMatchRasterize(qgisApplication, tmp_path, values):
+    layer, _ = polygonLayer(randomRectangles(3, 40))
+    polygons = masks.PolygonSet(layer, classField=0)
+    expectedArray = masks.rasterize(polygons, grid(), values)
+
+    for threads in (1, 4):
+        np.testing.assert_array_equal(
+            masks.rasterizeTiled(polygons, grid(), TILE, values, threads=threads), expectedArray)
+
+    path = str(tmp_path / "tiled.tif")
+    masks.writeTiled(polygons, grid(), path, TILE, values, threads=4)
+    np.testing.assert_array_equal(readArray(path), expectedArray)
+
+
+def test_classCodesFollowLabels(qgisApplication):
+    rectangles = randomRectangles(4, 40)
+    layer, _ = polygonLayer(rectangles)
+    polygons = masks.PolygonSet(layer, classField=0)
+
+    # the polygon burned last wins for labels and class codes alike
+    codes = np.array([0] + [code for code, _, _, _, _ in rectangles])
+    labels = masks.rasterize(polygons, grid(), masks.LABELS)
+    classes = masks.rasterize(polygons, grid(), masks.CLASSES)
+    assert classes.dtype == np.uint8
+    np.testing.assert_array_equal(classes, codes[labels])
+
+    classMasks = masks.ClassMasks(sorted(polygons.classes), grid())
+    masks.rasterizeTiled(polygons, grid(), TILE, masks.CLASSES, threads=2, onTile=classMasks.add)
+    for code, mask in classMasks.masks.items():
+        np.testing.assert_array_equal(mask.toArray(), (classes == code).astype(np.uint8))
+
+
+def test_wideClassCodes(qgisApplication):
+    layer, _ = polygonLayer([(300, 500100.0, 5000100.0, 500200.0, 5000200.0),
+                             (7, 500500.0, 5000500.0, 500600.0, 5000600.0)])
+    polygons = masks.PolygonSet(layer, classField=0)
+    classes = masks.rasterize(polygons, grid(), masks.CLASSES)
+
+    assert classes.dtype == np.uint16
+    assert set(np.unique(classes)) == {0, 7, 300}
+
+    addRectangles(layer, [(70000, 500800.0, 5000800.0, 500900.0, 5000900.0)])
+    with pytest.raises(ValueError):
+        masks.valueType(masks.PolygonSet(layer, classField=0), masks.CLASSES)
+
+
+def test_gridCoversPartialPixels(qgisApplication):
+    grid105 = masks.MaskGrid.fromExtent(QgsRectangle(0.0, 0.0, 105.0, 95.0), PIXEL)
+    assert (grid105.nCol, grid105.nRow) == (11, 10)
+    assert grid105.geotransform == (0.0, PIXEL, 0.0, 95.0, 0.0, -PIXEL)
+
+    exact = masks.MaskGrid.fromExtent(QgsRectangle(0.0, 0.0, 100.0, 0.3 * 300.0), PIXEL)
+    assert (exact.nCol, exact.nRow) == (10, 9)
+
+    # a polygon narrower than a pixel still gets one
+    layer, _ = polygonLayer([(1, 500003.0, 5000003.0, 500006.0, 5000006.0)])
+    polygons = masks.PolygonSet(layer)
+    narrow = masks.MaskGrid.fromExtent(polygons.extent(), PIXEL)
+    assert (narrow.nCol, narrow.nRow) == (1, 1)
+    assert masks.rasterize(polygons, narrow).shape == (1, 1)
+
+
+def test_writeTiledCreateFailure(qgisApplication, tmp_path):
+    layer, _ = polygonLayer(randomRectangles(5, 5))
+    with pytest.raises(IOError):
+        masks.writeTiled(masks.PolygonSet(layer), grid(), str(tmp_path / "mask.tif"), tileSize=100)
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+
+    test_memory.py
+
+    Date         : October 2026
+    Copyright : (C) 2026 by Giacomo Fontanelli
+    Email        : giacomofontanelli76 at gmail dot com
+
+***************************************************************************
+
+    This program is free software; you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation; either version 2 of the License, or
+    (at your option) any later version.
+
+***************************************************************************
+
+    Memory budget: shares, windows, workers and strips derived from it
+
+***************************************************************************
+"""
+
+__author__ = 'Giacomo Fontanelli'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Giacomo Fontanelli'
+
+import pytest
+
+from rstools import blocks, memory
+
+MB = 1024 * 1024
+
+
+def test_shares():
+    budget = memory.MemoryBudget(100 * MB)
+    assert budget.windowBytes == int(100 * MB * memory.WINDOW_SHARE)
+    assert budget.cacheBytes == int(100 * MB * memory.CACHE_SHARE)
+    assert budget.fits(budget.windowBytes)
+    assert not budget.fits(budget.windowBytes + 1)
+
+
+def test_fromSetting(monkeypatch):
+    monkeypatch.setenv("RSTOOLS_MEMORY_MB", "64")
+    assert memory.MemoryBudget.fromSetting().totalBytes == 64 * MB
+    # the parameter wins over the environment
+    assert memory.MemoryBudget.fromSetting(32).totalBytes == 32 * MB
+
+    monkeypatch.delenv("RSTOOLS_MEMORY_MB")
+    assert memory.MemoryBudget.fromSetting().totalBytes == memory.availableBytes() // 2
+
+
+def test_fromSettingInvalid(monkeypatch):
+    qgisCore = pytest.importorskip("qgis.core")
+    monkeypatch.setenv("RSTOOLS_MEMORY_MB", "lots")
+    with pytest.raises(qgisCore.QgsProcessingException):
+        memory.MemoryBudget.fromSetting()
+
+
+def test_workers():
+    budget = memory.MemoryBudget(100 * MB)
+    assert budget.workers(8, MB) == 8
+    assert budget.workers(8, 10 * MB) == 5
+    # one worker even when a single window does not fit
+    assert budget.workers(8, 1000 * MB) == 1
+
+
+@pytest.mark.parametrize("megabytes", [1, 16, 100, 4096])
+@pytest.mark.parametrize("bytesPerPixel,windows", [(1, 1), (9, 2), (24, 4)])
+def test_windowSize(megabytes, bytesPerPixel, windows):
+    budget = memory.MemoryBudget(megabytes * MB)
+    side = budget.windowSize(bytesPerPixel, windows)
+
+    assert side % 16 == 0
+    assert 256 <= side <= 4096
+    if side > 256:
+        assert side * side * bytesPerPixel * windows <= budget.windowBytes
+
+
+def test_stripRows():
+    budget = memory.MemoryBudget(10 * MB)
+    rows = budget.stripRows(1000, 20)
+    assert rows * 1000 * 20 <= budget.windowBytes < (rows + 1) * 1000 * 20
+    assert memory.MemoryBudget(1).stripRows(1000, 20) == 1
+
+
+def test_apply(monkeypatch):
+    cache = blocks.BlockCache(budgetBytes=MB)
+    monkeypatch.setattr(blocks, "_blockCache", cache)
+    memory.MemoryBudget(100 * MB).apply()
+    assert cache.budgetBytes == int(100 * MB * memory.CACHE_SHARE)
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+
+    test_packed.py
+
+    Date         : October 2026
+    Copyright : (C) 2026 by Giacomo Fontanelli
+    Email        : giacomofontanelli76 at gmail dot com
+
+***************************************************************************
+
+    This program is free software; you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation; either version 2 of the License, or
+    (at your option) any later version.
+
+***************************************************************************
+
+    Round trips of the compact masks against dense 1-0 arrays
+
+***************************************************************************
+"""
+
+__author__ = 'Giacomo Fontanelli'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Giacomo Fontanelli'
+
+import numpy as np
+import pytest
+
+from rstools import packed
+
+GEOTRANSFORM = (500000.0, 10.0, 0.0, 5000000.0, 0.0, -10.0)
+
+# widths around byte boundaries, densities from empty to full
+SHAPES = [(1, 1), (3, 7), (5, 8), (4, 9), (17, 16), (9, 37), (12, 64), (21, 100)]
+DENSITIES = [0.0, 0.05, 0.5, 0.95, 1.0]
+
+
+def randomMask(shape, density, seed=0):
+    return (np.random.default_rng(seed).random(shape) < density).astype(np.uint8)
+
+
+def denseRuns(array):
+    """(row, start, end) of the runs of 1s, by a plain scan."""
+    runs = []
+    for row in range(array.shape[0]):
+        start = None
+        for column, value in enumerate(list(array[row]) + [0]):
+            if value and start is None:
+                start = column
+            elif not value and start is not None:
+                runs.append((row, start, column))
+                start = None
+    return runs
+
+
+@pytest.mark.parametrize("shape", SHAPES)
+@pytest.mark.parametrize("density", DENSITIES)
+def test_packedRoundTrip(shape, density):
+    array = randomMask(shape, density)
+    mask = packed.PackedMask.fromArray(array, GEOTRANSFORM)
+
+    assert np.array_equal(mask.toArray(), array)
+    assert mask.count() == int(array.sum())
+    assert mask.area() == pytest.approx(array.sum() * 100.0)
+
+
+@pytest.mark.parametrize("shape", SHAPES)
+@pytest.mark.parametrize("density", DENSITIES)
+def test_runMaskRoundTrip(shape, density):
+    array = randomMask(shape, density)
+    mask = packed.RunMask.fromArray(array, GEOTRANSFORM)
+
+    assert np.array_equal(mask.toArray(), array)
+    assert mask.count() == int(array.sum())
+    assert list(mask.runs()) == denseRuns(array)
+
+
+@pytest.mark.parametrize("shape", SHAPES)
+@pytest.mark.parametrize("density", DENSITIES)
+def test_packedRunsWithoutUnpacking(shape, density):
+    array = randomMask(shape, density, seed=1)
+    mask = packed.PackedMask.fromArray(array, GEOTRANSFORM)
+
+    assert list(mask.runs()) == denseRuns(array)
+    assert np.array_equal(mask.toRuns().toArray(), array)
+
+
+@pytest.mark.parametrize("shape", SHAPES)
+def test_intersectionAndUnion(shape):
+    first = randomMask(shape, 0.4, seed=2)
+    second = randomMask(shape, 0.6, seed=3)
+
+    packedFirst = packed.PackedMask.fromArray(first, GEOTRANSFORM)
+    packedSecond = packed.PackedMask.fromArray(second, GEOTRANSFORM)
+    assert np.array_equal(packedFirst.intersection(packedSecond).toArray(), first & second)
+    assert np.array_equal(packedFirst.union(packedSecond).toArray(), first | second)
+
+    runsFirst = packed.RunMask.fromArray(first, GEOTRANSFORM)
+    runsSecond = packed.RunMask.fromArray(second, GEOTRANSFORM)
+    assert np.array_equal(runsFirst.intersection(runsSecond).toArray(), first & second)
+    assert np.array_equal(runsFirst.union(runsSecond).toArray(), first | second)
+
+
+def test_touchingRunsMerge():
+    first = np.array([[1, 1, 0, 0, 0, 0]], dtype=np.uint8)
+    second = np.array([[0, 0, 1, 1, 0, 0]], dtype=np.uint8)
+    union = packed.RunMask.fromArray(first, GEOTRANSFORM).union(packed.RunMask.fromArray(second, GEOTRANSFORM))
+    assert list(union.runs()) == [(0, 0, 4)]
+
+
+def test_differentGridsRefused():
+    mask = packed.PackedMask.fromArray(randomMask((4, 8), 0.5), GEOTRANSFORM)
+    other = packed.PackedMask.fromArray(randomMask((4, 16), 0.5), GEOTRANSFORM)
+    with pytest.raises(ValueError):
+        mask.union(other)
+
+
+def test_setWindowTiles():
+    array = randomMask((30, 45), 0.5, seed=4)
+    mask = packed.PackedMask.empty(45, 30, GEOTRANSFORM)
+    for yoff in range(0, 30, 16):
+        for xoff in range(0, 45, 16):
+            mask.setWindow(xoff, yoff, array[yoff:yoff + 16, xoff:xoff + 16])
+    assert np.array_equal(mask.toArray(), array)
+
+
+def test_setWindowUnalignedRefused():
+    mask = packed.PackedMask.empty(32, 4, GEOTRANSFORM)
+    with pytest.raises(ValueError):
+        mask.setWindow(4, 0, np.ones((4, 8), dtype=np.uint8))
+    with pytest.raises(ValueError):
+        mask.setWindow(0, 0, np.ones((4, 12), dtype=np.uint8))
+
+
+@pytest.mark.parametrize("kind", [packed.PackedMask, packed.RunMask])
+def test_saveAndLoad(tmp_path, kind):
+    array = randomMask((13, 27), 0.3, seed=5)
+    path = str(tmp_path / "mask.bin")
+    kind.fromArray(array, GEOTRANSFORM).save(path)
+
+    loaded = packed.load(path)
+    assert isinstance(loaded, kind)
+    assert loaded.geotransform == GEOTRANSFORM
+    assert np.array_equal(loaded.toArray(), array)
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+
+    test_regular_points.py
+
+    Date         : October 2026
+    Copyright : (C) 2026 by Giacomo Fontanelli
+    Email        : giacomofontanelli76 at gmail dot com
+
+***************************************************************************
+
+    This program is free software; you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation; either version 2 of the License, or
+    (at your option) any later version.
+
+***************************************************************************
+
+    Regular point nets: the strip fallback over the memory budget gives
+    the points of the full array path, coarse points sit on the coarse
+    cell centers
+
+***************************************************************************
+"""
+
+__author__ = 'Giacomo Fontanelli'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Giacomo Fontanelli'
+
+import pytest
+
+pytest.importorskip("qgis.core")
+pytest.importorskip("osgeo.gdal")
+
+from qgis.core import (
+    QgsFeature,
+    QgsGeometry,
+    QgsProcessingContext,
+    QgsProcessingFeedback,
+    QgsProcessingUtils,
+    QgsRectangle,
+    QgsVectorLayer)
+
+import regular_points
+
+X0, Y0 = 500000.0, 5000000.0
+PIXEL = 10.0
+SPACINGS = [10.0, 20.0, 40.0, 80.0]
+
+# Rectangles on multiples of the coarsest spacing, relative to (X0, Y0):
+# every coarse cell is wholly in or out, the extent is 2000 x 1600 m
+RECTANGLES = [
+    (1, 0.0, 960.0, 640.0, 1600.0),
+    (2, 1360.0, 0.0, 2000.0, 480.0),
+    (3, 720.0, 400.0, 1200.0, 1040.0),
+    (4, 160.0, 80.0, 400.0, 320.0)]
+
+
+@pytest.fixture
+def polygonLayer(qgisApplication):
+    layer = QgsVectorLayer("Polygon?crs=EPSG:32632&field=code:integer", "polygons", "memory")
+    features = []
+    for code, xMin, yMin, xMax, yMax in RECTANGLES:
+        feature = QgsFeature(layer.fields())
+        feature.setGeometry(QgsGeometry.fromRect(QgsRectangle(X0 + xMin, Y0 + yMin, X0 + xMax, Y0 + yMax)))
+        feature.setAttributes([code])
+        features.append(feature)
+    ok, added = layer.dataProvider().addFeatures(features)
+    assert ok
+    layer.updateExtents()
+    return layer, {feature.attributes()[0]: feature.id() for feature in added}
+
+
+def runPoints(layer, memoryMb):
+    """(id, poly_id, spacing, code, x, y) of the output points, in order."""
+    algorithm = regular_points.RegularPoints().create()
+    context = QgsProcessingContext()
+    results, ok = algorithm.run({
+        "INPUT": layer,
+        "PIXEL_DIMENSION": PIXEL,
+        "FIELDS": ["code"],
+        "SPACINGS": ",".join("{:g}".format(spacing) for spacing in SPACINGS),
+        "MEMORY_BUDGET": memoryMb,
+        "OUTPUT": "TEMPORARY_OUTPUT"}, context, QgsProcessingFeedback())
+    assert ok
+
+    output = QgsProcessingUtils.mapLayerFromString(results["OUTPUT"], context)
+    points = []
+    for feature in output.getFeatures():
+        point = feature.geometry().asPoint()
+        points.append((feature["id"], feature["poly_id"], feature["spacing"], feature["code"], point.x(), point.y()))
+    return points
+
+
+def expectedPoints(fids):
+    """(poly_id, spacing, code, x, y) of the coarse cell centers inside the rectangles."""
+    points = set()
+    for spacing in SPACINGS:
+        for row in range(int(1600.0 / spacing)):
+            for col in range(int(2000.0 / spacing)):
+                x, y = (col + 0.5) * spacing, 1600.0 - (row + 0.5) * spacing
+                for code, xMin, yMin, xMax, yMax in RECTANGLES:
+                    if xMin < x < xMax and yMin < y < yMax:
+                        points.add((fids[code], spacing, code, X0 + x, Y0 + y))
+    return points
+
+
+def test_stripsMatchFullArray(polygonLayer):
+    layer, fids = polygonLayer
+    # 200 x 160 labels of 28 bytes: 64 MB hold them, 1 MB needs strips
+    full = runPoints(layer, 64)
+    strips = runPoints(layer, 1)
+
+    assert len(full) > 0
+    assert strips == full
+    assert [point[0] for point in full] == list(range(1, len(full) + 1))
+
+
+def test_coarseCellCenters(polygonLayer):
+    layer, fids = polygonLayer
+    points = runPoints(layer, 64)
+
+    found = set((polyId, spacing, code, round(x, 6), round(y, 6)) for _, polyId, spacing, code, x, y in points)
+    expected = set((polyId, spacing, code, round(x, 6), round(y, 6)) for polyId, spacing, code, x, y in expectedPoints(fids))
+    assert found == expected
+    assert len(points) == len(expected)
+
+    # level by level, rows from the top, columns from the left
+    order = [(SPACINGS.index(spacing), -y, x) for _, _, spacing, _, x, y in points]
+    assert order == sorted(order)
+
+
+def test_clashingAttributesRenamed(qgisApplication):
+    layer = QgsVectorLayer("Polygon?crs=EPSG:32632&field=id:integer&field=spacing:string&field=code:integer",
+                           "polygons", "memory")
+    feature = QgsFeature(layer.fields())
+    feature.setGeometry(QgsGeometry.fromRect(QgsRectangle(X0, Y0, X0 + 40.0, Y0 + 40.0)))
+    feature.setAttributes([77, "dense", 5])
+    assert layer.dataProvider().addFeatures([feature])[0]
+    layer.updateExtents()
+
+    algorithm = regular_points.RegularPoints().create()
+    context = QgsProcessingContext()
+    results, ok = algorithm.run({
+        "INPUT": layer,
+        "PIXEL_DIMENSION": PIXEL,
+        "FIELDS": ["id", "spacing", "code"],
+        "SPACINGS": "10,20",
+        "OUTPUT": "TEMPORARY_OUTPUT"}, context, QgsProcessingFeedback())
+    assert ok
+
+    output = QgsProcessingUtils.mapLayerFromString(results["OUTPUT"], context)
+    assert output.fields().names() == ["id", "poly_id", "spacing", "poly_id_2", "poly_spacing", "code"]
+    for point in output.getFeatures():
+        assert point.attributes()[3:] == [77, "dense", 5]
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+
+    test_stack.py
+
+    Date         : October 2026
+    Copyright : (C) 2026 by Giacomo Fontanelli
+    Email        : giacomofontanelli76 at gmail dot com
+
+***************************************************************************
+
+    This program is free software; you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation; either version 2 of the License, or
+    (at your option) any later version.
+
+***************************************************************************
+
+    Raw stack layouts: ENVI and ESRI .hdr stacks in every interleave and
+    byte order read through numpy.memmap against GDAL, and the headers
+    that must fall back to the block reader
+
+***************************************************************************
+"""
+
+__author__ = 'Giacomo Fontanelli'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Giacomo Fontanelli'
+
+import gzip
+
+import numpy as np
+import pytest
+
+pytest.importorskip("qgis.core")
+pytest.importorskip("osgeo.gdal")
+
+from osgeo import gdal
+
+from rstools import blocks, stack
+
+N_BAND, N_ROW, N_COL = 3, 23, 37
+
+WINDOWS = [
+    (0, 0, N_COL, N_ROW),
+    (0, 0, 1, 1),
+    (3, 5, 17, 9),
+    (N_COL - 4, N_ROW - 3, 4, 3),
+    (20, 0, 10, N_ROW)]
+
+ENVI_INTERLEAVE = {"BAND": "bsq", "LINE": "bil", "PIXEL": "bip"}
+EHDR_LAYOUT = {"BAND": "BSQ", "LINE": "BIL", "PIXEL": "BIP"}
+
+
+@pytest.fixture
+def stackData():
+    return np.random.default_rng(0).integers(-30000, 30000, size=(N_BAND, N_ROW, N_COL)).astype(np.int16)
+
+
+@pytest.fixture(params=[65536, 1], ids=["wholeBlocks", "rowBlocks"])
+def blockPixels(request, monkeypatch):
+    """Large blocks, or one row per block so that windows cross blocks."""
+    monkeypatch.setattr(stack, "MIN_BLOCK_PIXELS", request.param)
+    return request.param
+
+
+def rawBytes(data, interleave, littleEndian, rowPadding=0):
+    """Data of a raw file, rows (of every band for BIL and BIP) padded with rowPadding bytes."""
+    ordered = {
+        "BAND": data,
+        "LINE": data.transpose(1, 0, 2),
+        "PIXEL": data.transpose(1, 2, 0)}[interleave]
+    ordered = np.ascontiguousarray(ordered.astype(data.dtype.newbyteorder("<" if littleEndian else ">")))
+    rows = ordered.reshape(-1, N_COL * (1 if interleave == "BAND" else N_BAND)).view(np.uint8)
+    if rowPadding:
+        rows = np.hstack([rows, np.zeros((rows.shape[0], rowPadding), dtype=np.uint8)])
+    return rows.tobytes()
+
+
+def writeEnvi(folder, data, interleave, littleEndian, offset=0, compression=False):
+    path = str(folder / "stack.img")
+    content = b"\0" * offset + rawBytes(data, interleave, littleEndian)
+    with open(path, "wb") as dataFile:
+        dataFile.write(gzip.compress(content) if compression else content)
+    with open(str(folder / "stack.hdr"), "w") as headerFile:
+        headerFile.write("\n".join([
+            "ENVI",
+            "samples = {}".format(N_COL),
+            "lines = {}".format(N_ROW),
+            "bands = {}".format(N_BAND),
+            "header offset = {}".format(offset),
+            "file type = ENVI Standard",
+            "data type = 2",
+            "interleave = {}".format(ENVI_INTERLEAVE[interleave]),
+            "byte order = {}".format(0 if littleEndian else 1),
+            "band names = {band 1, band 2,\n band 3}"]
+            + (["file compression = 1"] if compression else [])) + "\n")
+    return path
+
+
+def writeEhdr(folder, data, interleave, littleEndian, skipBytes=0, rowPadding=0):
+    path = str(folder / ("stack." + EHDR_LAYOUT[interleave].lower()))
+    with open(path, "wb") as dataFile:
+        dataFile.write(b"\0" * skipBytes + rawBytes(data, interleave, littleEndian, rowPadding))
+
+    lines = [
+        "BYTEORDER {}".format("I" if littleEndian else "M"),
+        "LAYOUT {}".format(EHDR_LAYOUT[interleave]),
+        "NROWS {}".format(N_ROW),
+        "NCOLS {}".format(N_COL),
+        "NBANDS {}".format(N_BAND),
+        "NBITS 16",
+        "PIXELTYPE SIGNEDINT",
+        "SKIPBYTES {}".format(skipBytes)]
+    if rowPadding:
+        totalRowBytes = N_COL * 2 * (1 if interleave == "BAND" else N_BAND) + rowPadding
+        lines.append("TOTALROWBYTES {}".format(totalRowBytes))
+    with open(str(folder / "stack.hdr"), "w") as headerFile:
+        headerFile.write("\n".join(lines) + "\n")
+    return path
+
+
+def writeWithGdal(folder, data, driverName, interleave):
+    extension = {"ENVI": "img", "EHdr": "bil"}[driverName]
+    path = str(folder / ("stack." + extension))
+    options = ["INTERLEAVE=" + EHDR_LAYOUT[interleave]] if driverName == "ENVI" else []
+    dataset = gdal.GetDriverByName(driverName).Create(path, N_COL, N_ROW, N_BAND, gdal.GDT_Int16, options=options)
+    for band in range(N_BAND):
+        dataset.GetRasterBand(band + 1).WriteArray(data[band])
+    dataset = None
+    return path
+
+
+def checkReaders(path, data, memmapped):
+    reader = stack.openStack(path)
+    assert isinstance(reader, stack.MemmapReader) == memmapped
+
+    blockReader = stack.StackReader(path, cache=blocks.BlockCache(budgetBytes=1024 * 1024))
+    for band in range(1, N_BAND + 1):
+        for xoff, yoff, width, height in WINDOWS:
+            expectedWindow = data[band - 1, yoff:yoff + height, xoff:xoff + width]
+            np.testing.assert_array_equal(blockReader.readWindow(band, xoff, yoff, width, height), expectedWindow)
+            np.testing.assert_array_equal(reader.readWindow(band, xoff, yoff, width, height), expectedWindow)
+    return reader
+
+
+@pytest.mark.parametrize("interleave", ["BAND", "LINE", "PIXEL"])
+@pytest.mark.parametrize("littleEndian", [True, False])
+def test_enviMemmap(tmp_path, stackData, blockPixels, interleave, littleEndian):
+    path = writeEnvi(tmp_path, stackData, interleave, littleEndian, offset=128)
+    assert stack.rawLayout(gdal.Open(path)) == (path, 128, interleave, littleEndian)
+    checkReaders(path, stackData, memmapped=True)
+
+
+@pytest.mark.parametrize("interleave", ["BAND", "LINE", "PIXEL"])
+@pytest.mark.parametrize("littleEndian", [True, False])
+def test_ehdrMemmap(tmp_path, stackData, blockPixels, interleave, littleEndian):
+    path = writeEhdr(tmp_path, stackData, interleave, littleEndian, skipBytes=64)
+    assert stack.rawLayout(gdal.Open(path)) == (path, 64, interleave, littleEndian)
+    checkReaders(path, stackData, memmapped=True)
+
+
+@pytest.mark.parametrize("driverName,interleave", [
+    ("ENVI", "BAND"), ("ENVI", "LINE"), ("ENVI", "PIXEL"), ("EHdr", "LINE")])
+def test_gdalWrittenMemmap(tmp_path, stackData, blockPixels, driverName, interleave):
+    path = writeWithGdal(tmp_path, stackData, driverName, interleave)
+    checkReaders(path, stackData, memmapped=True)
+
+
+def test_compressedEnviFallsBack(tmp_path, stackData):
+    path = writeEnvi(tmp_path, stackData, "BAND", True, compression=True)
+    dataset = gdal.Open(path)
+    if dataset is None:
+        pytest.skip("GDAL without compressed ENVI support")
+    assert stack.rawLayout(dataset) is None
+    checkReaders(path, stackData, memmapped=False)
+
+
+@pytest.mark.parametrize("interleave", ["LINE", "PIXEL"])
+def test_paddedEhdrFallsBack(tmp_path, stackData, interleave):
+    path = writeEhdr(tmp_path, stackData, interleave, True, rowPadding=6)
+    assert stack.rawLayout(gdal.Open(path)) is None
+    checkReaders(path, stackData, memmapped=False)
+
+
+def test_otherFormatsFallBack(tmp_path, stackData):
+    path = str(tmp_path / "stack.tif")
+    dataset = gdal.GetDriverByName("GTiff").Create(path, N_COL, N_ROW, N_BAND, gdal.GDT_Int16)
+    for band in range(N_BAND):
+        dataset.GetRasterBand(band + 1).WriteArray(stackData[band])
+    dataset = None
+
+    assert stack.rawLayout(gdal.Open(path)) is None
+    checkReaders(path, stackData, memmapped=False)
+
+
+def test_truncatedDataFallsBack(tmp_path, stackData):
+    path = writeEnvi(tmp_path, stackData, "BAND", True)
+    with open(path, "r+b") as dataFile:
+        dataFile.truncate(100)
+    dataset = gdal.Open(path)
+    if dataset is not None:
+        assert stack.rawLayout(dataset) is None
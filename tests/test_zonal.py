@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+
+    test_zonal.py
+
+    Date         : October 2026
+    Copyright : (C) 2026 by Giacomo Fontanelli
+    Email        : giacomofontanelli76 at gmail dot com
+
+***************************************************************************
+
+    This program is free software; you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation; either version 2 of the License, or
+    (at your option) any later version.
+
+***************************************************************************
+
+    Zonal accumulators against NumPy statistics on random data
+
+***************************************************************************
+"""
+
+__author__ = 'Giacomo Fontanelli'
+__date__ = 'October 2026'
+__copyright__ = '(C) 2026, Giacomo Fontanelli'
+
+import numpy as np
+import pytest
+
+pytest.importorskip("qgis.core")
+pytest.importorskip("osgeo.gdal")
+
+from rstools import zonal
+
+N_LABELS = 25
+
+
+def randomWindows(seed, nWindows=6, shape=(40, 64)):
+    """(labels, values) of random windows, labels in runs as along rows of
+    polygons, some labels never present."""
+    rng = np.random.default_rng(seed)
+    windows = []
+    for _ in range(nWindows):
+        runLengths = rng.integers(1, 12, size=shape[0] * shape[1])
+        runLabels = rng.integers(1, N_LABELS - 3, size=len(runLengths))
+        labels = np.repeat(runLabels, runLengths)[:shape[0] * shape[1]]
+        values = rng.gamma(2.0, 0.05, size=len(labels))
+        windows.append((labels.astype(np.int64), values))
+    return windows
+
+
+def expected(windows, stat):
+    labels = np.concatenate([window[0] for window in windows])
+    values = np.concatenate([window[1] for window in windows])
+    result = np.full(N_LABELS + 1, np.nan)
+    for label in np.unique(labels):
+        selected = values[labels == label]
+        result[label] = {
+            0: len(selected),
+            1: selected.sum(),
+            2: selected.mean(),
+            4: selected.std(),
+            5: selected.min(),
+            6: selected.max(),
+            7: selected.max() - selected.min(),
+            11: selected.var()}[stat]
+    return result
+
+
+def accumulate(windows):
+    accumulator = zonal.BandAccumulator(N_LABELS)
+    for labels, values in windows:
+        accumulator.add(labels, values)
+    return accumulator
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("stat", sorted(zonal.SUPPORTED[zonal.DB_TO_LINEAR]))
+def test_linearStatistics(seed, stat):
+    windows = randomWindows(seed)
+    result = accumulate(windows).statistic(stat, zonal.DB_TO_LINEAR)
+    expectedResult = expected(windows, stat)
+    if stat == 0:
+        expectedResult = np.nan_to_num(expectedResult)
+    np.testing.assert_allclose(result, expectedResult, rtol=1e-9, atol=1e-12)
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("stat", sorted(zonal.SUPPORTED[zonal.DB_TO_DB]))
+def test_dbStatistics(seed, stat):
+    windows = randomWindows(seed)
+    result = accumulate(windows).statistic(stat, zonal.DB_TO_DB)
+    if stat == 0:
+        expectedResult = np.nan_to_num(expected(windows, stat))
+    elif stat == 7:
+        expectedResult = 10.0 * np.log10(expected(windows, 6)) - 10.0 * np.log10(expected(windows, 5))
+    else:
+        expectedResult = 10.0 * np.log10(expected(windows, stat))
+    np.testing.assert_allclose(result, expectedResult, rtol=1e-9, atol=1e-9)
+
+
+def test_unsortedLabels():
+    """Labels in any order, not in runs."""
+    rng = np.random.default_rng(7)
+    labels = rng.integers(0, N_LABELS + 1, size=5000)
+    values = rng.normal(size=5000)
+    accumulator = accumulate([(labels, values)])
+    for label in range(N_LABELS + 1):
+        selected = values[labels == label]
+        assert accumulator.min[label] == selected.min()
+        assert accumulator.max[label] == selected.max()
+        assert accumulator.count[label] == len(selected)
+
+
+def test_emptyWindows():
+    accumulator = zonal.BandAccumulator(3)
+    accumulator.add(np.zeros(0, dtype=np.int64), np.zeros(0))
+    accumulator.add(np.array([2, 2]), np.array([1.0, 3.0]))
+
+    assert list(accumulator.statistic(0, zonal.DB_TO_LINEAR)) == [0, 0, 2, 0]
+    mean = accumulator.statistic(2, zonal.DB_TO_LINEAR)
+    assert np.isnan(mean[[0, 1, 3]]).all()
+    assert mean[2] == 2.0
+
+
+def test_dbRoundTrip():
+    values = np.linspace(-40.0, 10.0, 51)
+    np.testing.assert_allclose(zonal.toDb(zonal.toLinear(values)), values)
@@ -36,7 +36,9 @@ __copyright__ = '(C) 2020, Giacomo Fontanelli'
 # 1 -----------------------------------------------------------------------------------------------------------------
 # --------------------------------------------------------------------------------------------------------------------
 
-from qgis.PyQt.QtCore import QCoreApplication
+from qgis.PyQt.QtCore import (
+    QCoreApplication,
+    QVariant)
 
 from qgis.core import (
     QgsProcessing,
@@ -45,10 +47,19 @@ from qgis.core import (
     QgsProcessingParameterRasterLayer,
     QgsProcessingParameterString,
     QgsProcessingParameterEnum,
+    QgsProcessingParameterNumber,
+    QgsProcessingParameterDefinition,
     QgsProcessingOutputVectorLayer,
-    QgsProcessingException)
+    QgsProcessingException,
+    QgsField)
 
-from qgis import processing
+import os
+import sys
+
+if os.path.dirname(os.path.abspath(__file__)) not in sys.path:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from rstools import instrument
 
 # --------------------------------------------------------------------------------------------------------------------
 # 2 ----- Define the algorithm as a class inheriting from QgsProcessingAlgorithm -------
@@ -61,6 +72,8 @@ class ZonalStatisticsStack(QgsProcessingAlgorithm):
     POLYGONS = 'POLYGONS'      # polygons             - INPUT_VECTOR
     PREFIX        = 'PREFIX'            # column_prefix     - COLUMN_PREFIX
     STAT           = 'STAT'                # stat                     - STATISTICS
+    DOMAIN       = 'DOMAIN'          # value domain of the reduction
+    MEMORY_BUDGET = 'MEMORY_BUDGET'    # memory budget in MB
 
     # 2B
     def tr(self, string):
@@ -88,7 +101,14 @@ class ZonalStatisticsStack(QgsProcessingAlgorithm):
 
     # 2H
     def shortHelpString(self):
-        return self.tr("This script perform statistics on multilayer stacks")
+        return self.tr("This script perform statistics on multilayer stacks. "
+                       "For dB stacks the value domain option converts each pixel to linear power "
+                       "inside the block reduction (count, sum, mean, min, max, range; stdev and "
+                       "variance with linear results) and writes the results in dB or in linear "
+                       "power, with no converted stack written. Columns are named "
+                       "<prefix><band>_<statistic> (cnt, sum, mean, std, min, max, rng, var on "
+                       "shapefiles), existing columns of the same name are overwritten; pixels are "
+                       "assigned to the polygon holding their center")
     
     # --------------------------------------------------------------------------------------------------------------------
     # 3 ---------- Define the parameters of the processing framework -----------------------------
@@ -138,16 +158,42 @@ class ZonalStatisticsStack(QgsProcessingAlgorithm):
             defaultValue=[2],
             optional = False))
 
+        # 3E value domain of the statistics
+        self.addParameter(QgsProcessingParameterEnum(
+            name = self.DOMAIN,
+            description = self.tr('Value domain'),
+            options = [self.tr("As stored"),
+                            self.tr("dB stack, statistics in linear power, results in dB"),
+                            self.tr("dB stack, statistics in linear power, results in linear power")],
+            defaultValue=0,
+            optional = False))
+
+        # 3F memory budget of the block reduction
+        memoryBudget = QgsProcessingParameterNumber(
+            name = self.MEMORY_BUDGET,
+            description = self.tr('Memory budget in MB (0 = RSTOOLS_MEMORY_MB or half the available memory)'),
+            type = QgsProcessingParameterNumber.Integer,
+            minValue = 0,
+            defaultValue = 0)
+        memoryBudget.setFlags(memoryBudget.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(memoryBudget)
+
     # --------------------------------------------------------------------------------------------------------------------
     # 4 ----------------------------------------- Import layers ----------------------------------------------------
     # --------------------------------------------------------------------------------------------------------------------
 
+    @instrument.traced
     def processAlgorithm(
         self,
         parameters,
         context,
         feedback):
         
+        # 4A0 Processing and the engine modules, imported on the first run only
+        from qgis import processing
+
+        from rstools import memory, zonal
+
         # 4A Input polygons
         polygons = self.parameterAsSource(
             parameters,
@@ -171,6 +217,18 @@ class ZonalStatisticsStack(QgsProcessingAlgorithm):
             parameters, 
             self.STAT, 
             context)
+
+        # 4E Value domain
+        domain = self.parameterAsEnum(
+            parameters,
+            self.DOMAIN,
+            context)
+
+        # 4F Memory budget
+        budget = memory.MemoryBudget.fromSetting(self.parameterAsInt(
+            parameters,
+            self.MEMORY_BUDGET,
+            context)).apply()
             
         # -------------------------------------------------------------------------------------------------------------
         # 5 ------------------------------------- Check -----------------------------------------------------------
@@ -180,9 +238,20 @@ class ZonalStatisticsStack(QgsProcessingAlgorithm):
         if polygons is None:
             raise QgsProcessingException(self.invalidSourceError(parameters, POLYGONS))
    
-        # 5B Check for cancelation
+        # 5B Statistics available in the linear power reduction
+        if domain != zonal.AS_STORED:
+            unsupported = [zonal.STAT_NAMES[index] for index in stat if index not in zonal.SUPPORTED[domain]]
+            if unsupported:
+                raise QgsProcessingException(
+                    self.tr('Not available in this value domain: ') + ", ".join(unsupported))
+
+        # 5C Check for cancelation
         if feedback.isCanceled():
             return {}
+
+        # 5D Linear power reduction, no converted stack is written
+        if domain != zonal.AS_STORED:
+            return self.linearZonal(parameters, context, feedback, stack, columnPrefix, stat, domain, budget)
             
         # --------------------------------------------------------------------------------------------------------------------
         # 6 ----------------------------------------- Execution ----------------------------------------------------
@@ -202,12 +271,13 @@ class ZonalStatisticsStack(QgsProcessingAlgorithm):
                 "STATISTICS": parameters[self.STAT]}
             
             # 6C
-            processOut = processing.run(
-                'qgis:zonalstatistics', 
-                processPar,
-                is_child_algorithm = False,
-                context = context,
-                feedback = feedback)
+            with self.trace.stage("zonalstatistics band {}".format(iBand)):
+                processOut = processing.run(
+                    'qgis:zonalstatistics', 
+                    processPar,
+                    is_child_algorithm = False,
+                    context = context,
+                    feedback = feedback)
                 
             # 6D Check for cancelation
             if feedback.isCanceled():
@@ -215,3 +285,84 @@ class ZonalStatisticsStack(QgsProcessingAlgorithm):
         
         return {self.POLYGONS: processOut["INPUT_VECTOR"]}
 
+    # --------------------------------------------------------------------------------------------------------------------
+    # 7 ----------------------------------------- Linear power reduction ----------------------------------------
+    # --------------------------------------------------------------------------------------------------------------------
+
+    def linearZonal(self, parameters, context, feedback, stack, columnPrefix, stat, domain, budget):
+
+        import numpy as np
+
+        from rstools import masks, zonal
+
+        # 7A Polygon layer, its labels rasterized on the stack grid
+        layer = self.parameterAsVectorLayer(
+            parameters,
+            self.POLYGONS,
+            context)
+
+        with self.trace.stage("read polygons") as stage:
+            polygons = masks.PolygonSet(
+                layer,
+                feedback=feedback,
+                crs=stack.crs(),
+                transformContext=context.transformContext())
+            stage.count("features", len(polygons))
+
+        if feedback.isCanceled():
+            return {}
+
+        # 7B Block reduction with the dB to linear conversion on the fly,
+        # windows sized on the memory budget
+        with self.trace.stage("block reduction") as stage:
+            accumulators = zonal.zonalStack(
+                polygons,
+                stack.source(),
+                domain=domain,
+                windowSize=budget.windowSize(zonal.WINDOW_PIXEL_BYTES),
+                feedback=feedback)
+            stage.count("bands", len(accumulators))
+            stage.count("pixels", sum(int(accumulator.count.sum()) for accumulator in accumulators))
+
+        if feedback.isCanceled():
+            return {}
+
+        # 7C Columns, one per band and statistic, short names for
+        # shapefiles; existing columns of the same name are overwritten
+        provider = layer.dataProvider()
+        statNames = zonal.STAT_SHORT_NAMES if provider.storageType() == "ESRI Shapefile" else zonal.STAT_NAMES
+        columnNames = [columnPrefix + str(iBand) + "_" + statNames[index]
+                       for iBand in range(1, len(accumulators) + 1) for index in stat]
+        if len(set(columnNames)) != len(columnNames):
+            raise QgsProcessingException(self.tr('Each statistic can be chosen only once'))
+
+        provider.addAttributes([QgsField(name, QVariant.Double)
+                                for name in columnNames if layer.fields().lookupField(name) < 0])
+        layer.updateFields()
+
+        # fields are looked up by name: the provider may have refused or
+        # renamed a column
+        fieldIndexes = [layer.fields().lookupField(name) for name in columnNames]
+        missing = [name for name, fieldIndex in zip(columnNames, fieldIndexes) if fieldIndex < 0]
+        if missing:
+            raise QgsProcessingException(
+                self.tr('Columns not created (use a shorter prefix): ') + ", ".join(missing))
+
+        # 7D Values per feature, NULL for polygons without pixels
+        changes = {}
+        column = 0
+        for accumulator in accumulators:
+            for index in stat:
+                fieldIndex = fieldIndexes[column]
+                values = accumulator.statistic(index, domain)
+                for label in range(1, len(polygons) + 1):
+                    value = values[label]
+                    changes.setdefault(polygons.fids[label], {})[fieldIndex] = (
+                        float(value) if np.isfinite(value) else None)
+                column += 1
+
+        with self.trace.stage("write attributes") as stage:
+            provider.changeAttributeValues(changes)
+            stage.count("features", len(changes))
+
+        return {self.POLYGONS: parameters[self.POLYGONS]}